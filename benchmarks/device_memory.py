@@ -0,0 +1,70 @@
+"""Per-device memory footprint.
+
+Builds a large set of devices the way the scanner does (a handful of
+vendors, a few groups) and reports the traced allocation per device,
+next to a plain ``@dataclass`` with datetime fields for comparison.
+
+    python benchmarks/device_memory.py [count]
+"""
+
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from wifinder.database import Device
+
+VENDORS = ["Apple, Inc.", "Samsung Electronics Co.,Ltd", "Espressif Inc.", "Intel Corporate"]
+GROUPS = ["family", "guests", "iot", None]
+
+
+@dataclass
+class PlainDevice:
+    mac: str
+    name: str | None = None
+    vendor: str | None = None
+    ip: str | None = None
+    first_seen: datetime | None = None
+    last_seen: datetime | None = None
+    is_online: bool = False
+    group: str | None = None
+
+
+def build(factory, count: int) -> list:
+    now = datetime.now()
+    return [
+        factory(
+            mac=f"AA:BB:{i >> 24 & 255:02X}:{i >> 16 & 255:02X}:{i >> 8 & 255:02X}:{i & 255:02X}",
+            # Vendor strings arrive as fresh objects from each lookup
+            vendor="".join(VENDORS[i % len(VENDORS)]),
+            ip=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            first_seen=now - timedelta(days=1),
+            last_seen=now,
+            is_online=True,
+            group=GROUPS[i % len(GROUPS)],
+        )
+        for i in range(count)
+    ]
+
+
+def measure(factory, count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    devices = build(factory, count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del devices
+    return (after - before) / count
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    plain = measure(PlainDevice, count)
+    slotted = measure(Device, count)
+    print(f"{count:,} devices")
+    print(f"  dataclass + datetime: {plain:7.1f} bytes/device")
+    print(f"  Device (slots):       {slotted:7.1f} bytes/device ({slotted / plain:.0%})")
+
+
+if __name__ == "__main__":
+    main()
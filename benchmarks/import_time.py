@@ -0,0 +1,100 @@
+"""CLI startup time.
+
+Read-only commands (list, log, db-path) run in shell prompts and scripts, so
+they should start fast and never load the scanner, notifier or web stacks.
+This runs them against a throwaway config and database, checks with
+``python -X importtime`` which modules they load, and times them against a
+budget (median wall time of the whole process).
+
+    python benchmarks/import_time.py [budget_ms]
+
+Exits with status 1 if a command loads a heavy module or is over budget.
+"""
+
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+COMMANDS = [["db-path"], ["list"], ["log"]]
+# Modules read-only commands must not import
+HEAVY = [
+    "asyncio",
+    "flask",
+    "http.server",
+    "httpx",
+    "nmap",
+    "numpy",
+    "paho",
+    "wifinder.notifier",
+    "wifinder.scanner",
+    "wifinder.watcher",
+]
+RUNS = 9
+
+
+def run(args: list[str], importtime: bool = False) -> subprocess.CompletedProcess:
+    flags = ["-X", "importtime"] if importtime else []
+    return subprocess.run(
+        [sys.executable, *flags, "-m", "wifinder.cli", *args], capture_output=True, text=True
+    )
+
+
+def imports(args: list[str]) -> dict[str, int]:
+    """Module -> cumulative import time (µs) while running a command."""
+    modules = {}
+    for line in run(args, importtime=True).stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        modules[name] = int(cumulative)
+    return modules
+
+
+def wall_time(args: list[str]) -> float:
+    """Median seconds to run a command."""
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        run(args)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main() -> None:
+    budget = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = Path(tmp) / "config.yaml"
+        config.write_text(f"db_path: {Path(tmp) / 'wifinder.db'}\n")
+        run(["list", "-c", str(config)])  # create the database
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"])
+        print(f"python startup: {(time.perf_counter() - start) * 1000:.0f} ms\n")
+
+        failed = False
+        for command in COMMANDS:
+            args = [*command, "-c", str(config)]
+            modules = imports(args)
+            heavy = [m for m in HEAVY if m in modules]
+            seconds = wall_time(args)
+            over = seconds > budget
+            failed |= over or bool(heavy)
+
+            flag = "  OVER BUDGET" if over else ""
+            print(f"wifinder {command[0]}: {seconds * 1000:.0f} ms{flag}")
+            slowest = sorted(modules.items(), key=lambda item: -item[1])[:5]
+            for name, micros in slowest:
+                print(f"  {micros / 1000:6.1f} ms  {name}")
+            if heavy:
+                print(f"  loads: {', '.join(heavy)}")
+
+    print(f"\nbudget: {budget * 1000:.0f} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+import pytest
+
+from wifinder import watcher as watcher_module
+from wifinder.config import Config
+from wifinder.database import Device
+from wifinder.scanner import ScanResult
+
+
+class FakeScanner:
+    """Stands in for nmap: every scan finds ``FakeScanner.devices``."""
+
+    devices: list[Device] = []
+
+    def __init__(self, network: str):
+        pass
+
+    def scan(self) -> ScanResult:
+        return ScanResult(
+            devices=[Device(mac=d.mac, ip=d.ip) for d in self.devices],
+            scan_time=datetime.now(),
+            duration=0.0,
+        )
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setattr(watcher_module, "Scanner", FakeScanner)
+    monkeypatch.setattr(FakeScanner, "devices", [])
+    config = Config(db_path=tmp_path / "wifinder.db", snapshot=False)
+    config.notify.sound = False
+    return config
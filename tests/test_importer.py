@@ -0,0 +1,49 @@
+from conftest import FakeScanner
+
+from wifinder.database import Database, Device
+from wifinder.importer import import_devices
+from wifinder.watcher import Watcher
+
+MAC = "AA:BB:CC:DD:EE:01"
+
+
+def test_imported_device_is_new_when_first_scanned(config):
+    db = Database(config.db_path)
+    import_devices(db, [{"mac": MAC, "name": "Phone", "group": "family"}])
+    assert db.get_device(MAC).first_seen is None
+
+    FakeScanner.devices = [Device(mac=MAC, ip="10.0.0.2")]
+    watcher = Watcher(config, db)
+    try:
+        changes = watcher.scan_once(notify=False)
+    finally:
+        watcher.close()
+
+    assert [(c.device.mac, c.change_type) for c in changes] == [(MAC, "new")]
+    device = db.get_device(MAC)
+    assert device.first_seen is not None
+    assert device.is_online
+    assert (device.name, device.group) == ("Phone", "family")
+
+
+def test_scan_keeps_first_seen(config):
+    db = Database(config.db_path)
+    FakeScanner.devices = [Device(mac=MAC)]
+    watcher = Watcher(config, db)
+    try:
+        watcher.scan_once(notify=False)
+        first_seen = db.get_device(MAC).first_seen
+        watcher.scan_once(notify=False)
+    finally:
+        watcher.close()
+
+    assert db.get_device(MAC).first_seen == first_seen
+
+
+def test_repeated_mac_created_once(config):
+    db = Database(config.db_path)
+    rows = [{"mac": MAC, "name": "Phone"}, {"mac": MAC.lower(), "group": "family"}]
+    for dry_run in (True, False):
+        results = import_devices(db, rows, dry_run=dry_run)
+        assert [r.status for r in results] == ["created", "updated"]
+    assert (db.get_device(MAC).name, db.get_device(MAC).group) == ("Phone", "family")
@@ -0,0 +1,201 @@
+import json
+
+import httpx
+import pytest
+
+from wifinder import notifier as notifier_module
+from wifinder.config import NotifyConfig
+from wifinder.database import Device
+from wifinder.groups import GroupChange
+from wifinder.notifier import NotificationManager, Notifier, TokenBucket
+
+
+class Clock:
+    """Stands in for the time module in notifier.py."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+class ManualTimer:
+    def __init__(self, timers: "ManualTimers", interval: float, function, args=()):
+        self.timers = timers
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.daemon = False
+        self.cancelled = False
+
+    def start(self) -> None:
+        self.timers.started.append(self)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class ManualTimers:
+    """Timer factory whose timers only fire when the test says so."""
+
+    def __init__(self):
+        self.started: list[ManualTimer] = []
+
+    def __call__(self, interval, function, args=()) -> ManualTimer:
+        return ManualTimer(self, interval, function, args)
+
+    def fire(self) -> None:
+        due, self.started = self.started, []
+        for timer in due:
+            if not timer.cancelled:
+                timer.function(*timer.args)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(notifier_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def timers(monkeypatch) -> ManualTimers:
+    timers = ManualTimers()
+    monkeypatch.setattr(NotificationManager, "timer_factory", timers)
+    return timers
+
+
+class RecordingNotifier(Notifier):
+    channel = "desktop"
+
+    def __init__(self):
+        self.sent: list[str] = []
+
+    def notify(self, title, message, device=None, key=None):
+        self.sent.append(title)
+        return True
+
+
+def make_manager(**config) -> tuple[NotificationManager, RecordingNotifier]:
+    manager = NotificationManager(NotifyConfig(sound=False, **config))
+    notifier = RecordingNotifier()
+    manager.notifiers = [notifier]
+    return manager, notifier
+
+
+def test_digest_sent_when_window_ends(clock, timers):
+    manager, notifier = make_manager(digest_window=60, digest_max_messages=1)
+    flushed = []
+    manager.on_timer_flush = lambda: flushed.append(True)
+    with manager.batch():
+        manager.notify_arrival(Device(mac="AA:BB:CC:DD:EE:01"))
+    manager.notify_arrival(Device(mac="AA:BB:CC:DD:EE:02"))
+    assert notifier.sent == []
+    assert [t.interval for t in timers.started] == [60]
+
+    # No further scan: the window's timer sends the digest
+    clock.now += 60
+    timers.fire()
+    assert notifier.sent == ["2 arrived"]
+    assert flushed == [True]
+
+
+def remote_manager(responses: list[int]) -> tuple[NotificationManager, list[dict]]:
+    """Manager with a webhook answering ``responses`` in turn (then 200), no outbox."""
+    sent: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = responses.pop(0) if responses else 200
+        if status == 200:
+            sent.append(json.loads(request.read()))
+        return httpx.Response(status, headers={"Retry-After": "30"})
+
+    manager = NotificationManager(
+        NotifyConfig(sound=False, outbox=False, webhook_url="http://hooks.test/", rate_limits={})
+    )
+    manager.notifiers[0].client = httpx.Client(transport=httpx.MockTransport(handler))
+    return manager, sent
+
+
+def test_rate_limited_messages_are_held_not_dropped(clock, timers):
+    manager, sent = remote_manager([])
+    manager.notifiers[0].limiter = TokenBucket(1, 60)
+    for i in range(3):
+        manager.notify_arrival(Device(mac=f"AA:BB:CC:DD:EE:0{i}"))
+    assert [m["title"] for m in sent] == ["Arrival"]
+    assert [round(t.interval) for t in timers.started] == [60]
+
+    clock.now += 60
+    timers.fire()
+    assert [m["title"] for m in sent] == ["Arrival", "2 notifications"]
+    assert sent[1]["message"].count("Arrival:") == 2
+    assert timers.started == []
+
+
+def test_message_refused_with_429_is_sent_later(clock, timers):
+    manager, sent = remote_manager([429])
+    manager.notify_departure(Device(mac="AA:BB:CC:DD:EE:01"))
+    assert sent == []
+    assert [t.interval for t in timers.started] == [30]
+
+    clock.now += 30
+    timers.fire()
+    assert [m["title"] for m in sent] == ["Departure"]
+
+
+def test_429_pause_does_not_leave_a_rate_limit(clock, timers):
+    manager, sent = remote_manager([429])
+    webhook = manager.notifiers[0]
+    manager.notify_departure(Device(mac="AA:BB:CC:DD:EE:01"))
+    clock.now += 30
+    timers.fire()
+    assert webhook.limiter is None
+
+    # Unlimited again once the pause is over
+    for i in range(5):
+        manager.notify_arrival(Device(mac=f"AA:BB:CC:DD:EE:1{i}"))
+    assert len(sent) == 6
+    assert timers.started == []
+
+
+def test_close_sends_held_messages(clock, timers):
+    manager, sent = remote_manager([])
+    manager.notifiers[0].limiter = TokenBucket(1, 60)
+    manager.notify_arrival(Device(mac="AA:BB:CC:DD:EE:01"))
+    manager.notify_arrival(Device(mac="AA:BB:CC:DD:EE:02"))
+    manager.close()
+    assert [m["title"] for m in sent] == ["Arrival", "Arrival"]
+
+
+class FlakyLauncher:
+    """Refuses the first launch (too many players running), then starts them."""
+
+    def __init__(self):
+        self.launched: list[list[str]] = []
+
+    def launch(self, args: list[str], channel: str) -> bool:
+        self.launched.append(args)
+        return len(self.launched) > 1
+
+
+def test_sound_retried_after_failed_launch(monkeypatch):
+    monkeypatch.setattr(notifier_module.sys, "platform", "linux")
+    launcher = FlakyLauncher()
+    sound = notifier_module.SoundNotifier(dedupe_window=60, launcher=launcher)
+    assert not sound.notify("Arrival", "")
+    assert sound.notify("Arrival", "")
+    assert sound.notify("Arrival", "")  # played: now deduplicated
+    assert len(launcher.launched) == 2
+
+
+def test_group_event_matches_the_changed_group():
+    rules = [{"group": "family", "event": "group_left", "message": "{group} is out"}]
+    manager, notifier = make_manager(rules=rules)
+    # The member has since been moved to another group
+    device = Device(mac="AA:BB:CC:DD:EE:01", name="Phone", group="guests")
+    manager.notify_group(GroupChange(group="family", change_type="left", device=device))
+    assert notifier.sent == ["Group Away"]
@@ -0,0 +1,76 @@
+import httpx
+import pytest
+
+from wifinder import outbox
+from wifinder.database import Database, OutboxEntry
+from wifinder.notifier import TelegramNotifier, WebhookNotifier
+from wifinder.outbox import OutboxSender
+
+
+def webhook(status: int) -> WebhookNotifier:
+    notifier = WebhookNotifier("http://hooks.test/")
+    notifier.client = httpx.Client(transport=httpx.MockTransport(lambda _: httpx.Response(status)))
+    return notifier
+
+
+def outbox_row(db: Database) -> dict:
+    with db._connection() as conn:
+        return dict(conn.execute("SELECT * FROM outbox").fetchone())
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(tmp_path / "wifinder.db")
+    db.enqueue_notifications(
+        [OutboxEntry(key="k1", channel="webhook", title="Arrival", message="hi")]
+    )
+    return db
+
+
+def test_rejected_message_is_not_retried(db):
+    sender = OutboxSender(db, [webhook(400)])
+    assert sender.drain() == 0
+
+    row = outbox_row(db)
+    assert row["failed_at"] is not None
+    assert row["last_error"].startswith("rejected: HTTP 400")
+    assert db.get_next_notification_time() is None
+    assert db.count_pending_notifications() == {}
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_transient_failure_is_retried(db, status):
+    OutboxSender(db, [webhook(status)]).drain()
+
+    row = outbox_row(db)
+    assert row["failed_at"] is None
+    assert row["attempts"] == 1
+    assert db.get_next_notification_time() is not None
+
+
+def test_gives_up_after_max_attempts(db, monkeypatch):
+    monkeypatch.setattr(outbox, "MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(outbox, "backoff", lambda attempts: 0.0)
+    sender = OutboxSender(db, [webhook(500)])
+    sender.drain()
+    sender.drain()
+
+    row = outbox_row(db)
+    assert row["attempts"] == 2
+    assert row["failed_at"] is not None
+
+
+def test_telegram_falls_back_to_plain_text():
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = request.read().decode()
+        sent.append(payload)
+        if "parse_mode" in payload:
+            return httpx.Response(400, json={"description": "can't parse entities"})
+        return httpx.Response(200, json={"ok": True})
+
+    notifier = TelegramNotifier("token", "42")
+    notifier.client = httpx.Client(transport=httpx.MockTransport(handler))
+    assert notifier.notify("Arrival", "my_phone is now home")
+    assert len(sent) == 2
@@ -0,0 +1,19 @@
+from conftest import FakeScanner
+
+from wifinder import journal
+from wifinder.database import Database, Device
+from wifinder.watcher import Watcher
+
+
+def test_known_count_with_journal(config, monkeypatch):
+    # Fold right away, as a folder thread that wins the race would
+    monkeypatch.setattr(journal.JournalFolder, "kick", journal.JournalFolder.fold)
+    config.journal = True
+    FakeScanner.devices = [Device(mac=f"AA:BB:CC:DD:EE:0{i}") for i in range(3)]
+    watcher = Watcher(config, Database(config.db_path))
+    try:
+        for _ in range(2):
+            watcher.scan_once(notify=False)
+            assert watcher.state.known_count == 3
+    finally:
+        watcher.close()
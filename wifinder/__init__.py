@@ -3,9 +3,22 @@
 __version__ = "2.0.0"
 __author__ = "Mattia Pescimoro"
 
-from .config import Config
-from .database import Database, Device
-from .scanner import Scanner
-from .watcher import Watcher
-
 __all__ = ["Config", "Database", "Device", "Scanner", "Watcher"]
+
+# Imported on first access: the scanner and watcher pull in nmap and httpx,
+# which commands that only read the database don't need
+_EXPORTS = {
+    "Config": ".config",
+    "Database": ".database",
+    "Device": ".database",
+    "Scanner": ".scanner",
+    "Watcher": ".watcher",
+}
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        from importlib import import_module
+
+        return getattr(import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
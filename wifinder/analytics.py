@@ -0,0 +1,227 @@
+"""Occupancy analytics over presence history.
+
+Events are loaded once into NumPy arrays and turned into presence sessions,
+which are then split on hour boundaries. Every statistic (hour-of-week
+matrix, daily time at home, arrival times) is a weighted bincount over those
+session-hours, so cost grows with the number of sessions, not with Python
+loop iterations.
+
+Times are handled as wall-clock seconds (naive local time, as stored in the
+database) so hour-of-week slots line up with what people see on the clock.
+"""
+
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .database import Database
+
+HOURS_PER_WEEK = 7 * 24
+_EPOCH = datetime(1970, 1, 1)
+# 1970-01-01 was a Thursday; shift so that slot 0 is Monday 00:00
+_WEEKDAY_OFFSET = 3 * 24
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("Analytics need numpy: pip install 'wifinder[analytics]'")
+
+
+def _wall_seconds(dt: datetime) -> float:
+    return (dt - _EPOCH).total_seconds()
+
+
+@dataclass
+class OccupancyReport:
+    """Occupancy statistics for a time range."""
+
+    since: datetime
+    until: datetime
+    # mac/group -> 7x24 fraction of time present (rows Monday..Sunday)
+    devices: dict[str, list[list[float]]]
+    groups: dict[str, list[list[float]]]
+    # mac -> hours at home per day, oldest day first
+    daily_hours: dict[str, list[float]]
+    # mac -> arrivals per hour of day (24 bins)
+    arrival_hours: dict[str, list[int]]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "since": self.since.isoformat(),
+            "until": self.until.isoformat(),
+            "devices": self.devices,
+            "groups": self.groups,
+            "daily_hours": self.daily_hours,
+            "arrival_hours": self.arrival_hours,
+        }
+
+
+def compute_occupancy(
+    events: list[tuple[str, str, datetime, str | None]],
+    since: datetime,
+    until: datetime,
+) -> OccupancyReport:
+    """Compute occupancy statistics from (mac, event_type, timestamp, group) events."""
+    _require_numpy()
+
+    start = _wall_seconds(since)
+    end = _wall_seconds(until)
+    first_hour = int(start // 3600)
+    hour_count = int(np.ceil(end / 3600)) - first_hour
+    day_count = int(end // 86400) - int(start // 86400) + 1
+
+    macs = sorted({e[0] for e in events})
+    mac_codes = {mac: i for i, mac in enumerate(macs)}
+    group_of = {e[0]: e[3] for e in events if e[3]}
+    groups = sorted(set(group_of.values()))
+
+    empty = OccupancyReport(since, until, {}, {}, {}, {})
+    if not events or hour_count <= 0:
+        return empty
+
+    code = np.fromiter((mac_codes[e[0]] for e in events), dtype=np.int64, count=len(events))
+    ts = np.fromiter((_wall_seconds(e[2]) for e in events), dtype=np.float64, count=len(events))
+    arrived = np.fromiter((e[1] == "arrived" for e in events), dtype=bool, count=len(events))
+
+    order = np.lexsort((ts, code))
+    code, ts, arrived = code[order], ts[order], arrived[order]
+
+    # A session runs from an arrival to the device's next event, or to the
+    # end of the range if there is none
+    starts = np.flatnonzero(arrived)
+    following = starts + 1
+    has_next = following < len(ts)
+    has_next[has_next] = code[following[has_next]] == code[starts[has_next]]
+    session_code = code[starts]
+    session_start = ts[starts]
+    session_end = np.full(len(starts), end)
+    session_end[has_next] = ts[following[has_next]]
+
+    # Split sessions on hour boundaries: one row per (session, hour) pair
+    hour_from = (session_start // 3600).astype(np.int64)
+    hour_to = (np.maximum(session_end - 1e-6, session_start) // 3600).astype(np.int64)
+    spans = hour_to - hour_from + 1
+    row_session = np.repeat(np.arange(len(starts)), spans)
+    row_hour = hour_from[row_session] + (
+        np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+    )
+    seconds = np.minimum(session_end[row_session], (row_hour + 1) * 3600.0) - np.maximum(
+        session_start[row_session], row_hour * 3600.0
+    )
+    seconds = np.clip(seconds, 0, None)
+    row_code = session_code[row_session]
+
+    # How many times each hour-of-week slot occurs in the range
+    all_hours = np.arange(first_hour, first_hour + hour_count)
+    slot_occurrences = np.bincount(
+        (all_hours + _WEEKDAY_OFFSET) % HOURS_PER_WEEK, minlength=HOURS_PER_WEEK
+    ).astype(np.float64)
+    slot_occurrences[slot_occurrences == 0] = np.nan
+
+    def to_matrix(slot_seconds: np.ndarray) -> list[list[float]]:
+        fraction = np.nan_to_num(slot_seconds / (3600.0 * slot_occurrences))
+        return np.round(fraction, 3).reshape(7, 24).tolist()
+
+    row_slot = (row_hour + _WEEKDAY_OFFSET) % HOURS_PER_WEEK
+    device_slots = np.bincount(
+        row_code * HOURS_PER_WEEK + row_slot,
+        weights=seconds,
+        minlength=len(macs) * HOURS_PER_WEEK,
+    ).reshape(len(macs), HOURS_PER_WEEK)
+
+    # Group presence per hour is the best-covered member for that hour
+    group_matrices: dict[str, list[list[float]]] = {}
+    if groups:
+        group_codes = {g: i for i, g in enumerate(groups)}
+        device_group = np.array([group_codes.get(group_of.get(mac), -1) for mac in macs])
+        row_group = device_group[row_code]
+        in_group = row_group >= 0
+        relative_hour = row_hour[in_group] - first_hour
+        in_range = (relative_hour >= 0) & (relative_hour < hour_count)
+        group_hours = np.zeros(len(groups) * hour_count)
+        np.maximum.at(
+            group_hours,
+            row_group[in_group][in_range] * hour_count + relative_hour[in_range],
+            seconds[in_group][in_range],
+        )
+        group_hours = group_hours.reshape(len(groups), hour_count)
+        hour_slots = (all_hours + _WEEKDAY_OFFSET) % HOURS_PER_WEEK
+        for group, i in group_codes.items():
+            group_matrices[group] = to_matrix(
+                np.bincount(hour_slots, weights=group_hours[i], minlength=HOURS_PER_WEEK)
+            )
+
+    first_day = int(start // 86400)
+    row_day = row_hour // 24 - first_day
+    in_days = (row_day >= 0) & (row_day < day_count)
+    daily = np.bincount(
+        row_code[in_days] * day_count + row_day[in_days],
+        weights=seconds[in_days],
+        minlength=len(macs) * day_count,
+    ).reshape(len(macs), day_count) / 3600.0
+
+    # Synthetic arrivals at the range start are not real arrivals
+    real_arrival = arrived & (ts > start)
+    arrival_hour = ((ts[real_arrival] // 3600) % 24).astype(np.int64)
+    arrivals = np.bincount(
+        code[real_arrival] * 24 + arrival_hour, minlength=len(macs) * 24
+    ).reshape(len(macs), 24)
+
+    return OccupancyReport(
+        since=since,
+        until=until,
+        devices={mac: to_matrix(device_slots[i]) for i, mac in enumerate(macs)},
+        groups=group_matrices,
+        daily_hours={mac: np.round(daily[i], 2).tolist() for i, mac in enumerate(macs)},
+        arrival_hours={mac: arrivals[i].tolist() for i, mac in enumerate(macs)},
+    )
+
+
+class OccupancyAnalytics:
+    """Occupancy reports over the database, cached until new events arrive."""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._cache: dict[tuple, OccupancyReport] = {}
+        self._cache_event_id = -1
+        self._lock = threading.Lock()
+
+    def occupancy(
+        self,
+        days: int = 30,
+        mac: str | None = None,
+        group: str | None = None,
+    ) -> OccupancyReport:
+        """Occupancy over the last ``days`` days, optionally for one device or group."""
+        _require_numpy()
+
+        key = (days, mac.upper() if mac else None, group)
+        last_event_id = self.db.get_last_event_id()
+
+        with self._lock:
+            if last_event_id != self._cache_event_id:
+                self._cache.clear()
+                self._cache_event_id = last_event_id
+            if key in self._cache:
+                return self._cache[key]
+
+        until = datetime.now()
+        since = until - timedelta(days=days)
+        events = self.db.get_presence_events(since, until)
+        if mac:
+            events = [e for e in events if e[0] == mac.upper()]
+        if group:
+            events = [e for e in events if e[3] == group]
+
+        report = compute_occupancy(events, since, until)
+
+        with self._lock:
+            if last_event_id == self._cache_event_id:
+                self._cache[key] = report
+        return report
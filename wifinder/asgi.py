@@ -0,0 +1,297 @@
+"""ASGI variant of the web UI.
+
+``wifinder serve --asgi`` runs the app below on an asyncio server (uvicorn).
+The watcher is scheduled on the server's event loop, and every scan is
+pushed to clients of ``/api/events`` (server-sent events). An idle event
+stream is one suspended coroutine, so thousands of open dashboards cost
+little memory and no threads.
+
+All other routes are the Flask app from web.py, called on a small thread
+pool, so both servers answer the same URLs the same way.
+"""
+
+import asyncio
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Awaitable, Callable, Iterable
+
+from .config import Config
+from .database import Database
+from .profiling import Profiler
+from .watcher import PresenceChange, Watcher
+from .web import create_app
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+
+KEEPALIVE_SECONDS = 15.0
+
+
+class Broadcast:
+    """Latest-message broadcast.
+
+    Subscribers remember the sequence number they last sent; a slow one
+    skips straight to the newest message instead of queueing a backlog.
+    """
+
+    def __init__(self):
+        self.sequence = 0
+        self._message = b""
+        self._cond = asyncio.Condition()
+
+    async def publish(self, message: bytes) -> None:
+        async with self._cond:
+            self.sequence += 1
+            self._message = message
+            self._cond.notify_all()
+
+    async def next(self, after: int) -> tuple[int, bytes]:
+        """Wait for a message newer than ``after``."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.sequence > after)
+            return self.sequence, self._message
+
+
+def _event(name: str, data: dict[str, Any]) -> bytes:
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+
+
+def _change_dict(change: PresenceChange) -> dict[str, Any]:
+    return {
+        "mac": change.device.mac,
+        "name": change.device.display_name,
+        "change": change.change_type,
+    }
+
+
+def _wsgi_environ(scope: Scope, body: bytes) -> dict[str, Any]:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ: dict[str, Any] = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ[name] = value
+            continue
+        if name == "CONTENT_LENGTH":
+            continue  # the body is already read: use its actual length
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class ASGIApp:
+    """The web UI as an ASGI application (see the module docstring)."""
+
+    def __init__(self, config: Config, profile: bool = False, threads: int = 8):
+        self.config = config
+        profiler = Profiler.for_config(config) if profile else None
+        self.watcher = Watcher(config, Database(config.db_path), profiler=profiler)
+        self.wsgi = create_app(config, watcher=self.watcher)
+        self.broadcast: Broadcast | None = None
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="wifinder-web")
+        self._stop: asyncio.Event | None = None
+        self._watch_task: asyncio.Task | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["path"] == "/api/events" and scope["method"] == "GET":
+                await self._events(receive, send)
+            else:
+                await self._call_wsgi(scope, receive, send)
+        # Websockets are not used: the server rejects them when we return
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self) -> None:
+        """Start the watcher on the running loop, resuming its last run if it can."""
+        self.broadcast = Broadcast()
+        self._stop = asyncio.Event()
+        await asyncio.to_thread(self.watcher.restore_snapshot)
+        self._watch_task = asyncio.create_task(self.watcher.run_async(
+            self._stop, first_delay=self.watcher.resume_delay(), on_scan=self._on_scan
+        ))
+
+    async def shutdown(self) -> None:
+        """Stop the watcher after its current scan, then flush the journal."""
+        if self._stop and self._watch_task:
+            self._stop.set()
+            await self._watch_task
+        await asyncio.to_thread(self.watcher.close)
+        self._executor.shutdown(wait=False)
+
+    async def _on_scan(self, watcher: Watcher, changes: list[PresenceChange]) -> None:
+        if self.broadcast:
+            await self.broadcast.publish(_event("scan", {
+                **watcher.state_dict(),
+                "changes": [_change_dict(c) for c in changes],
+            }))
+
+    async def _events(self, receive: Receive, send: Send) -> None:
+        """Server-sent events: one "scan" event after every scan."""
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),  # don't let nginx buffer the stream
+            ],
+        })
+        await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+        if self.broadcast is None:
+            # Server started without lifespan support: nothing will ever be pushed
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def disconnected() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        disconnect = asyncio.ensure_future(disconnected())
+        waiter: asyncio.Future | None = None
+        sequence = self.broadcast.sequence
+        try:
+            while True:
+                waiter = waiter or asyncio.ensure_future(self.broadcast.next(sequence))
+                done, _ = await asyncio.wait(
+                    {waiter, disconnect},
+                    timeout=KEEPALIVE_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnect in done:
+                    return
+                if waiter in done:
+                    sequence, body = waiter.result()
+                    waiter = None
+                else:
+                    body = b": keepalive\n\n"
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+        finally:
+            disconnect.cancel()
+            if waiter:
+                waiter.cancel()
+
+    async def _call_wsgi(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Answer a request with the Flask app, run on the thread pool."""
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        response: dict[str, Any] = {}
+        # Body chunks from the pool thread; None once the response is complete
+        chunks: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=4)
+        aborted = threading.Event()
+
+        def start_response(status: str, headers: list[tuple[str, str]], exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers
+            ]
+            return lambda data: None  # write() is never used by Flask
+
+        def put(chunk: bytes | None) -> None:
+            if not aborted.is_set():
+                asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+
+        def respond() -> None:
+            # The whole response runs on one pool thread: streamed bodies
+            # (exports) read through a SQLite connection bound to that thread
+            try:
+                result: Iterable[bytes] = self.wsgi.wsgi_app(
+                    _wsgi_environ(scope, bytes(body)), start_response
+                )
+                try:
+                    for chunk in result:
+                        if chunk:
+                            put(chunk)
+                finally:
+                    close = getattr(result, "close", None)
+                    if close:
+                        close()
+            finally:
+                put(None)
+
+        job = loop.run_in_executor(self._executor, respond)
+        try:
+            chunk = await chunks.get()
+            if "status" not in response:
+                # The app failed before starting a response (its error surfaces from the job)
+                await send({
+                    "type": "http.response.start",
+                    "status": 500,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+                })
+                await send({"type": "http.response.body", "body": b"Internal Server Error"})
+                return
+            await send({
+                "type": "http.response.start",
+                "status": response["status"],
+                "headers": response["headers"],
+            })
+            while chunk is not None:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await chunks.get()
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            # Client gone mid-stream: let the pool thread finish without us
+            aborted.set()
+            while not chunks.empty():
+                chunks.get_nowait()
+            await job
+
+
+def serve_asgi(config: Config, profile: bool = False) -> None:
+    """Serve the ASGI app with uvicorn."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("The ASGI server needs uvicorn: pip install 'wifinder[asgi]'") from None
+
+    uvicorn.run(
+        ASGIApp(config, profile=profile),
+        host=config.web_host,
+        port=config.web_port,
+        lifespan="on",
+        log_level="warning",
+    )
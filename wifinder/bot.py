@@ -0,0 +1,139 @@
+"""Telegram bot answering "who is home?".
+
+With ``notify.telegram_bot`` enabled, the watcher runs a background thread
+that long-polls Telegram's getUpdates and answers commands sent in the
+configured chat:
+
+    /who              who is home right now
+    /device <name>    whether a device (name or MAC) is home
+    /history          the latest arrivals and departures
+
+Answers come from the watcher's in-memory state, refreshed every scan, so a
+chat message never waits on the database. Requests go through the Telegram
+notifier's pooled HTTP client; point ``notify.telegram_api_url`` at a local
+server to try the bot without Telegram.
+"""
+
+import threading
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from .database import Device
+from .notifier import TelegramNotifier
+
+if TYPE_CHECKING:
+    from .watcher import Watcher
+
+POLL_TIMEOUT = 30  # seconds Telegram holds a getUpdates request open
+ERROR_BACKOFF = 5.0
+HISTORY_LINES = 10
+
+HELP = """\
+/who - who is home
+/device <name> - is this device home?
+/history - latest arrivals and departures"""
+
+CHANGE_VERBS = {"new": "joined (new device)", "arrived": "arrived", "left": "left"}
+
+
+def _when(ts: datetime) -> str:
+    if ts.date() == datetime.now().date():
+        return f"{ts:%H:%M}"
+    return f"{ts:%a %d %b %H:%M}"
+
+
+class TelegramBot(threading.Thread):
+    """Background thread answering bot commands from the watcher's state."""
+
+    def __init__(
+        self, telegram: TelegramNotifier, watcher: "Watcher", poll_timeout: int = POLL_TIMEOUT
+    ):
+        super().__init__(daemon=True, name="wifinder-telegram-bot")
+        self.telegram = telegram
+        self.watcher = watcher
+        self.poll_timeout = poll_timeout
+        self.offset: int | None = None  # update_id + 1 of the last handled update
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                if self.offset is None:
+                    self._skip_backlog()
+                    continue
+                updates = self.telegram.get_updates(self.offset, timeout=self.poll_timeout)
+            except Exception as e:
+                if self._stopping.is_set():
+                    return
+                print(f"Telegram bot error: {e}")
+                self._stopping.wait(ERROR_BACKOFF)
+                continue
+
+            for update in updates:
+                self.offset = update["update_id"] + 1
+                try:
+                    self.handle(update)
+                except Exception as e:
+                    print(f"Telegram bot error: {e}")
+
+    def _skip_backlog(self) -> None:
+        """Start after the newest update: commands sent while we were down are stale."""
+        updates = self.telegram.get_updates(-1)
+        self.offset = updates[-1]["update_id"] + 1 if updates else 0
+
+    def handle(self, update: dict) -> None:
+        """Answer one update, if it is a command from the configured chat."""
+        message = update.get("message") or {}
+        text = (message.get("text") or "").strip()
+        chat_id = (message.get("chat") or {}).get("id")
+        if not text.startswith("/") or str(chat_id) != str(self.telegram.chat_id):
+            return
+        self.telegram.send_message(self.answer(text), chat_id=chat_id)
+
+    def answer(self, text: str) -> str:
+        """Reply to a command like "/device phone"."""
+        command, _, argument = text.partition(" ")
+        command = command[1:].split("@")[0].lower()  # "/who@MyBot" in group chats
+        if command == "who":
+            return self.watcher.get_summary()
+        if command == "device":
+            return self._device(argument.strip())
+        if command == "history":
+            return self._history()
+        if command in ("start", "help"):
+            return HELP
+        return f"Unknown command /{command}\n\n{HELP}"
+
+    def _device(self, query: str) -> str:
+        if not query:
+            return "Usage: /device <name or MAC>"
+        needle = query.lower()
+
+        def matches(device: Device) -> bool:
+            return needle in device.display_name.lower() or needle in device.mac.lower()
+
+        home = [d for d in self.watcher.get_who_is_home() if matches(d)]
+        if home:
+            return "\n".join(
+                f"{d.display_name} is home ({d.ip or 'no IP'}, seen {_when(d.last_seen)})"
+                if d.last_seen else f"{d.display_name} is home"
+                for d in home
+            )
+        for ts, change in self.watcher.get_recent_changes():
+            if change.change_type == "left" and matches(change.device):
+                return f"{change.device.display_name} left at {_when(ts)}"
+        return f"No device matching '{query}' is home"
+
+    def _history(self) -> str:
+        changes = self.watcher.get_recent_changes(HISTORY_LINES)
+        if not changes:
+            return "No arrivals or departures since the watcher started"
+        return "\n".join(
+            f"{_when(ts)} {change.device.display_name} {CHANGE_VERBS[change.change_type]}"
+            for ts, change in changes
+        )
+
+    def stop(self) -> None:
+        """Stop polling (a long poll in flight is abandoned, not awaited)."""
+        self._stopping.set()
+        self.join(timeout=1)
@@ -1,15 +1,25 @@
-"""Command-line interface for WiFinder."""
+"""Command-line interface for WiFinder.
+
+Commands import what they need when they run: read-only ones (list, log,
+db-path...) only touch SQLite and start fast, without the scanner,
+notifier and HTTP stacks. Check with ``python benchmarks/import_time.py``.
+"""
 
 import time
+from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import typer
 from rich.console import Console
+from rich.markup import escape
 from rich.table import Table
 
 from .config import Config, DEFAULT_CONFIG_FILE, DEFAULT_DB_FILE, get_default_network
 from .database import Database
-from .watcher import Watcher, PresenceChange
+
+if TYPE_CHECKING:
+    from .rules import Rule
 
 app = typer.Typer(
     name="wifinder",
@@ -36,6 +46,12 @@ def watch(
     panic: bool = typer.Option(False, "--panic", "-p"),
     silent: bool = typer.Option(False, "--silent", "-s"),
     daemon: bool = typer.Option(False, "--daemon", "-d", help="Run in background"),
+    metrics_port: int = typer.Option(
+        None, "--metrics-port", help="Serve Prometheus metrics on this port"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="Profile scan cycles, keeping the slowest ones"
+    ),
 ):
     """Monitor network continuously."""
     if daemon:
@@ -52,6 +68,10 @@ def watch(
             args.append("-p")
         if silent:
             args.append("-s")
+        if metrics_port:
+            args.extend(["--metrics-port", str(metrics_port)])
+        if profile:
+            args.append("--profile")
         
         if sys.platform == "win32":
             subprocess.Popen(args, creationflags=subprocess.DETACHED_PROCESS | subprocess.CREATE_NO_WINDOW)
@@ -69,6 +89,9 @@ def watch(
         config.panic.enabled = True
         config.panic.only_unknown = False
 
+    from .profiling import Profiler
+    from .watcher import PresenceChange, Watcher
+
     db = Database(config.db_path)
 
     def on_change(change: PresenceChange):
@@ -80,25 +103,46 @@ def watch(
         elif change.change_type == "left":
             console.print(f"[dim]{ts}[/dim] [red]○[/red] {change.device.display_name}")
 
-    watcher = Watcher(config, db, on_change=on_change)
+    profiler = Profiler.for_config(config) if profile else None
+    watcher = Watcher(config, db, on_change=on_change, profiler=profiler)
 
     console.print(f"Watching {config.network}")
     if panic:
         console.print("[red]PANIC MODE[/red]")
     if silent:
         console.print("[dim]Silent[/dim]")
-    console.print(f"[dim]Scan interval: {config.interval}s[/dim]\n")
-
-    # Initial scan
-    watcher.scan_once(notify=False)
-    console.print(f"[dim]{watcher.state.online_count} online[/dim]\n")
+    console.print(f"[dim]Scan interval: {config.interval}s[/dim]")
+    if metrics_port:
+        from .metrics import start_http_server
+
+        start_http_server(metrics_port)
+        console.print(f"[dim]Metrics: http://0.0.0.0:{metrics_port}/metrics[/dim]")
+    if watcher.profiler:
+        console.print(f"[dim]Profiles: {watcher.profiler.output_dir}[/dim]")
+    console.print()
+
+    # Carry on from the last run if it left a snapshot, else an initial scan
+    if watcher.restore_snapshot():
+        console.print(f"[dim]{watcher.state.online_count} online (resumed)[/dim]\n")
+        first_delay = watcher.resume_delay()
+    else:
+        watcher.scan_once(notify=False)
+        console.print(f"[dim]{watcher.state.online_count} online[/dim]\n")
+        first_delay = config.interval
 
     try:
-        while True:
-            time.sleep(config.interval)
-            watcher.scan_once(notify=not silent)
+        watcher.run(notify=not silent, first_delay=first_delay)
     except KeyboardInterrupt:
         console.print("\n[dim]Stopped[/dim]")
+    finally:
+        watcher.close()
+
+    if watcher.profiler:
+        console.print("\n[bold]Slowest scans[/bold]")
+        for cycle in watcher.profiler.slowest():
+            phases = sorted(cycle.phases.items(), key=lambda p: p[1], reverse=True)[:3]
+            top = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in phases)
+            console.print(f"  #{cycle.id} {cycle.duration:.2f}s [dim]{top}[/dim]")
 
 
 @app.command()
@@ -107,6 +151,8 @@ def scan(
     network: str = typer.Option(None, "--network", "-n", help="Network to scan (e.g. 192.168.1.0/24)"),
 ):
     """Single network scan."""
+    from .watcher import Watcher
+
     config = get_config(config_path)
     if network:
         config.network = network
@@ -114,6 +160,7 @@ def scan(
     watcher = Watcher(config, db)
 
     watcher.scan_once(notify=False)
+    watcher.close()
     online = db.get_online_devices()
 
     if not online:
@@ -133,9 +180,22 @@ def serve(
     network: str = typer.Option(None, "--network", "-n", help="Network to scan (e.g. 192.168.1.0/24)"),
     port: int = typer.Option(None, "--port", "-p"),
     host: str = typer.Option(None, "--host", "-H"),
+    workers: int = typer.Option(
+        0, "--workers", "-w", help="Serve with N worker processes and one scanner (gunicorn)"
+    ),
+    asgi: bool = typer.Option(
+        False, "--asgi", help="Serve on an asyncio server with live updates (uvicorn)"
+    ),
     daemon: bool = typer.Option(False, "--daemon", "-d", help="Run in background"),
+    profile: bool = typer.Option(
+        False, "--profile", help="Profile scan cycles (see /debug/profile)"
+    ),
 ):
     """Start web UI."""
+    if asgi and workers:
+        console.print("[red]--asgi and --workers can't be combined[/red]")
+        raise typer.Exit(1)
+
     if daemon:
         import subprocess
         import sys
@@ -148,6 +208,12 @@ def serve(
             args.extend(["-p", str(port)])
         if host:
             args.extend(["-H", host])
+        if workers:
+            args.extend(["-w", str(workers)])
+        if asgi:
+            args.append("--asgi")
+        if profile:
+            args.append("--profile")
         
         if sys.platform == "win32":
             subprocess.Popen(args, creationflags=subprocess.DETACHED_PROCESS | subprocess.CREATE_NO_WINDOW)
@@ -164,14 +230,63 @@ def serve(
     if host:
         config.web_host = host
 
+    if workers:
+        from .server import serve_workers
+
+        console.print(f"Web UI: http://{config.web_host}:{config.web_port}")
+        console.print(f"[dim]Scanning: {config.network} · {workers} workers[/dim]")
+        try:
+            serve_workers(config, config_path, workers, profile=profile)
+        except RuntimeError as e:
+            console.print(f"[red]{escape(str(e))}[/red]")
+            raise typer.Exit(1)
+        return
+
+    if asgi:
+        from .asgi import serve_asgi
+
+        console.print(f"Web UI: http://{config.web_host}:{config.web_port}")
+        console.print(f"[dim]Scanning: {config.network} · asgi[/dim]")
+        try:
+            serve_asgi(config, profile=profile)
+        except RuntimeError as e:
+            console.print(f"[red]{escape(str(e))}[/red]")
+            raise typer.Exit(1)
+        return
+
     from .web import create_app
-    web_app = create_app(config)
+    web_app = create_app(config, profile=profile)
 
     console.print(f"Web UI: http://{config.web_host}:{config.web_port}")
     console.print(f"[dim]Scanning: {config.network}[/dim]")
     web_app.run(host=config.web_host, port=config.web_port, debug=False)
 
 
+@app.command(hidden=True)
+def leader(
+    config_path: Path = typer.Option(None, "--config", "-c"),
+    network: str = typer.Option(None, "--network", "-n"),
+    profile: bool = typer.Option(False, "--profile"),
+):
+    """Scan and publish state for web workers (started by serve --workers)."""
+    import signal
+    import threading
+
+    from .server import run_leader
+
+    config = get_config(config_path)
+    if network:
+        config.network = network
+
+    # serve --workers stops us with SIGTERM: finish the current scan and clean up
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        run_leader(config, stop, profile=profile)
+    except KeyboardInterrupt:
+        pass
+
+
 @app.command(name="list")
 def list_devices(
     config_path: Path = typer.Option(None, "--config", "-c"),
@@ -224,6 +339,44 @@ def add(
         console.print(f"[green]✓[/green] {name}")
 
 
+@app.command(name="import")
+def import_devices(
+    path: Path = typer.Argument(..., help="CSV with mac,name,group columns"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Validate without saving"),
+    config_path: Path = typer.Option(None, "--config", "-c"),
+):
+    """Name/group many devices from a CSV file."""
+    from .importer import import_devices as run_import, read_csv
+
+    config = get_config(config_path)
+    db = Database(config.db_path)
+
+    try:
+        with open(path, newline="") as f:
+            results = run_import(db, read_csv(f), dry_run=dry_run)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]{escape(str(e))}[/red]")
+        raise typer.Exit(1)
+
+    for r in results:
+        if r.status == "error":
+            console.print(
+                f"[red]✗[/red] row {r.row}: {escape(r.mac or '-')} [dim]{r.error}[/dim]"
+            )
+
+    counts = {
+        status: sum(r.status == status for r in results)
+        for status in ("created", "updated", "error")
+    }
+    prefix = "[dim](dry run)[/dim] " if dry_run else ""
+    console.print(
+        f"{prefix}[green]✓[/green] {counts['updated']} updated, {counts['created']} new"
+        + (f", [red]{counts['error']} invalid[/red]" if counts["error"] else "")
+    )
+    if counts["error"]:
+        raise typer.Exit(1)
+
+
 @app.command()
 def log(
     mac: str = typer.Argument(None),
@@ -248,6 +401,227 @@ def log(
         console.print(f"[dim]{ts}[/dim] [{color}]{symbol}[/{color}] {name}")
 
 
+@app.command()
+def export(
+    table: str = typer.Argument(..., help="devices or history"),
+    output: Path = typer.Option(None, "--output", "-o", help="Output file (default: stdout)"),
+    fmt: str = typer.Option("csv", "--format", "-f", help="csv, ndjson or parquet"),
+    since: datetime = typer.Option(None, "--since", help="Only rows from this time"),
+    until: datetime = typer.Option(None, "--until", help="Only rows before this time"),
+    watermark: str = typer.Option(
+        None, "--watermark", "-w", help="Only rows newer than the last export with this name"
+    ),
+    config_path: Path = typer.Option(None, "--config", "-c"),
+):
+    """Export devices or history."""
+    import sys
+
+    from .export import FORMATS, Export
+
+    if fmt not in FORMATS:
+        console.print(f"[red]Unknown format:[/red] {fmt}")
+        raise typer.Exit(1)
+    if fmt == "parquet" and output is None:
+        console.print("[red]Parquet needs --output[/red]")
+        raise typer.Exit(1)
+
+    config = get_config(config_path)
+    db = Database(config.db_path)
+
+    try:
+        job = Export(db, table, since=since, until=until, watermark=watermark)
+        count = job.write(fmt, output if output else sys.stdout)
+    except (ValueError, RuntimeError) as e:
+        console.print(f"[red]{escape(str(e))}[/red]")
+        raise typer.Exit(1)
+
+    if output:
+        console.print(f"[green]✓[/green] {count:,} rows → {output}")
+
+
+@app.command()
+def uptime(
+    mac: str = typer.Argument(None),
+    days: int = typer.Option(7, "--days", "-d"),
+    config_path: Path = typer.Option(None, "--config", "-c"),
+):
+    """Show how reliably devices answer scans."""
+    config = get_config(config_path)
+    db = Database(config.db_path)
+
+    stats = db.get_sighting_stats(days=days, mac=mac)
+    if not stats:
+        console.print("[dim]No sightings[/dim]")
+        return
+
+    names = {d.mac: d.display_name for d in db.get_all_devices()}
+    table = Table(show_header=True, box=None, header_style="dim")
+    table.add_column("device")
+    table.add_column("uptime", justify="right", style="cyan")
+    table.add_column("flaky", justify="right", style="dim")
+    table.add_column("seen", justify="right", style="dim")
+
+    for s in sorted(stats, key=lambda s: -s.uptime):
+        table.add_row(
+            names.get(s.mac, s.mac), f"{s.uptime:.1f}%", f"{s.flakiness:.2f}", f"{s.seen}/{s.scans}"
+        )
+
+    console.print(table)
+
+
+@app.command()
+def scans(
+    days: int = typer.Option(7, "--days", "-d"),
+    by: str = typer.Option("day", "--by", "-b", help="Group by hour or day"),
+    config_path: Path = typer.Option(None, "--config", "-c"),
+):
+    """Show how long scans take over time."""
+    config = get_config(config_path)
+    db = Database(config.db_path)
+
+    try:
+        stats = db.get_scan_stats(days=days, by=by)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    if not stats:
+        console.print("[dim]No scans recorded[/dim]")
+        return
+
+    table = Table(show_header=True, box=None, header_style="dim")
+    table.add_column(by)
+    table.add_column("scans", justify="right", style="dim")
+    table.add_column("p50", justify="right", style="cyan")
+    table.add_column("p90", justify="right")
+    table.add_column("p99", justify="right")
+    table.add_column("max", justify="right", style="dim")
+    table.add_column("hosts", justify="right", style="dim")
+    table.add_column("errors", justify="right")
+
+    for s in stats:
+        table.add_row(
+            s.period.replace("T", " "),
+            str(s.runs),
+            f"{s.p50:.1f}s",
+            f"{s.p90:.1f}s",
+            f"{s.p99:.1f}s",
+            f"{s.max:.1f}s",
+            f"{s.hosts_up:.0f}",
+            f"[red]{s.errors}[/red]" if s.errors else "[dim]0[/dim]",
+        )
+
+    console.print(table)
+
+
+def _describe_rule(rule: "Rule") -> str:
+    if rule.action == "notify" and rule.channels is not None:
+        return f"notify → {', '.join(sorted(rule.channels)) or 'nobody'}"
+    return rule.action
+
+
+@app.command()
+def rules(
+    mac: str = typer.Option(None, "--mac", "-m", help="Show which rule applies to this device now"),
+    config_path: Path = typer.Option(None, "--config", "-c"),
+):
+    """Show notification rules, in the order they are checked."""
+    from .rules import DEVICE_EVENTS, EVENTS, RuleSet, legacy_rules
+
+    config = get_config(config_path)
+    entries = list(config.notify.rules or []) + legacy_rules(config.notify, config.panic)
+    try:
+        ruleset = RuleSet(entries)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+
+    table = Table(show_header=True, box=None, header_style="dim")
+    table.add_column("#", justify="right", style="dim")
+    table.add_column("rule")
+    table.add_column("match", style="cyan")
+    table.add_column("action")
+    for i, (data, rule) in enumerate(zip(entries, ruleset.rules), 1):
+        match = "  ".join(
+            f"{k}={v}" for k, v in data.items()
+            if k not in ("name", "action", "channels", "message")
+        )
+        table.add_row(
+            str(i), escape(data.get("name", "")), escape(match or "any"), _describe_rule(rule)
+        )
+    if entries:
+        console.print(table)
+    else:
+        console.print("[dim]No rules: every event goes to every channel[/dim]")
+
+    if mac:
+        device = Database(config.db_path).get_device(mac.upper())
+        if device is None:
+            console.print(f"[red]Unknown device {mac}[/red]")
+            raise typer.Exit(1)
+        console.print(f"\n[bold]{escape(device.display_name)}[/bold] right now:")
+        for event in EVENTS:
+            rule = ruleset.match(device, event)
+            if rule is None:
+                action = "notify" if event in DEVICE_EVENTS else "not sent"
+                console.print(f"  {event:13} {action} [dim](no rule)[/dim]")
+            else:
+                console.print(
+                    f"  {event:13} {_describe_rule(rule)} [dim]({escape(rule.name)})[/dim]"
+                )
+
+
+@app.command()
+def occupancy(
+    mac: str = typer.Argument(None),
+    group: str = typer.Option(None, "--group", "-g"),
+    days: int = typer.Option(30, "--days", "-d"),
+    config_path: Path = typer.Option(None, "--config", "-c"),
+):
+    """Show when devices are home."""
+    from .analytics import OccupancyAnalytics
+
+    config = get_config(config_path)
+    db = Database(config.db_path)
+
+    try:
+        report = OccupancyAnalytics(db).occupancy(days=days, mac=mac, group=group)
+    except RuntimeError as e:
+        console.print(f"[red]{escape(str(e))}[/red]")
+        raise typer.Exit(1)
+
+    if mac or group:
+        matrix = report.groups.get(group) if group else report.devices.get(mac.upper())
+        if not matrix:
+            console.print("[dim]No history[/dim]")
+            return
+
+        shades = " ░▒▓█"
+        console.print("[dim]     " + "".join(f"{h:<3}" for h in range(0, 24, 3)) + "[/dim]")
+        for day, row in zip(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], matrix):
+            cells = "".join(shades[min(int(v * len(shades)), len(shades) - 1)] for v in row)
+            console.print(f"[dim]{day}[/dim]  [cyan]{cells}[/cyan]")
+        return
+
+    if not report.devices:
+        console.print("[dim]No history[/dim]")
+        return
+
+    names = {d.mac: d.display_name for d in db.get_all_devices()}
+    table = Table(show_header=True, box=None, header_style="dim")
+    table.add_column("device")
+    table.add_column("h/day", justify="right", style="cyan")
+    table.add_column("usually arrives", justify="right", style="dim")
+
+    for device_mac, hours in sorted(
+        report.daily_hours.items(), key=lambda item: -sum(item[1])
+    ):
+        arrivals = report.arrival_hours[device_mac]
+        usual = f"{arrivals.index(max(arrivals)):02d}:00" if any(arrivals) else "-"
+        table.add_row(names.get(device_mac, device_mac), f"{sum(hours) / len(hours):.1f}", usual)
+
+    console.print(table)
+
+
 @app.command(name="db-path")
 def db_path(config_path: Path = typer.Option(None, "--config", "-c")):
     """Show config and database paths."""
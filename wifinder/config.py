@@ -4,11 +4,11 @@ from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
-import yaml
-
 DEFAULT_CONFIG_DIR = Path.home() / ".config" / "wifinder"
 DEFAULT_CONFIG_FILE = DEFAULT_CONFIG_DIR / "config.yaml"
 DEFAULT_DB_FILE = DEFAULT_CONFIG_DIR / "wifinder.db"
+# Channels set in notify.rate_limits replace these; null lifts a limit
+DEFAULT_RATE_LIMITS = {"telegram": "20/minute"}
 
 
 @dataclass
@@ -19,9 +19,23 @@ class NotifyConfig:
     desktop: bool = False
     telegram_token: str | None = None
     telegram_chat_id: str | None = None
+    # Answer /who, /device and /history in the Telegram chat (long-polls getUpdates)
+    telegram_bot: bool = False
+    telegram_api_url: str = "https://api.telegram.org"
     webhook_url: str | None = None
     quiet_hours_start: int | None = None  # Hour (0-23)
     quiet_hours_end: int | None = None
+    http2: bool = False  # Telegram/webhook over HTTP/2 (needs httpx[http2])
+    # Changes are gathered per scan (or over digest_window seconds); past
+    # digest_max_messages of them, each channel gets a single digest instead
+    digest_window: int = 0
+    digest_max_messages: int = 3
+    # Deliver Telegram/webhook messages from a durable outbox, retrying until they succeed
+    outbox: bool = True
+    # Per-channel limits like "20/minute" (Telegram throttles bots per chat)
+    rate_limits: dict[str, str | None] = field(default_factory=lambda: dict(DEFAULT_RATE_LIMITS))
+    # Routing rules, first match wins (see rules.py)
+    rules: list[dict[str, Any]] = field(default_factory=list)
 
 
 @dataclass
@@ -37,6 +51,21 @@ class PanicConfig:
     custom_messages: dict[str, str] | None = None
 
 
+@dataclass
+class MqttConfig:
+    """MQTT output: retained per-device state topics (see mqtt.py)."""
+
+    host: str | None = None  # broker; MQTT is off without one
+    port: int = 1883
+    username: str | None = None
+    password: str | None = None
+    tls: bool = False
+    topic_prefix: str = "wifinder"
+    client_id: str = "wifinder"
+    keepalive: int = 60
+    batch_window: float = 0.5  # seconds to gather a burst of updates
+
+
 @dataclass
 class Config:
     """Main configuration."""
@@ -46,9 +75,15 @@ class Config:
     device_ttl: int = 180  # seconds before marking device as gone (3 min default)
     notify: NotifyConfig = field(default_factory=NotifyConfig)
     panic: PanicConfig = field(default_factory=PanicConfig)
+    mqtt: MqttConfig = field(default_factory=MqttConfig)
     web_port: int = 8080
     web_host: str = "0.0.0.0"
     db_path: Path = DEFAULT_DB_FILE
+    # Write scans to an append-only journal, folded into the DB in the background
+    journal: bool = False
+    journal_mmap: bool = False  # read the journal through mmap when folding
+    # Save watcher state so a restart resumes instead of re-discovering (snapshot.py)
+    snapshot: bool = True
 
     @classmethod
     def load(cls, path: Path = DEFAULT_CONFIG_FILE) -> "Config":
@@ -56,22 +91,34 @@ class Config:
         if not path.exists():
             return cls()
 
+        import yaml  # here rather than at the top: slow to import, and not always needed
+
         with open(path) as f:
             data = yaml.safe_load(f) or {}
 
         notify_data = data.pop("notify", {})
+        if "rate_limits" in notify_data:
+            notify_data["rate_limits"] = {
+                **DEFAULT_RATE_LIMITS,
+                **(notify_data["rate_limits"] or {}),
+            }
         notify = NotifyConfig(**notify_data)
 
         panic_data = data.pop("panic", {})
         panic = PanicConfig(**panic_data)
 
+        mqtt_data = data.pop("mqtt", {})
+        mqtt = MqttConfig(**mqtt_data)
+
         if "db_path" in data:
             data["db_path"] = Path(data["db_path"])
 
-        return cls(notify=notify, panic=panic, **data)
+        return cls(notify=notify, panic=panic, mqtt=mqtt, **data)
 
     def save(self, path: Path = DEFAULT_CONFIG_FILE) -> None:
         """Save configuration to YAML file."""
+        import yaml
+
         path.parent.mkdir(parents=True, exist_ok=True)
 
         data: dict[str, Any] = {
@@ -81,14 +128,25 @@ class Config:
             "web_port": self.web_port,
             "web_host": self.web_host,
             "db_path": str(self.db_path),
+            "journal": self.journal,
+            "journal_mmap": self.journal_mmap,
+            "snapshot": self.snapshot,
             "notify": {
                 "sound": self.notify.sound,
                 "desktop": self.notify.desktop,
                 "telegram_token": self.notify.telegram_token,
                 "telegram_chat_id": self.notify.telegram_chat_id,
+                "telegram_bot": self.notify.telegram_bot,
+                "telegram_api_url": self.notify.telegram_api_url,
                 "webhook_url": self.notify.webhook_url,
                 "quiet_hours_start": self.notify.quiet_hours_start,
                 "quiet_hours_end": self.notify.quiet_hours_end,
+                "http2": self.notify.http2,
+                "digest_window": self.notify.digest_window,
+                "digest_max_messages": self.notify.digest_max_messages,
+                "outbox": self.notify.outbox,
+                "rate_limits": self.notify.rate_limits,
+                "rules": self.notify.rules,
             },
             "panic": {
                 "enabled": self.panic.enabled,
@@ -97,6 +155,17 @@ class Config:
                 "only_unknown": self.panic.only_unknown,
                 "custom_messages": self.panic.custom_messages,
             },
+            "mqtt": {
+                "host": self.mqtt.host,
+                "port": self.mqtt.port,
+                "username": self.mqtt.username,
+                "password": self.mqtt.password,
+                "tls": self.mqtt.tls,
+                "topic_prefix": self.mqtt.topic_prefix,
+                "client_id": self.mqtt.client_id,
+                "keepalive": self.mqtt.keepalive,
+                "batch_window": self.mqtt.batch_window,
+            },
         }
 
         with open(path, "w") as f:
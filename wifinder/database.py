@@ -1,25 +1,107 @@
 """Database management for WiFinder using SQLite."""
 
+import json
+import math
 import sqlite3
+import sys
 from contextlib import contextmanager
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Iterator
+from typing import Any, Iterator
+
+from .metrics import timed_query
+
+# Columns exposed by bulk exports, per exportable table
+EXPORT_COLUMNS = {
+    "devices": ["mac", "name", "vendor", "ip", "first_seen", "last_seen", "is_online", "group"],
+    "history": ["id", "mac", "event_type", "timestamp", "device_name"],
+}
+
+
+def _to_timestamp(value: datetime | float | None) -> float | None:
+    if value is None or isinstance(value, float):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+def _intern(value: str | None) -> str | None:
+    return sys.intern(value) if value is not None else None
 
 
-@dataclass
 class Device:
-    """A network device."""
+    """A network device.
 
-    mac: str
-    name: str | None = None
-    vendor: str | None = None
-    ip: str | None = None
-    first_seen: datetime | None = None
-    last_seen: datetime | None = None
-    is_online: bool = False
-    group: str | None = None  # e.g., "family", "guests", "iot"
+    Slotted to keep large device sets small in memory: timestamps are stored
+    as float epoch seconds (datetimes are built on access) and vendor/group
+    strings are interned, so every device of one manufacturer shares a string.
+    """
+
+    __slots__ = ("mac", "name", "_vendor", "ip", "_first_seen", "_last_seen", "is_online", "_group")
+
+    def __init__(
+        self,
+        mac: str,
+        name: str | None = None,
+        vendor: str | None = None,
+        ip: str | None = None,
+        first_seen: datetime | float | None = None,
+        last_seen: datetime | float | None = None,
+        is_online: bool = False,
+        group: str | None = None,  # e.g., "family", "guests", "iot"
+    ):
+        self.mac = mac
+        self.name = name
+        self._vendor = _intern(vendor)
+        self.ip = ip
+        self._first_seen = _to_timestamp(first_seen)
+        self._last_seen = _to_timestamp(last_seen)
+        self.is_online = is_online
+        self._group = _intern(group)
+
+    @property
+    def vendor(self) -> str | None:
+        return self._vendor
+
+    @vendor.setter
+    def vendor(self, value: str | None) -> None:
+        self._vendor = _intern(value)
+
+    @property
+    def group(self) -> str | None:
+        return self._group
+
+    @group.setter
+    def group(self, value: str | None) -> None:
+        self._group = _intern(value)
+
+    @property
+    def first_seen(self) -> datetime | None:
+        return datetime.fromtimestamp(self._first_seen) if self._first_seen is not None else None
+
+    @first_seen.setter
+    def first_seen(self, value: datetime | float | None) -> None:
+        self._first_seen = _to_timestamp(value)
+
+    @property
+    def last_seen(self) -> datetime | None:
+        return datetime.fromtimestamp(self._last_seen) if self._last_seen is not None else None
+
+    @last_seen.setter
+    def last_seen(self, value: datetime | float | None) -> None:
+        self._last_seen = _to_timestamp(value)
+
+    @property
+    def first_seen_ts(self) -> float | None:
+        """First seen as epoch seconds, without building a datetime."""
+        return self._first_seen
+
+    @property
+    def last_seen_ts(self) -> float | None:
+        """Last seen as epoch seconds, without building a datetime."""
+        return self._last_seen
 
     @property
     def display_name(self) -> str:
@@ -30,17 +112,273 @@ class Device:
             return f"{self.vendor} ({self.mac[-8:]})"
         return self.mac
 
+    def _fields(self) -> tuple:
+        return (
+            self.mac,
+            self.name,
+            self._vendor,
+            self.ip,
+            self._first_seen,
+            self._last_seen,
+            self.is_online,
+            self._group,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Device):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None  # type: ignore[assignment]  # mutable, like a dataclass
+
+    def __repr__(self) -> str:
+        return (
+            f"Device(mac={self.mac!r}, name={self.name!r}, vendor={self.vendor!r}, "
+            f"ip={self.ip!r}, first_seen={self.first_seen!r}, last_seen={self.last_seen!r}, "
+            f"is_online={self.is_online!r}, group={self.group!r})"
+        )
+
+
+# Sightings row that records which slots had a scan at all
+SCAN_SLOTS_KEY = "*"
+
+
+def _set_bit(bits: bytes | None, slot: int, size: int) -> bytes:
+    """Return a copy of a sighting bitmap with one slot bit set."""
+    buffer = bytearray(bits or bytes(size))
+    buffer[slot >> 3] |= 1 << (slot & 7)
+    return bytes(buffer)
+
+
+_UPSERT_DEVICE_SQL = """
+    INSERT INTO devices (mac, name, vendor, ip, first_seen, last_seen, is_online, "group")
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(mac) DO UPDATE SET
+        name = COALESCE(excluded.name, devices.name),
+        vendor = COALESCE(excluded.vendor, devices.vendor),
+        ip = excluded.ip,
+        -- Devices registered by an import have no first_seen until scanned
+        first_seen = COALESCE(devices.first_seen, excluded.first_seen),
+        last_seen = excluded.last_seen,
+        is_online = excluded.is_online,
+        "group" = COALESCE(excluded."group", devices."group")
+"""
+
+# Name/group assignment that also registers devices not seen yet
+_ASSIGN_DEVICE_SQL = """
+    INSERT INTO devices (mac, name, "group") VALUES (?, ?, ?)
+    ON CONFLICT(mac) DO UPDATE SET
+        name = COALESCE(excluded.name, devices.name),
+        "group" = COALESCE(excluded."group", devices."group")
+"""
+
+_SET_SIGHTING_SQL = """
+    INSERT INTO sightings (mac, day, slot_seconds, bits)
+    VALUES (?, ?, ?, set_bit(NULL, ?, ?))
+    ON CONFLICT(mac, day, slot_seconds) DO UPDATE SET
+        bits = set_bit(sightings.bits, ?, ?)
+"""
+
+
+def _device_params(device: Device) -> tuple:
+    return (
+        device.mac.upper(),
+        device.name,
+        device.vendor,
+        device.ip,
+        device.first_seen or datetime.now(),
+        device.last_seen or datetime.now(),
+        device.is_online,
+        device.group,
+    )
+
+
+def _sighting_params(macs: list[str], scan_time: datetime, slot_seconds: int) -> list[tuple]:
+    """Parameters for _SET_SIGHTING_SQL: the scan slot bit for each device.
+
+    The scan itself is recorded under SCAN_SLOTS_KEY so missed scans
+    (watcher not running) don't count against devices.
+    """
+    midnight = scan_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    slot = int((scan_time - midnight).total_seconds()) // slot_seconds
+    size = (-(-86400 // slot_seconds) + 7) // 8
+    day = midnight.strftime("%Y-%m-%d")
+    return [
+        (mac.upper(), day, slot_seconds, slot, size, slot, size)
+        for mac in [SCAN_SLOTS_KEY, *macs]
+    ]
+
+
+@dataclass
+class SightingStats:
+    """Per-scan visibility of a device, from its sighting bitmaps."""
+
+    mac: str
+    scans: int  # scans performed in the period
+    seen: int  # scans the device showed up in
+    transitions: int  # seen/missed flips between consecutive scans
+
+    @property
+    def uptime(self) -> float:
+        """Percentage of scans the device was seen in."""
+        return 100.0 * self.seen / self.scans if self.scans else 0.0
+
+    @property
+    def flakiness(self) -> float:
+        """Seen/missed flips per scan (0 = steady, 1 = flipping every scan)."""
+        return self.transitions / self.scans if self.scans else 0.0
+
+
+@dataclass(slots=True)
+class ScanRun:
+    """Performance record of one scan cycle."""
+
+    started_at: datetime
+    duration: float  # seconds, scan and reconcile
+    hosts_up: int = 0
+    hosts_changed: int = 0  # new, arrived and departed devices
+    backend: str = "nmap"
+    network: str = ""  # the range this run swept
+    error: str | None = None
+
 
 @dataclass
+class ScanRunStats:
+    """Scan duration percentiles for one period (hour or day)."""
+
+    period: str
+    runs: int
+    errors: int
+    p50: float
+    p90: float
+    p99: float
+    max: float
+    hosts_up: float  # average
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "period": self.period,
+            "runs": self.runs,
+            "errors": self.errors,
+            "p50": round(self.p50, 3),
+            "p90": round(self.p90, 3),
+            "p99": round(self.p99, 3),
+            "max": round(self.max, 3),
+            "hosts_up": round(self.hosts_up, 1),
+        }
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+_INSERT_SCAN_RUN_SQL = """
+    INSERT INTO scan_runs
+        (started_at, duration, hosts_up, hosts_changed, backend, network, error)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _scan_run_params(run: ScanRun) -> tuple:
+    return (
+        run.started_at,
+        run.duration,
+        run.hosts_up,
+        run.hosts_changed,
+        run.backend,
+        run.network,
+        run.error,
+    )
+
+
+@dataclass(slots=True)
+class OutboxEntry:
+    """A notification waiting to be delivered on one channel."""
+
+    key: str  # idempotency key, unique per message and channel
+    channel: str
+    title: str
+    message: str
+    device: dict[str, Any] | None = None  # mac, name, vendor, ip
+    created_at: datetime = field(default_factory=datetime.now)
+    attempts: int = 0
+    next_attempt_at: float = 0.0  # epoch seconds
+    id: int | None = None
+
+
+_INSERT_OUTBOX_SQL = """
+    INSERT OR IGNORE INTO outbox
+        (key, channel, title, message, device, created_at, attempts, next_attempt_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _outbox_params(entry: OutboxEntry) -> tuple:
+    return (
+        entry.key,
+        entry.channel,
+        entry.title,
+        entry.message,
+        json.dumps(entry.device) if entry.device else None,
+        entry.created_at,
+        entry.attempts,
+        entry.next_attempt_at,
+    )
+
+
+@dataclass(slots=True)
+class ScanRecord:
+    """Everything a single scan writes to the database."""
+
+    scan_time: datetime
+    slot_seconds: int
+    seen: list[str]  # MACs seen in the scan
+    devices: list[Device]  # devices to upsert
+    events: list[tuple[str, str, datetime]]  # (mac, event_type, timestamp)
+    run: ScanRun | None = None
+    outbox: list[OutboxEntry] = field(default_factory=list)  # notifications to deliver
+
+
+@dataclass(frozen=True, slots=True)
 class PresenceEvent:
     """A presence event (arrival or departure)."""
 
     id: int
     mac: str
     event_type: str  # "arrived" or "left"
-    timestamp: datetime
+    ts: float  # epoch seconds
     device_name: str | None = None
 
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.ts)
+
+
+@dataclass(slots=True)
+class HistoryBucket:
+    """Presence events counted over one hour or day."""
+
+    bucket: str  # ISO start of the bucket
+    arrivals: int
+    departures: int
+    devices: int  # distinct devices with an event in the bucket
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "bucket": self.bucket,
+            "arrivals": self.arrivals,
+            "departures": self.departures,
+            "devices": self.devices,
+        }
+
+
+# Bucket -> (length of the stored timestamp prefix, suffix completing an ISO time)
+_HISTORY_BUCKETS = {"hour": (13, ":00:00"), "day": (10, "")}
+
 
 class Database:
     """SQLite database for storing devices and presence history."""
@@ -54,17 +392,34 @@ class Database:
         """Context manager for database connections."""
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
+        conn.create_function("set_bit", 3, _set_bit, deterministic=True)
         try:
             yield conn
             conn.commit()
         finally:
             conn.close()
 
+    @contextmanager
+    def _read_connection(self) -> Iterator[sqlite3.Connection]:
+        """Read-only connection for long-running reads.
+
+        With the database in WAL mode, readers work on a snapshot and never
+        take the write lock, so the watcher keeps committing while we read.
+        """
+        conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
     def _init_db(self) -> None:
         """Initialize database schema."""
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
         with self._connection() as conn:
+            # WAL lets long exports read alongside the scan loop's writes
+            conn.execute("PRAGMA journal_mode=WAL")
             conn.executescript("""
                 CREATE TABLE IF NOT EXISTS devices (
                     mac TEXT PRIMARY KEY,
@@ -85,10 +440,126 @@ class Database:
                     FOREIGN KEY (mac) REFERENCES devices(mac)
                 );
 
-                CREATE INDEX IF NOT EXISTS idx_history_mac ON presence_history(mac);
-                CREATE INDEX IF NOT EXISTS idx_history_timestamp ON presence_history(timestamp);
+                -- Covering indexes: aggregates over a time range (optionally
+                -- per device) never touch the table itself
+                DROP INDEX IF EXISTS idx_history_mac;
+                DROP INDEX IF EXISTS idx_history_timestamp;
+                CREATE INDEX IF NOT EXISTS idx_history_time
+                    ON presence_history(timestamp, mac, event_type);
+                CREATE INDEX IF NOT EXISTS idx_history_mac_time
+                    ON presence_history(mac, timestamp, event_type);
+                CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices(last_seen);
+                -- Filters plus the keyset pagination order of search_devices()
+                CREATE INDEX IF NOT EXISTS idx_devices_recent
+                    ON devices(COALESCE(last_seen, ''), mac);
+                CREATE INDEX IF NOT EXISTS idx_devices_online
+                    ON devices(is_online, COALESCE(last_seen, ''), mac);
+                CREATE INDEX IF NOT EXISTS idx_devices_group
+                    ON devices("group", COALESCE(last_seen, ''), mac);
+
+                -- One bit per scan slot, one blob per device and day
+                CREATE TABLE IF NOT EXISTS sightings (
+                    mac TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    slot_seconds INTEGER NOT NULL,
+                    bits BLOB NOT NULL,
+                    PRIMARY KEY (mac, day, slot_seconds)
+                ) WITHOUT ROWID;
+
+                CREATE TABLE IF NOT EXISTS journal_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    generation INTEGER NOT NULL,
+                    offset INTEGER NOT NULL
+                );
+
+                CREATE TABLE IF NOT EXISTS scan_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at TIMESTAMP NOT NULL,
+                    duration REAL NOT NULL,
+                    hosts_up INTEGER NOT NULL,
+                    hosts_changed INTEGER NOT NULL,
+                    backend TEXT NOT NULL,
+                    network TEXT,
+                    error TEXT
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_scan_runs_started
+                ON scan_runs(started_at);
+
+                -- Notifications for remote channels, sent by the outbox sender
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT NOT NULL UNIQUE,
+                    channel TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    device TEXT,
+                    created_at TIMESTAMP NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    sent_at TIMESTAMP,
+                    failed_at TIMESTAMP  -- given up on (see outbox.py)
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_outbox_due
+                ON outbox(next_attempt_at) WHERE sent_at IS NULL;
+
+                CREATE TABLE IF NOT EXISTS export_watermarks (
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated_at TIMESTAMP
+                );
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if "failed_at" not in columns:  # outbox tables created before it existed
+                conn.execute("ALTER TABLE outbox ADD COLUMN failed_at TIMESTAMP")
+            self._search_index = self._init_search_index(conn)
+
+    def _init_search_index(self, conn: sqlite3.Connection) -> bool:
+        """Create the trigram index used for substring search over devices.
+
+        Returns False if this SQLite build has no FTS5 trigram tokenizer
+        (SQLite < 3.34); search then falls back to LIKE scans.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'devices_search'"
+        ).fetchone()
+        if exists:
+            return True
+
+        try:
+            conn.executescript("""
+                CREATE VIRTUAL TABLE devices_search USING fts5(
+                    mac, name, vendor, ip,
+                    content='devices', content_rowid='rowid', tokenize='trigram'
+                );
+
+                CREATE TRIGGER devices_search_insert AFTER INSERT ON devices BEGIN
+                    INSERT INTO devices_search (rowid, mac, name, vendor, ip)
+                    VALUES (new.rowid, new.mac, new.name, new.vendor, new.ip);
+                END;
+
+                CREATE TRIGGER devices_search_delete AFTER DELETE ON devices BEGIN
+                    INSERT INTO devices_search (devices_search, rowid, mac, name, vendor, ip)
+                    VALUES ('delete', old.rowid, old.mac, old.name, old.vendor, old.ip);
+                END;
+
+                CREATE TRIGGER devices_search_update AFTER UPDATE OF mac, name, vendor, ip
+                ON devices BEGIN
+                    INSERT INTO devices_search (devices_search, rowid, mac, name, vendor, ip)
+                    VALUES ('delete', old.rowid, old.mac, old.name, old.vendor, old.ip);
+                    INSERT INTO devices_search (rowid, mac, name, vendor, ip)
+                    VALUES (new.rowid, new.mac, new.name, new.vendor, new.ip);
+                END;
+
+                INSERT INTO devices_search (devices_search) VALUES ('rebuild');
             """)
+            return True
+        except sqlite3.OperationalError:
+            return False
 
+    @timed_query
     def get_device(self, mac: str) -> Device | None:
         """Get a device by MAC address."""
         with self._connection() as conn:
@@ -99,12 +570,14 @@ class Database:
                 return self._row_to_device(row)
         return None
 
+    @timed_query
     def get_all_devices(self) -> list[Device]:
         """Get all known devices."""
         with self._connection() as conn:
             rows = conn.execute("SELECT * FROM devices ORDER BY last_seen DESC").fetchall()
             return [self._row_to_device(row) for row in rows]
 
+    @timed_query
     def get_online_devices(self) -> list[Device]:
         """Get all currently online devices."""
         with self._connection() as conn:
@@ -113,33 +586,95 @@ class Database:
             ).fetchall()
             return [self._row_to_device(row) for row in rows]
 
+    @timed_query
+    def search_devices(
+        self,
+        status: str | None = None,
+        group: str | None = None,
+        vendor: str | None = None,
+        query: str | None = None,
+        after: tuple[str, str] | None = None,
+        limit: int = 50,
+    ) -> tuple[list[Device], tuple[str, str] | None]:
+        """Filter and page through devices, most recently seen first.
+
+        Returns the page and the key to pass as ``after`` for the next one
+        (None on the last page).
+
+        Args:
+            status: "online" or "offline".
+            group: Exact group name.
+            vendor: Exact vendor name.
+            query: Substring of the name, vendor, MAC or IP.
+            after: Key returned with the previous page.
+            limit: Page size (at least 1).
+        """
+        limit = max(1, limit)
+        sql = "SELECT * FROM devices WHERE 1=1"
+        params: list = []
+
+        if status in ("online", "offline"):
+            sql += " AND is_online = ?"
+            params.append(1 if status == "online" else 0)
+        if group:
+            sql += ' AND "group" = ?'
+            params.append(group)
+        if vendor:
+            sql += " AND vendor = ?"
+            params.append(vendor)
+        if query:
+            if self._search_index and len(query) >= 3:
+                sql += (
+                    " AND rowid IN"
+                    " (SELECT rowid FROM devices_search WHERE devices_search MATCH ?)"
+                )
+                params.append('"' + query.replace('"', '""') + '"')
+            else:
+                # Too short for trigrams: plain scan
+                escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                like = f"%{escaped}%"
+                sql += " AND (" + " OR ".join(
+                    f"{column} LIKE ? ESCAPE '\\'" for column in ("mac", "name", "vendor", "ip")
+                ) + ")"
+                params.extend([like] * 4)
+        if after:
+            sql += " AND (COALESCE(last_seen, ''), mac) < (?, ?)"
+            params.extend(after)
+
+        sql += " ORDER BY COALESCE(last_seen, '') DESC, mac DESC LIMIT ?"
+        params.append(limit)
+
+        with self._connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        next_key = None
+        if len(rows) == limit:
+            next_key = (rows[-1]["last_seen"] or "", rows[-1]["mac"])
+        return [self._row_to_device(row) for row in rows], next_key
+
+    @timed_query
     def upsert_device(self, device: Device) -> None:
         """Insert or update a device."""
         with self._connection() as conn:
-            conn.execute(
-                """
-                INSERT INTO devices (mac, name, vendor, ip, first_seen, last_seen, is_online, "group")
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(mac) DO UPDATE SET
-                    name = COALESCE(excluded.name, devices.name),
-                    vendor = COALESCE(excluded.vendor, devices.vendor),
-                    ip = excluded.ip,
-                    last_seen = excluded.last_seen,
-                    is_online = excluded.is_online,
-                    "group" = COALESCE(excluded."group", devices."group")
-                """,
-                (
-                    device.mac.upper(),
-                    device.name,
-                    device.vendor,
-                    device.ip,
-                    device.first_seen or datetime.now(),
-                    device.last_seen or datetime.now(),
-                    device.is_online,
-                    device.group,
-                ),
+            conn.execute(_UPSERT_DEVICE_SQL, _device_params(device))
+
+    @timed_query
+    def assign_devices(self, assignments: list[tuple[str, str | None, str | None]]) -> set[str]:
+        """Set (mac, name, group) for many devices in one transaction.
+
+        None leaves a field unchanged. Devices not in the database yet are
+        created (first and last seen stay empty until a scan finds them).
+        Returns the MACs that were created.
+        """
+        with self._connection() as conn:
+            known = {row["mac"] for row in conn.execute("SELECT mac FROM devices")}
+            conn.executemany(
+                _ASSIGN_DEVICE_SQL,
+                [(mac.upper(), name, group) for mac, name, group in assignments],
             )
+        return {mac.upper() for mac, _, _ in assignments} - known
 
+    @timed_query
     def set_device_name(self, mac: str, name: str) -> None:
         """Set a friendly name for a device."""
         with self._connection() as conn:
@@ -148,6 +683,7 @@ class Database:
                 (name, mac.upper()),
             )
 
+    @timed_query
     def set_device_group(self, mac: str, group: str) -> None:
         """Set the group for a device."""
         with self._connection() as conn:
@@ -156,11 +692,13 @@ class Database:
                 (group, mac.upper()),
             )
 
+    @timed_query
     def set_all_offline(self) -> None:
         """Mark all devices as offline."""
         with self._connection() as conn:
             conn.execute("UPDATE devices SET is_online = 0")
 
+    @timed_query
     def log_event(self, mac: str, event_type: str) -> None:
         """Log a presence event."""
         with self._connection() as conn:
@@ -169,6 +707,7 @@ class Database:
                 (mac.upper(), event_type, datetime.now()),
             )
 
+    @timed_query
     def get_history(
         self,
         mac: str | None = None,
@@ -202,12 +741,429 @@ class Database:
                     id=row["id"],
                     mac=row["mac"],
                     event_type=row["event_type"],
-                    timestamp=datetime.fromisoformat(row["timestamp"]),
-                    device_name=row["device_name"],
+                    ts=datetime.fromisoformat(row["timestamp"]).timestamp(),
+                    device_name=sys.intern(row["device_name"]) if row["device_name"] else None,
                 )
                 for row in rows
             ]
 
+    @timed_query
+    def record_sightings(self, macs: list[str], scan_time: datetime, slot_seconds: int) -> None:
+        """Set the scan slot bit for every device seen in a scan.
+
+        The day is split in slots of ``slot_seconds`` (the scan interval).
+        """
+        with self._connection() as conn:
+            conn.executemany(
+                _SET_SIGHTING_SQL, _sighting_params(macs, scan_time, slot_seconds)
+            )
+
+    @timed_query
+    def record_scans(
+        self, records: list[ScanRecord], journal_position: tuple[int, int] | None = None
+    ) -> None:
+        """Apply the writes of one or more scans in a single transaction.
+
+        Args:
+            records: Scan records, oldest first.
+            journal_position: (generation, offset) of the journal up to which
+                              these records were read; stored in the same
+                              transaction so a replay never applies them twice.
+        """
+        with self._connection() as conn:
+            for record in records:
+                conn.executemany(
+                    _UPSERT_DEVICE_SQL, [_device_params(d) for d in record.devices]
+                )
+                conn.executemany(
+                    "INSERT INTO presence_history (mac, event_type, timestamp) VALUES (?, ?, ?)",
+                    [(mac.upper(), event_type, ts) for mac, event_type, ts in record.events],
+                )
+                conn.executemany(
+                    _SET_SIGHTING_SQL,
+                    _sighting_params(record.seen, record.scan_time, record.slot_seconds),
+                )
+                if record.run:
+                    conn.execute(_INSERT_SCAN_RUN_SQL, _scan_run_params(record.run))
+                conn.executemany(_INSERT_OUTBOX_SQL, [_outbox_params(e) for e in record.outbox])
+            if journal_position:
+                conn.execute(
+                    """
+                    INSERT INTO journal_state (id, generation, offset) VALUES (1, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        generation = excluded.generation,
+                        offset = excluded.offset
+                    """,
+                    journal_position,
+                )
+
+    @timed_query
+    def record_scan_run(self, run: ScanRun) -> None:
+        """Store a run that wrote nothing else (e.g. a failed scan)."""
+        with self._connection() as conn:
+            conn.execute(_INSERT_SCAN_RUN_SQL, _scan_run_params(run))
+
+    @timed_query
+    def get_scan_runs(self, limit: int = 50, since: datetime | None = None) -> list[ScanRun]:
+        """Most recent scan runs, newest first."""
+        query = "SELECT * FROM scan_runs"
+        params: list = []
+        if since:
+            query += " WHERE started_at >= ?"
+            params.append(since)
+        query += " ORDER BY started_at DESC LIMIT ?"
+        params.append(limit)
+
+        with self._connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            ScanRun(
+                started_at=datetime.fromisoformat(row["started_at"]),
+                duration=row["duration"],
+                hosts_up=row["hosts_up"],
+                hosts_changed=row["hosts_changed"],
+                backend=row["backend"],
+                network=row["network"] or "",
+                error=row["error"],
+            )
+            for row in rows
+        ]
+
+    @timed_query
+    def get_scan_stats(self, days: int = 7, by: str = "day") -> list[ScanRunStats]:
+        """Scan duration percentiles per hour or day over the last ``days`` days."""
+        # Timestamps are stored as "YYYY-MM-DD HH:MM:SS...": the prefix is the period
+        prefix = {"hour": 13, "day": 10}.get(by)
+        if prefix is None:
+            raise ValueError("by must be 'hour' or 'day'")
+        since = datetime.now() - timedelta(days=days)
+
+        with self._connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT substr(started_at, 1, ?) AS period, duration, hosts_up,
+                       error IS NOT NULL AS failed
+                FROM scan_runs
+                WHERE started_at >= ?
+                ORDER BY period, duration
+                """,
+                (prefix, since),
+            ).fetchall()
+
+        periods: dict[str, list[sqlite3.Row]] = {}
+        for row in rows:
+            periods.setdefault(row["period"], []).append(row)
+
+        stats = []
+        for period, period_rows in periods.items():
+            # Failed runs stopped early: keep them out of the percentiles
+            ok = [row for row in period_rows if not row["failed"]]
+            durations = [row["duration"] for row in ok]
+            stats.append(ScanRunStats(
+                period=period.replace(" ", "T"),
+                runs=len(period_rows),
+                errors=len(period_rows) - len(ok),
+                p50=_percentile(durations, 0.5),
+                p90=_percentile(durations, 0.9),
+                p99=_percentile(durations, 0.99),
+                max=durations[-1] if durations else 0.0,
+                hosts_up=sum(row["hosts_up"] for row in ok) / len(ok) if ok else 0.0,
+            ))
+        return stats
+
+    @timed_query
+    def enqueue_notifications(self, entries: list[OutboxEntry]) -> None:
+        """Add notifications to the outbox outside of a scan."""
+        with self._connection() as conn:
+            conn.executemany(_INSERT_OUTBOX_SQL, [_outbox_params(e) for e in entries])
+
+    @timed_query
+    def get_due_notifications(self, now: float, limit: int = 50) -> list[OutboxEntry]:
+        """Unsent notifications whose next attempt is due, oldest first."""
+        with self._connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT * FROM outbox
+                WHERE sent_at IS NULL AND failed_at IS NULL AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, id LIMIT ?
+                """,
+                (now, limit),
+            ).fetchall()
+        return [
+            OutboxEntry(
+                key=row["key"],
+                channel=row["channel"],
+                title=row["title"],
+                message=row["message"],
+                device=json.loads(row["device"]) if row["device"] else None,
+                created_at=datetime.fromisoformat(row["created_at"]),
+                attempts=row["attempts"],
+                next_attempt_at=row["next_attempt_at"],
+                id=row["id"],
+            )
+            for row in rows
+        ]
+
+    @timed_query
+    def get_next_notification_time(self) -> float | None:
+        """When the earliest unsent notification is due, if any."""
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox"
+                " WHERE sent_at IS NULL AND failed_at IS NULL"
+            ).fetchone()
+        return row[0]
+
+    @timed_query
+    def claim_notification(self, entry: OutboxEntry, until: float) -> bool:
+        """Reserve a due notification until ``until``.
+
+        Fails if another sender (e.g. a second wifinder process on the same
+        database) claimed or sent it first.
+        """
+        with self._connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE outbox SET next_attempt_at = ?
+                WHERE id = ? AND next_attempt_at = ? AND sent_at IS NULL AND failed_at IS NULL
+                """,
+                (until, entry.id, entry.next_attempt_at),
+            )
+        return cursor.rowcount == 1
+
+    @timed_query
+    def finish_notification(
+        self,
+        entry: OutboxEntry,
+        sent: bool,
+        retry_at: float = 0.0,
+        error: str | None = None,
+        attempted: bool = True,
+    ) -> None:
+        """Record a delivery: sent, or to be retried at ``retry_at``.
+
+        ``attempted`` is False when the entry was held back without trying
+        (rate limit), so it doesn't count towards the backoff.
+        """
+        with self._connection() as conn:
+            if sent:
+                conn.execute(
+                    "UPDATE outbox SET sent_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (datetime.now(), entry.id),
+                )
+            else:
+                conn.execute(
+                    """
+                    UPDATE outbox SET
+                        attempts = attempts + ?,
+                        next_attempt_at = ?,
+                        last_error = COALESCE(?, last_error)
+                    WHERE id = ?
+                    """,
+                    (int(attempted), retry_at, error, entry.id),
+                )
+
+    @timed_query
+    def fail_notification(self, entry: OutboxEntry, error: str, attempted: bool = True) -> None:
+        """Give up on a notification: it stays in the table, never retried."""
+        with self._connection() as conn:
+            conn.execute(
+                """
+                UPDATE outbox SET attempts = attempts + ?, failed_at = ?, last_error = ?
+                WHERE id = ?
+                """,
+                (int(attempted), datetime.now(), error, entry.id),
+            )
+
+    @timed_query
+    def count_pending_notifications(self) -> dict[str, int]:
+        """Undelivered outbox entries per channel."""
+        with self._connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT channel, COUNT(*) FROM outbox
+                WHERE sent_at IS NULL AND failed_at IS NULL GROUP BY channel
+                """
+            ).fetchall()
+        return {channel: count for channel, count in rows}
+
+    @timed_query
+    def prune_notifications(self, sent_before: datetime) -> int:
+        """Delete delivered (or given up) notifications older than ``sent_before``."""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM outbox WHERE sent_at < ? OR failed_at < ?",
+                (sent_before, sent_before),
+            )
+        return cursor.rowcount
+
+    @timed_query
+    def get_journal_position(self) -> tuple[int, int] | None:
+        """(generation, offset) of the last journal data applied, if any."""
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT generation, offset FROM journal_state WHERE id = 1"
+            ).fetchone()
+            return (row["generation"], row["offset"]) if row else None
+
+    @timed_query
+    def get_sighting_stats(self, days: int = 7, mac: str | None = None) -> list[SightingStats]:
+        """Uptime and flakiness per device over the last ``days`` days."""
+        first_day = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+        with self._connection() as conn:
+            scanned = {
+                (row["day"], row["slot_seconds"]): int.from_bytes(row["bits"], "little")
+                for row in conn.execute(
+                    "SELECT day, slot_seconds, bits FROM sightings WHERE mac = ? AND day >= ?",
+                    (SCAN_SLOTS_KEY, first_day),
+                )
+            }
+            query = "SELECT mac, day, slot_seconds, bits FROM sightings WHERE mac != ? AND day >= ?"
+            params: list = [SCAN_SLOTS_KEY, first_day]
+            if mac:
+                query += " AND mac = ?"
+                params.append(mac.upper())
+            rows = conn.execute(query, params).fetchall()
+
+        total_scans = sum(bits.bit_count() for bits in scanned.values())
+        # Pairs of adjacent slots that were both scanned
+        scan_pairs = {key: bits & (bits >> 1) for key, bits in scanned.items()}
+
+        stats: dict[str, SightingStats] = {}
+        for row in rows:
+            key = (row["day"], row["slot_seconds"])
+            scans = scanned.get(key, 0)
+            seen = int.from_bytes(row["bits"], "little") & scans
+            entry = stats.setdefault(row["mac"], SightingStats(row["mac"], total_scans, 0, 0))
+            entry.seen += seen.bit_count()
+            entry.transitions += ((seen ^ (seen >> 1)) & scan_pairs.get(key, 0)).bit_count()
+
+        return sorted(stats.values(), key=lambda s: s.mac)
+
+    @timed_query
+    def get_sighting_timeline(self, mac: str, day: datetime) -> str:
+        """Per-slot visibility for one day: "1" seen, "0" missed, "." not scanned."""
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT mac, slot_seconds, bits FROM sightings WHERE mac IN (?, ?) AND day = ?",
+                (SCAN_SLOTS_KEY, mac.upper(), day.strftime("%Y-%m-%d")),
+            ).fetchall()
+
+        if not rows:
+            return ""
+
+        # Use the finest slot size recorded that day
+        slot_seconds = min(row["slot_seconds"] for row in rows)
+        bits = {
+            row["mac"]: int.from_bytes(row["bits"], "little")
+            for row in rows
+            if row["slot_seconds"] == slot_seconds
+        }
+        scanned = bits.get(SCAN_SLOTS_KEY, 0)
+        seen = bits.get(mac.upper(), 0)
+        return "".join(
+            "." if not scanned >> slot & 1 else "1" if seen >> slot & 1 else "0"
+            for slot in range(scanned.bit_length())
+        )
+
+    @timed_query
+    def aggregate_history(
+        self,
+        bucket: str = "hour",
+        since: datetime | None = None,
+        until: datetime | None = None,
+        mac: str | None = None,
+        group: str | None = None,
+    ) -> list[HistoryBucket]:
+        """Arrivals, departures and distinct devices per hour or day.
+
+        Buckets without events are left out.
+        """
+        if bucket not in _HISTORY_BUCKETS:
+            raise ValueError("bucket must be 'hour' or 'day'")
+        prefix, suffix = _HISTORY_BUCKETS[bucket]
+
+        # Timestamps are stored as "YYYY-MM-DD HH:MM:SS...": the prefix is the bucket
+        query = """
+            SELECT substr(timestamp, 1, ?) AS bucket,
+                   SUM(event_type = 'arrived') AS arrivals,
+                   SUM(event_type = 'left') AS departures,
+                   COUNT(DISTINCT mac) AS devices
+            FROM presence_history
+            WHERE 1=1
+        """
+        params: list = [prefix]
+        if since:
+            query += " AND timestamp >= ?"
+            params.append(since)
+        if until:
+            query += " AND timestamp < ?"
+            params.append(until)
+        if mac:
+            query += " AND mac = ?"
+            params.append(mac.upper())
+        if group:
+            query += ' AND mac IN (SELECT mac FROM devices WHERE "group" = ?)'
+            params.append(group)
+        query += " GROUP BY bucket ORDER BY bucket"
+
+        with self._connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            HistoryBucket(
+                bucket=row["bucket"].replace(" ", "T") + suffix,
+                arrivals=row["arrivals"],
+                departures=row["departures"],
+                devices=row["devices"],
+            )
+            for row in rows
+        ]
+
+    @timed_query
+    def get_last_event_id(self) -> int:
+        """Id of the most recent presence event (0 if there is none)."""
+        with self._connection() as conn:
+            row = conn.execute("SELECT MAX(id) FROM presence_history").fetchone()
+            return row[0] or 0
+
+    @timed_query
+    def get_presence_events(
+        self, since: datetime, until: datetime
+    ) -> list[tuple[str, str, datetime, str | None]]:
+        """Get (mac, event_type, timestamp, group) tuples for a time range.
+
+        Devices that were already home at ``since`` get a synthetic "arrived"
+        event at ``since``, so sessions spanning the range start are kept.
+        """
+        with self._read_connection() as conn:
+            carried = conn.execute(
+                """
+                SELECT h.mac, d."group" FROM presence_history h
+                LEFT JOIN devices d ON h.mac = d.mac
+                WHERE h.id IN (
+                    SELECT MAX(id) FROM presence_history WHERE timestamp < ? GROUP BY mac
+                ) AND h.event_type = 'arrived'
+                """,
+                (since,),
+            ).fetchall()
+            rows = conn.execute(
+                """
+                SELECT h.mac, h.event_type, h.timestamp, d."group" FROM presence_history h
+                LEFT JOIN devices d ON h.mac = d.mac
+                WHERE h.timestamp >= ? AND h.timestamp < ?
+                ORDER BY h.id
+                """,
+                (since, until),
+            ).fetchall()
+
+        events = [(row[0], "arrived", since, row[1]) for row in carried]
+        events.extend(
+            (row[0], row[1], datetime.fromisoformat(row[2]), row[3]) for row in rows
+        )
+        return events
+
+    @timed_query
     def get_device_stats(self, mac: str) -> dict:
         """Get statistics for a device."""
         with self._connection() as conn:
@@ -230,6 +1186,86 @@ class Database:
                 "last_seen": device.last_seen if device else None,
             }
 
+    def iter_export(
+        self,
+        table: str,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        after: str | None = None,
+        chunk_size: int = 1000,
+    ) -> Iterator[list[dict[str, Any]]]:
+        """Stream rows of an exportable table in chunks.
+
+        Args:
+            table: "devices" or "history".
+            since: Only rows at or after this time (last_seen / timestamp).
+            until: Only rows before this time.
+            after: Watermark from a previous export; only newer rows are returned
+                   (history id for "history", last_seen for "devices").
+            chunk_size: Rows fetched per round trip.
+        """
+        if table == "devices":
+            query = 'SELECT mac, name, vendor, ip, first_seen, last_seen, is_online, "group"'
+            query += " FROM devices WHERE 1=1"
+            time_column = "last_seen"
+        elif table == "history":
+            query = """
+                SELECT h.id, h.mac, h.event_type, h.timestamp, d.name as device_name
+                FROM presence_history h
+                LEFT JOIN devices d ON h.mac = d.mac
+                WHERE 1=1
+            """
+            time_column = "h.timestamp"
+        else:
+            raise ValueError(f"Unknown export table: {table}")
+
+        params: list = []
+        if since:
+            query += f" AND {time_column} >= ?"
+            params.append(since)
+        if until:
+            query += f" AND {time_column} < ?"
+            params.append(until)
+        if after is not None:
+            if table == "history":
+                query += " AND h.id > ?"
+                params.append(int(after))
+            else:
+                query += " AND last_seen > ?"
+                params.append(after)
+        query += " ORDER BY h.id" if table == "history" else " ORDER BY last_seen, mac"
+
+        with self._read_connection() as conn:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+
+    @timed_query
+    def get_export_watermark(self, name: str) -> str | None:
+        """Get the watermark recorded by the last export with this name."""
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value FROM export_watermarks WHERE name = ?", (name,)
+            ).fetchone()
+            return row["value"] if row else None
+
+    @timed_query
+    def set_export_watermark(self, name: str, value: str) -> None:
+        """Record how far an export got, for the next incremental run."""
+        with self._connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO export_watermarks (name, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    value = excluded.value,
+                    updated_at = excluded.updated_at
+                """,
+                (name, value, datetime.now()),
+            )
+
     def _row_to_device(self, row: sqlite3.Row) -> Device:
         """Convert a database row to a Device object."""
         return Device(
@@ -0,0 +1,154 @@
+"""Bulk export of devices and presence history."""
+
+import csv
+import io
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+from .database import EXPORT_COLUMNS, Database
+
+FORMATS = ("csv", "ndjson", "parquet")
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Columns stored as timestamps when writing Parquet
+_TIMESTAMP_COLUMNS = {"first_seen", "last_seen", "timestamp"}
+
+
+class Export:
+    """A single export run over one table.
+
+    Rows are pulled from the database in chunks through a read-only cursor,
+    so memory stays flat regardless of table size. If a watermark name is
+    given, only rows newer than the previous run with that name are exported,
+    and the watermark is advanced once the export finishes.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        table: str,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        watermark: str | None = None,
+        chunk_size: int = 1000,
+    ):
+        if table not in EXPORT_COLUMNS:
+            expected = ", ".join(EXPORT_COLUMNS)
+            raise ValueError(f"Unknown table '{table}' (expected one of: {expected})")
+
+        self.db = db
+        self.table = table
+        self.columns = EXPORT_COLUMNS[table]
+        self.since = since
+        self.until = until
+        self.watermark = watermark
+        self.chunk_size = chunk_size
+        self.row_count = 0
+        self._last_row: dict[str, Any] | None = None
+
+    def chunks(self) -> Iterator[list[dict[str, Any]]]:
+        """Iterate over row chunks, tracking progress for the watermark."""
+        after = self.db.get_export_watermark(self._watermark_key) if self.watermark else None
+
+        for chunk in self.db.iter_export(
+            self.table,
+            since=self.since,
+            until=self.until,
+            after=after,
+            chunk_size=self.chunk_size,
+        ):
+            self.row_count += len(chunk)
+            self._last_row = chunk[-1]
+            yield chunk
+
+    def commit(self) -> None:
+        """Advance the watermark past the rows exported so far."""
+        if not self.watermark or self._last_row is None:
+            return
+        value = self._last_row["id"] if self.table == "history" else self._last_row["last_seen"]
+        self.db.set_export_watermark(self._watermark_key, str(value))
+
+    @property
+    def _watermark_key(self) -> str:
+        return f"{self.watermark}:{self.table}"
+
+    def iter_csv(self) -> Iterator[str]:
+        """Yield CSV text, one piece per chunk (header first)."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=self.columns)
+        writer.writeheader()
+
+        for chunk in self.chunks():
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def iter_ndjson(self) -> Iterator[str]:
+        """Yield newline-delimited JSON, one piece per chunk."""
+        for chunk in self.chunks():
+            yield "".join(json.dumps(row, default=str) + "\n" for row in chunk)
+
+    def iter_text(self, fmt: str) -> Iterator[str]:
+        """Yield the export in a text format ("csv" or "ndjson")."""
+        if fmt == "csv":
+            return self.iter_csv()
+        if fmt == "ndjson":
+            return self.iter_ndjson()
+        raise ValueError(f"'{fmt}' is not a streaming text format")
+
+    def write(self, fmt: str, output: Path | IO[str]) -> int:
+        """Write the export to a file path or text stream. Returns rows written."""
+        if fmt == "parquet":
+            if not isinstance(output, Path):
+                raise ValueError("Parquet exports need an output file")
+            self.write_parquet(output)
+        elif isinstance(output, Path):
+            with open(output, "w", newline="") as f:
+                f.writelines(self.iter_text(fmt))
+        else:
+            output.writelines(self.iter_text(fmt))
+
+        self.commit()
+        return self.row_count
+
+    def write_parquet(self, path: Path) -> None:
+        """Write the export as Parquet, one row group per chunk."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError(
+                "Parquet export needs pyarrow: pip install 'wifinder[export]'"
+            ) from None
+
+        schema = pa.schema([
+            (
+                column,
+                pa.timestamp("us") if column in _TIMESTAMP_COLUMNS
+                else pa.bool_() if column == "is_online"
+                else pa.int64() if column == "id"
+                else pa.string(),
+            )
+            for column in self.columns
+        ])
+
+        with pq.ParquetWriter(path, schema) as writer:
+            for chunk in self.chunks():
+                for row in chunk:
+                    for column in _TIMESTAMP_COLUMNS.intersection(row):
+                        if row[column]:
+                            row[column] = datetime.fromisoformat(row[column])
+                    if "is_online" in row:
+                        row["is_online"] = bool(row["is_online"])
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
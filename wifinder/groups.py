@@ -0,0 +1,84 @@
+"""Presence per device group.
+
+The watcher keeps a count of online members for every group, updated as
+devices arrive and leave, so "is anyone from family home?" is a dict lookup
+rather than a pass over all devices. A group arrives when its first member
+comes online and leaves when its last one goes.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable
+
+from .database import Device
+
+
+@dataclass(frozen=True, slots=True)
+class GroupChange:
+    """A group's first member arrived, or its last member left."""
+
+    group: str
+    change_type: str  # "arrived", "left"
+    device: Device  # the member that caused it
+
+
+@dataclass
+class GroupState:
+    online: int = 0
+    since: datetime | None = None  # when the group last arrived or left
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "online": self.online,
+            "home": self.online > 0,
+            "since": self.since.isoformat() if self.since else None,
+        }
+
+
+class GroupPresence:
+    """Online member counts per group."""
+
+    def __init__(self):
+        self.groups: dict[str, GroupState] = {}
+        # Online device -> the group it is counted in (its group can be edited
+        # while it is online)
+        self._counted: dict[str, str] = {}
+
+    def load(self, devices: Iterable[Device]) -> None:
+        """Start from the devices in the database (no changes reported)."""
+        for device in devices:
+            if device.group:
+                self.groups.setdefault(device.group, GroupState())
+            self.update(device, None)
+
+    def update(self, device: Device, when: datetime | None) -> list[GroupChange]:
+        """Account for a device that is online or gone (``device.is_online``)."""
+        changes: list[GroupChange] = []
+        counted = self._counted.get(device.mac)
+        target = device.group if device.is_online else None
+        if counted == target:
+            return changes
+
+        if counted is not None:
+            del self._counted[device.mac]
+            state = self.groups[counted]
+            state.online -= 1
+            if state.online == 0:
+                state.since = when
+                changes.append(GroupChange(counted, "left", device))
+        if target is not None:
+            self._counted[device.mac] = target
+            state = self.groups.setdefault(target, GroupState())
+            state.online += 1
+            if state.online == 1:
+                state.since = when
+                changes.append(GroupChange(target, "arrived", device))
+        return changes
+
+    def online(self, group: str) -> int:
+        """Members of a group online now."""
+        state = self.groups.get(group)
+        return state.online if state else 0
+
+    def to_dict(self) -> dict[str, dict[str, Any]]:
+        return {name: state.to_dict() for name, state in sorted(self.groups.items())}
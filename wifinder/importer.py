@@ -0,0 +1,88 @@
+"""Bulk import of device names and groups (e.g. from an inventory sheet)."""
+
+import csv
+import re
+from dataclasses import dataclass
+from typing import IO, Any, Iterable, Iterator
+
+from .database import Database
+
+COLUMNS = ("mac", "name", "group")
+
+_MAC_RE = re.compile(r"^[0-9A-F]{2}(:[0-9A-F]{2}){5}$")
+
+
+def normalize_mac(mac: str) -> str:
+    """AA-BB-CC-DD-EE-FF, aa.bb.cc.dd.ee.ff, ... -> AA:BB:CC:DD:EE:FF"""
+    return mac.strip().upper().replace("-", ":").replace(".", ":")
+
+
+@dataclass
+class ImportResult:
+    """Outcome of one imported row."""
+
+    row: int  # 1-based, header excluded
+    mac: str
+    status: str  # "created", "updated" or "error"
+    error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {"row": self.row, "mac": self.mac, "status": self.status}
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+def read_csv(f: IO[str]) -> Iterator[dict[str, Any]]:
+    """Rows of a CSV file with a mac,name,group header (name or group may be omitted)."""
+    reader = csv.DictReader(f)
+    fields = {name.strip().lower() for name in reader.fieldnames or []}
+    if "mac" not in fields:
+        raise ValueError("CSV needs a header row with a 'mac' column")
+    for row in reader:
+        yield {key.strip().lower(): value for key, value in row.items() if key}
+
+
+def import_devices(
+    db: Database, rows: Iterable[dict[str, Any]], dry_run: bool = False
+) -> list[ImportResult]:
+    """Validate rows and apply the valid ones in a single transaction.
+
+    Empty names or groups leave the current value alone. Invalid rows are
+    reported and skipped; they don't stop the rest of the import.
+    """
+    results: list[ImportResult] = []
+    assignments: list[tuple[str, str | None, str | None]] = []
+    valid: list[ImportResult] = []
+
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            results.append(ImportResult(number, "", "error", "row must be an object"))
+            continue
+        mac = normalize_mac(str(row.get("mac") or ""))
+        name = str(row.get("name") or "").strip() or None
+        group = str(row.get("group") or "").strip() or None
+
+        result = ImportResult(number, mac, "updated")
+        if not _MAC_RE.match(mac):
+            result.status, result.error = "error", "invalid MAC address"
+        elif name is None and group is None:
+            result.status, result.error = "error", "nothing to set (no name or group)"
+        else:
+            assignments.append((mac, name, group))
+            valid.append(result)
+        results.append(result)
+
+    if dry_run:
+        known = {d.mac for d in db.get_all_devices()}
+        created = {mac for mac, _, _ in assignments} - known
+    else:
+        created = db.assign_devices(assignments) if assignments else set()
+
+    # Rows apply in order: a MAC repeated in the import is created by its
+    # first row and updated by the others
+    for result in valid:
+        if result.mac in created:
+            result.status = "created"
+            created.discard(result.mac)
+    return results
@@ -0,0 +1,274 @@
+"""Append-only scan journal.
+
+On slow storage (SD cards) every SQLite commit pays for several fsyncs. With
+the journal enabled, the watcher appends each scan's writes to a single
+length-prefixed log file (one sequential write and one fsync per scan), and a
+background folder applies the log to the database in bulk, then truncates it.
+Whatever a crashed run left in the journal is replayed on the next start.
+
+File layout::
+
+    header:  b"WFJ1" | 4 bytes padding | generation (u64)
+    frame:   length (u32) | crc32 (u32) | JSON payload
+
+The generation changes every time the journal is truncated; together with the
+offset it is stored in the database in the same transaction as the applied
+data, so a replay never applies a frame twice.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+from .database import Database, Device, OutboxEntry, ScanRecord, ScanRun
+
+MAGIC = b"WFJ1"
+HEADER = struct.Struct("<4s4xQ")
+FRAME = struct.Struct("<II")
+
+
+def encode_record(record: ScanRecord) -> bytes:
+    """Serialize a scan record to a journal frame."""
+    payload = json.dumps({
+        "t": record.scan_time.isoformat(),
+        "slot": record.slot_seconds,
+        "seen": record.seen,
+        # Name and group are owned by the user, not the scan: leave them out so
+        # replaying late never overwrites an edit made in the meantime
+        "devices": [
+            [
+                d.mac,
+                d.vendor,
+                d.ip,
+                d.first_seen_ts,
+                d.last_seen_ts,
+                d.is_online,
+            ]
+            for d in record.devices
+        ],
+        "events": [[mac, event_type, ts.isoformat()] for mac, event_type, ts in record.events],
+        "run": [
+            record.run.started_at.isoformat(),
+            record.run.duration,
+            record.run.hosts_up,
+            record.run.hosts_changed,
+            record.run.backend,
+            record.run.network,
+            record.run.error,
+        ] if record.run else None,
+        "outbox": [
+            [e.key, e.channel, e.title, e.message, e.device, e.created_at.isoformat()]
+            for e in record.outbox
+        ],
+    }, separators=(",", ":")).encode()
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_record(payload: bytes) -> ScanRecord:
+    """Deserialize a journal frame payload."""
+    data = json.loads(payload)
+    run = data.get("run")
+    return ScanRecord(
+        scan_time=datetime.fromisoformat(data["t"]),
+        slot_seconds=data["slot"],
+        seen=data["seen"],
+        devices=[
+            Device(
+                mac=mac,
+                vendor=vendor,
+                ip=ip,
+                first_seen=first_seen,
+                last_seen=last_seen,
+                is_online=is_online,
+            )
+            for mac, vendor, ip, first_seen, last_seen, is_online in data["devices"]
+        ],
+        events=[
+            (mac, event_type, datetime.fromisoformat(ts)) for mac, event_type, ts in data["events"]
+        ],
+        run=ScanRun(datetime.fromisoformat(run[0]), *run[1:]) if run else None,
+        outbox=[
+            OutboxEntry(key, channel, title, message, device, datetime.fromisoformat(created_at))
+            for key, channel, title, message, device, created_at in data.get("outbox", [])
+        ],
+    )
+
+
+class Journal:
+    """Append-only journal of scan records with group commit."""
+
+    def __init__(self, path: Path, use_mmap: bool = False, fsync: bool = True):
+        self.path = path
+        self.use_mmap = use_mmap
+        self.fsync = fsync
+        self.generation = 0
+        self._pending: list[bytes] = []
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.exists() or path.stat().st_size < HEADER.size:
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, 0))
+        self._file = open(path, "r+b")
+
+        magic, self.generation = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a WiFinder journal")
+
+        # Drop a frame torn by a crash mid-write, so new appends stay readable
+        _, end = self.read(HEADER.size)
+        if end < self.size:
+            self._file.truncate(end)
+
+    @property
+    def size(self) -> int:
+        return os.fstat(self._file.fileno()).st_size
+
+    def append(self, record: ScanRecord) -> None:
+        """Buffer a record; it becomes durable on the next commit()."""
+        frame = encode_record(record)
+        with self._lock:
+            self._pending.append(frame)
+
+    def commit(self) -> None:
+        """Write all buffered records with a single write and fsync."""
+        with self._lock:
+            if not self._pending:
+                return
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(b"".join(self._pending))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._pending.clear()
+
+    def read(self, start: int) -> tuple[list[ScanRecord], int]:
+        """Read committed records from an offset.
+
+        Returns the records and the offset just past the last valid frame.
+        Reading stops at the first incomplete or corrupt frame.
+        """
+        with self._lock:
+            size = self.size
+            if start >= size:
+                return [], start
+            if self.use_mmap:
+                with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    data = view[start:size]
+            else:
+                self._file.seek(start)
+                data = self._file.read(size - start)
+
+        records = []
+        pos = 0
+        while pos + FRAME.size <= len(data):
+            length, crc = FRAME.unpack_from(data, pos)
+            payload = data[pos + FRAME.size:pos + FRAME.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            records.append(decode_record(payload))
+            pos += FRAME.size + length
+        return records, start + pos
+
+    def reset(self, expected_size: int) -> bool:
+        """Truncate the journal if nothing was appended past ``expected_size``."""
+        with self._lock:
+            if self.size != expected_size or self._pending:
+                return False
+            self.generation += 1
+            self._file.truncate(HEADER.size)
+            self._file.seek(0)
+            self._file.write(HEADER.pack(MAGIC, self.generation))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            return True
+
+    def close(self) -> None:
+        self.commit()
+        self._file.close()
+
+
+class JournalFolder(threading.Thread):
+    """Background thread applying the journal to the database."""
+
+    def __init__(
+        self, journal: Journal, db: Database, on_fold: Callable[[], None] | None = None
+    ):
+        super().__init__(daemon=True, name="wifinder-journal")
+        self.journal = journal
+        self.db = db
+        self.on_fold = on_fold  # called after records were applied
+        self._offset = HEADER.size
+        self._requested = 0
+        self._done = 0
+        self._stopping = False
+        self._cond = threading.Condition()
+
+    def replay(self) -> int:
+        """Apply whatever is left in the journal (e.g. after a crash).
+
+        Call before start(). Returns the number of records applied.
+        """
+        position = self.db.get_journal_position()
+        if position and position[0] == self.journal.generation:
+            self._offset = position[1]
+        if self._offset > self.journal.size:
+            # Truncated, but the new generation never made it to disk
+            self._offset = HEADER.size
+        return self.fold()
+
+    def fold(self) -> int:
+        """Apply all committed records in one transaction, then truncate."""
+        records, end = self.journal.read(self._offset)
+        if records:
+            self.db.record_scans(records, journal_position=(self.journal.generation, end))
+            if self.on_fold:
+                self.on_fold()
+        self._offset = end
+        if self.journal.reset(end):
+            self._offset = HEADER.size
+        return len(records)
+
+    def kick(self) -> None:
+        """Ask the folder to apply newly committed records."""
+        with self._cond:
+            self._requested += 1
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Wait until every kick so far has been folded."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._done >= self._requested, timeout)
+
+    def run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._requested > self._done or self._stopping)
+                if self._stopping and self._requested <= self._done:
+                    return
+                target = self._requested
+
+            try:
+                self.fold()
+            except Exception as e:
+                # Records stay in the journal and are retried on the next kick
+                print(f"Journal fold error: {e}")
+
+            with self._cond:
+                self._done = target
+                self._cond.notify_all()
+
+    def stop(self) -> None:
+        """Fold what is left and stop the thread."""
+        with self._cond:
+            self._stopping = True
+            self._requested += 1
+            self._cond.notify_all()
+        self.join()
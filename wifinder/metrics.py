@@ -0,0 +1,263 @@
+"""Prometheus-style metrics.
+
+A small in-process registry rendering the Prometheus text format, so the
+web UI can expose ``/metrics`` and ``wifinder watch`` can run a standalone
+exporter without extra dependencies.
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, TypeVar
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+F = TypeVar("F", bound=Callable)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelKey = tuple[tuple[str, str], ...]
+
+# Called with (metric name, labels, value) on every histogram observation
+_observers: list[Callable[[str, dict[str, str], float], None]] = []
+
+
+def add_observer(callback: Callable[[str, dict[str, str], float], None]) -> None:
+    """Get notified of every histogram observation (used by the profiler)."""
+    _observers.append(callback)
+
+
+def _label_key(labels: dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    """Base class: a named metric with values per label set."""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def render(self, const: LabelKey = ()) -> list[str]:
+        """Text format lines; ``const`` labels are added to every sample."""
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self, const: LabelKey = ()) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return super().render() + [
+            f"{self.name}{_format_labels(const + key)} {value}" for key, value in values
+        ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def render(self, const: LabelKey = ()) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return super().render() + [
+            f"{self.name}{_format_labels(const + key)} {value}" for key, value in values
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = buckets
+        # label key -> (bucket counts, sum, count)
+        self._values: dict[LabelKey, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+        for observer in _observers:
+            observer(self.name, labels, value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of a block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self, const: LabelKey = ()) -> list[str]:
+        with self._lock:
+            values = [
+                (key, list(counts), total, count)
+                for key, (counts, total, count) in self._values.items()
+            ]
+        lines = super().render()
+        for key, counts, total, count in values:
+            key = const + key
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = _format_labels(key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {bucket_count}")
+            le = _format_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """A set of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self.register(Gauge(name, help))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help: str, **kwargs) -> Histogram:
+        return self.register(Histogram(name, help, **kwargs))  # type: ignore[return-value]
+
+    def render(self, **labels: str) -> str:
+        """The text format page; ``labels`` are added to every sample."""
+        const = _label_key(labels)
+        return "\n".join(
+            line for metric in self._metrics for line in metric.render(const)
+        ) + "\n"
+
+
+def merge(*pages: str) -> str:
+    """Combine rendered pages, with one HELP/TYPE header per metric.
+
+    The pages' series must differ in their labels (see Registry.render()):
+    the text format allows each series only once.
+    """
+    families: dict[str, list[str]] = {}
+    family: list[str] = []
+    for page in pages:
+        for line in page.splitlines():
+            if line.startswith("# HELP "):
+                name = line.split(" ", 3)[2]
+                family = families.setdefault(name, [line])
+            elif line.startswith("# TYPE "):
+                if len(family) == 1:  # first time this metric is seen
+                    family.append(line)
+            elif line:
+                family.append(line)
+    return "\n".join(line for lines in families.values() for line in lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SCAN_DURATION = REGISTRY.histogram(
+    "wifinder_scan_duration_seconds", "Duration of a full scan cycle"
+)
+SCAN_PHASE = REGISTRY.histogram(
+    "wifinder_scan_phase_seconds",
+    "Duration of scan cycle phases (nmap, parse, vendor, reconcile, notify, persist)",
+)
+SCANS = REGISTRY.counter("wifinder_scans_total", "Scan cycles run")
+SCAN_ERRORS = REGISTRY.counter("wifinder_scan_errors_total", "Scan cycles that raised")
+SCHEDULER_LAG = REGISTRY.histogram(
+    "wifinder_scheduler_lag_seconds", "How late scan cycles start compared to their schedule"
+)
+DB_QUERY = REGISTRY.histogram("wifinder_db_query_seconds", "Database call latency by method")
+NOTIFY = REGISTRY.histogram("wifinder_notify_seconds", "Notification latency by channel")
+NOTIFY_FAILURES = REGISTRY.counter(
+    "wifinder_notify_failures_total", "Failed notifications by channel"
+)
+NOTIFY_THROTTLED = REGISTRY.counter(
+    "wifinder_notify_throttled_total",
+    "Notifications held back by channel "
+    "(reason: limit = local rate limit, 429 = server, busy = too many local helpers running)",
+)
+OUTBOX_PENDING = REGISTRY.gauge(
+    "wifinder_outbox_pending", "Notifications waiting in the outbox for delivery, by channel"
+)
+OUTBOX_FAILED = REGISTRY.counter(
+    "wifinder_outbox_failed_total",
+    "Notifications given up on (rejected, or out of attempts), by channel",
+)
+MQTT_CONNECTED = REGISTRY.gauge("wifinder_mqtt_connected", "1 while connected to the MQTT broker")
+MQTT_MESSAGES = REGISTRY.counter("wifinder_mqtt_messages_total", "Messages published to MQTT")
+DEVICES_ONLINE = REGISTRY.gauge("wifinder_devices_online", "Devices currently online")
+DEVICES_KNOWN = REGISTRY.gauge("wifinder_devices_known", "Devices ever seen")
+
+
+def timed_query(func: F) -> F:
+    """Record a Database method's latency under its name."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with DB_QUERY.time(method=func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> "ThreadingHTTPServer":
+    """Serve REGISTRY at /metrics from a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="wifinder-metrics").start()
+    return server
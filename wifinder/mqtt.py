@@ -0,0 +1,163 @@
+"""MQTT output.
+
+With ``mqtt.host`` set, the watcher keeps one connection to the broker and
+publishes presence as retained messages, so a consumer that subscribes gets
+the current state straight away instead of waiting for the next change::
+
+    wifinder/<MAC>/state   {"mac", "name", "group", "vendor", "ip", "online", "last_seen"}
+    wifinder/home          {"online": 3, "names": ["Marco", ...], "unknown": 1}
+    wifinder/group/<name>  {"online": 2, "home": true, "since": ...}
+    wifinder/status        "online", or "offline" (also the last will)
+
+Updates are queued per topic and sent by a background thread after
+``batch_window`` seconds, so a burst (an access point rebooting) goes out
+once per topic with the latest value. Topics whose payload didn't change
+are skipped. paho-mqtt reconnects with exponential backoff; after every
+(re)connect the whole retained state is published again, in case the broker
+lost it.
+"""
+
+import json
+import threading
+from typing import Iterable
+
+from . import metrics
+from .config import MqttConfig
+from .database import Device
+
+RECONNECT_MIN = 1  # seconds, doubled on every failed attempt
+RECONNECT_MAX = 120
+QOS = 1
+
+
+def device_state(device: Device) -> dict:
+    """Payload of a device's state topic."""
+    return {
+        "mac": device.mac,
+        "name": device.name,
+        "group": device.group,
+        "vendor": device.vendor,
+        "ip": device.ip,
+        "online": device.is_online,
+        "last_seen": device.last_seen.isoformat() if device.last_seen else None,
+    }
+
+
+def home_state(online: list[Device]) -> dict:
+    """Payload of the aggregated home topic."""
+    names = sorted(d.name for d in online if d.name)
+    return {"online": len(online), "names": names, "unknown": len(online) - len(names)}
+
+
+class MqttPublisher:
+    """Publishes retained presence topics over one persistent connection."""
+
+    def __init__(self, config: MqttConfig):
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            raise RuntimeError(
+                "MQTT output needs paho-mqtt: pip install 'wifinder[mqtt]'"
+            ) from None
+
+        self.config = config
+        self.prefix = config.topic_prefix.rstrip("/")
+        self.status_topic = f"{self.prefix}/status"
+        # Topic -> latest payload: what is waiting to be sent, and what was sent
+        # (the retained state, published again after a reconnect)
+        self._pending: dict[str, bytes] = {self.status_topic: b"online"}
+        self._published: dict[str, bytes] = {}
+        self._resync = False
+        self._stopping = False
+        self._cond = threading.Condition()
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=config.client_id)
+        if config.username:
+            self.client.username_pw_set(config.username, config.password)
+        if config.tls:
+            self.client.tls_set()
+        self.client.will_set(self.status_topic, "offline", qos=QOS, retain=True)
+        self.client.reconnect_delay_set(min_delay=RECONNECT_MIN, max_delay=RECONNECT_MAX)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.connect_async(config.host, config.port, keepalive=config.keepalive)
+        self.client.loop_start()  # network thread: connects, reconnects, keeps alive
+
+        self._thread = threading.Thread(target=self._run, daemon=True, name="wifinder-mqtt")
+        self._thread.start()
+
+    def publish_devices(self, devices: Iterable[Device]) -> None:
+        """Queue state updates for devices."""
+        self._queue({
+            f"{self.prefix}/{d.mac}/state": json.dumps(device_state(d)).encode()
+            for d in devices
+        })
+
+    def publish_home(self, online: list[Device]) -> None:
+        """Queue an update of the aggregated home topic."""
+        self._queue({f"{self.prefix}/home": json.dumps(home_state(online)).encode()})
+
+    def publish_groups(self, groups: dict[str, dict]) -> None:
+        """Queue updates of group topics (GroupPresence.to_dict())."""
+        self._queue({
+            f"{self.prefix}/group/{name}": json.dumps(state).encode()
+            for name, state in groups.items()
+        })
+
+    def _queue(self, messages: dict[str, bytes]) -> None:
+        if not messages:
+            return
+        with self._cond:
+            self._pending.update(messages)
+            self._cond.notify_all()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties) -> None:
+        if reason_code.is_failure:
+            print(f"MQTT connection refused: {reason_code}")
+            return
+        metrics.MQTT_CONNECTED.set(1)
+        # Messages are only published from our thread, so they stay in order
+        with self._cond:
+            self._resync = True
+            self._cond.notify_all()
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties) -> None:
+        metrics.MQTT_CONNECTED.set(0)
+        if not self._stopping:
+            print(f"MQTT disconnected ({reason_code}), reconnecting")
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._resync or self._stopping)
+                # Let the rest of a burst come in
+                self._cond.wait_for(lambda: self._stopping, timeout=self.config.batch_window)
+                pending, self._pending = self._pending, {}
+                resync, self._resync = self._resync, False
+                if resync:
+                    batch = {**self._published, **pending}
+                else:
+                    batch = {t: p for t, p in pending.items() if self._published.get(t) != p}
+                self._published.update(pending)
+                stopping = self._stopping
+
+            # While disconnected, updates only go to the snapshot: it is all
+            # published on reconnect
+            if self.client.is_connected():
+                for topic, payload in batch.items():
+                    self.client.publish(topic, payload, qos=QOS, retain=True)
+                    metrics.MQTT_MESSAGES.inc()
+            if stopping:
+                return
+
+    def close(self) -> None:
+        """Send what is queued, mark the status offline and disconnect."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+        if self.client.is_connected():
+            info = self.client.publish(self.status_topic, "offline", qos=QOS, retain=True)
+            info.wait_for_publish(timeout=2)
+        self.client.disconnect()
+        self.client.loop_stop()
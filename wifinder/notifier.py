@@ -2,45 +2,244 @@
 
 import subprocess
 import sys
+import threading
 import time
+import uuid
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from pathlib import Path
+from typing import Any, Callable, Iterator
 
 import httpx
 
+from . import metrics
 from .config import NotifyConfig, PanicConfig
-from .database import Device
+from .database import Device, OutboxEntry
+from .groups import GroupChange
+from .rules import GROUP_EVENTS, RuleSet
+
+
+class TokenBucket:
+    """Allows ``capacity`` messages per ``period`` seconds, refilled continuously."""
+
+    PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0}
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str) -> "TokenBucket":
+        """Build from a limit like "20/minute" or "1/second"."""
+        count, _, unit = spec.partition("/")
+        period = cls.PERIODS.get(unit.strip().rstrip("s"))
+        if not count.strip().isdigit() or int(count) < 1 or period is None:
+            raise ValueError(f"Invalid rate limit '{spec}' (expected e.g. 20/minute)")
+        return cls(int(count), period)
+
+    def acquire(self) -> float:
+        """Take a token if there is one: returns 0, else seconds until there is."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def block(self, seconds: float) -> None:
+        """Hold everything back for ``seconds`` (the server said 429)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+def retry_after(response: httpx.Response, default: float = 30.0) -> float:
+    """Seconds a 429 response asks us to wait (Retry-After or Telegram's retry_after)."""
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(header)
+                return max(0.0, when.timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    try:
+        return float(response.json()["parameters"]["retry_after"])
+    except Exception:
+        return default
+
+
+class DeliveryRejected(Exception):
+    """The endpoint refused a message for good: sending it again won't help."""
+
+
+def check_rejected(response: httpx.Response) -> None:
+    """Raise DeliveryRejected for a 4xx answer (other than 408 and 429, worth retrying).
+
+    Raises:
+        DeliveryRejected: With the status and the start of the body.
+    """
+    if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+        raise DeliveryRejected(f"HTTP {response.status_code}: {response.text[:200]}")
+
+
+def device_dict(device: Device) -> dict:
+    """The device fields notifications carry (e.g. in webhook payloads)."""
+    return {"mac": device.mac, "name": device.name, "vendor": device.vendor, "ip": device.ip}
 
 
 class Notifier(ABC):
     """Base class for notifiers."""
 
+    channel = "notifier"  # label used in metrics
+    durable = False  # remote: delivered through the outbox, retried until accepted
+    limiter: TokenBucket | None = None  # set from notify.rate_limits
+    _blocked_until = 0.0  # monotonic time a 429 answer asked us to wait until
+
+    def _rate_limited(self, response: httpx.Response) -> None:
+        """Pause the channel as long as a 429 response asks."""
+        seconds = retry_after(response)
+        metrics.NOTIFY_THROTTLED.inc(channel=self.channel, reason="429")
+        print(f"{self.channel.capitalize()} rate limited, pausing {seconds:.0f}s")
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        if self.limiter:
+            self.limiter.block(seconds)
+
+    def blocked_for(self) -> float:
+        """Seconds left of a pause a 429 answer asked for."""
+        return max(0.0, self._blocked_until - time.monotonic())
+
+    def acquire(self) -> float:
+        """Clear to send: returns 0, else seconds to wait (429 pause or rate limit)."""
+        blocked = self.blocked_for()
+        if blocked:
+            return blocked
+        return self.limiter.acquire() if self.limiter else 0.0
+
     @abstractmethod
-    def notify(self, title: str, message: str, device: Device | None = None) -> bool:
-        """Send a notification. Returns True if successful."""
+    def notify(
+        self, title: str, message: str, device: Device | None = None, key: str | None = None
+    ) -> bool:
+        """Send a notification. Returns True if successful.
+
+        ``key`` identifies the message across retries (for deduplication).
+
+        Raises:
+            DeliveryRejected: If the message will never be accepted (remote
+                channels; False means it may be on a later attempt).
+        """
         pass
 
+    def close(self) -> None:
+        """Release held resources (connections)."""
+
+
+def _http_client(http2: bool = False) -> httpx.Client:
+    """A pooled client, so a burst of notifications reuses one connection."""
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("HTTP/2 needs the h2 package: pip install 'wifinder[http2]' (using HTTP/1.1)")
+            http2 = False
+    return httpx.Client(
+        timeout=10,
+        http2=http2,
+        limits=httpx.Limits(max_connections=4, keepalive_expiry=60),
+    )
+
+
+class ProcessLauncher:
+    """Starts helper programs (notify-send, paplay) without waiting for them.
+
+    At most ``max_running`` run at once: past that, a launch is refused
+    rather than queued, as a late beep or popup is no use. A background
+    thread reaps finished processes and counts the ones that failed.
+    """
+
+    def __init__(self, max_running: int = 4, poll_interval: float = 0.2):
+        self.max_running = max_running
+        self.poll_interval = poll_interval
+        self._running: list[tuple[subprocess.Popen, str]] = []
+        self._cond = threading.Condition()
+        self._reaper: threading.Thread | None = None
+
+    def launch(self, args: list[str], channel: str) -> bool:
+        """Start ``args``; False if too many are running already.
+
+        Raises:
+            OSError: If the program can't be started (e.g. not installed).
+        """
+        with self._cond:
+            self._reap()
+            if len(self._running) >= self.max_running:
+                metrics.NOTIFY_THROTTLED.inc(channel=channel, reason="busy")
+                return False
+            process = subprocess.Popen(
+                args,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            self._running.append((process, channel))
+            if self._reaper is None:
+                self._reaper = threading.Thread(
+                    target=self._run, daemon=True, name="wifinder-reaper"
+                )
+                self._reaper.start()
+            self._cond.notify()
+        return True
+
+    def _reap(self) -> None:
+        running = []
+        for process, channel in self._running:
+            code = process.poll()
+            if code is None:
+                running.append((process, channel))
+            elif code != 0:
+                metrics.NOTIFY_FAILURES.inc(channel=channel)
+        self._running = running
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._reap()
+                self._cond.wait(self.poll_interval if self._running else None)
+
+
+_launcher = ProcessLauncher()
+
 
 class DesktopNotifier(Notifier):
-    """Desktop notifications using system tools."""
+    """Desktop notifications using system tools (shown without waiting for them)."""
+
+    channel = "desktop"
 
-    def notify(self, title: str, message: str, device: Device | None = None) -> bool:
+    def __init__(self, launcher: ProcessLauncher | None = None):
+        self.launcher = launcher or _launcher
+
+    def notify(
+        self, title: str, message: str, device: Device | None = None, key: str | None = None
+    ) -> bool:
         try:
             if sys.platform == "linux":
-                subprocess.run(
-                    ["notify-send", title, message, "-a", "WiFinder"],
-                    check=True,
-                    capture_output=True,
-                )
+                args = ["notify-send", title, message, "-a", "WiFinder"]
             elif sys.platform == "darwin":
                 # macOS
                 script = f'display notification "{message}" with title "{title}"'
-                subprocess.run(
-                    ["osascript", "-e", script],
-                    check=True,
-                    capture_output=True,
-                )
+                args = ["osascript", "-e", script]
             else:
                 # Windows - use powershell
                 ps_script = f"""
@@ -50,106 +249,190 @@ class DesktopNotifier(Notifier):
                 $template.SelectSingleNode('//text[@id="2"]').InnerText = "{message}"
                 [Windows.UI.Notifications.ToastNotificationManager]::CreateToastNotifier("WiFinder").Show($template)
                 """
-                subprocess.run(
-                    ["powershell", "-Command", ps_script],
-                    check=True,
-                    capture_output=True,
-                )
-            return True
+                args = ["powershell", "-Command", ps_script]
+            return self.launcher.launch(args, self.channel)
         except Exception as e:
             print(f"Desktop notification failed: {e}")
             return False
 
 
 class SoundNotifier(Notifier):
-    """Play system beep on events."""
+    """Play system beep on events.
 
-    def notify(self, title: str, message: str, device: Device | None = None) -> bool:
-        try:
-            if sys.platform == "darwin":
-                subprocess.run(["afplay", "/System/Library/Sounds/Glass.aiff"], capture_output=True)
-            elif sys.platform != "win32":
-                # Linux - try simple beep
-                subprocess.run(["paplay", "/usr/share/sounds/freedesktop/stereo/bell.oga"], 
-                             capture_output=True)
-            else:
-                # Windows
-                import winsound
-                winsound.MessageBeep()
-            return True
-        except Exception:
-            return False
+    The sound plays in the background; the same sound requested again within
+    ``dedupe_window`` seconds (several devices arriving at once) plays once.
+    """
+
+    channel = "sound"
+
+    def __init__(self, dedupe_window: float = 2.0, launcher: ProcessLauncher | None = None):
+        self.dedupe_window = dedupe_window
+        self.launcher = launcher or _launcher
+        self._last_played: dict[tuple[str, ...] | None, float] = {}
+        self._lock = threading.Lock()
+
+    def notify(
+        self, title: str, message: str, device: Device | None = None, key: str | None = None
+    ) -> bool:
+        args: tuple[str, ...] | None = None  # None: Windows, winsound
+        if sys.platform == "darwin":
+            args = ("afplay", "/System/Library/Sounds/Glass.aiff")
+        elif sys.platform != "win32":
+            # Linux - try simple beep
+            args = ("paplay", "/usr/share/sounds/freedesktop/stereo/bell.oga")
+
+        # Launching only starts the player, so it can happen under the lock
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_played.get(args, float("-inf")) < self.dedupe_window:
+                return True
+            try:
+                if args is None:
+                    import winsound
+                    winsound.MessageBeep()  # asynchronous already
+                    played = True
+                else:
+                    played = self.launcher.launch(list(args), self.channel)
+            except Exception:
+                played = False
+            # A failed launch must not silence the next request
+            if played:
+                self._last_played[args] = now
+            return played
 
 
 class TelegramNotifier(Notifier):
     """Send notifications via Telegram bot."""
 
-    def __init__(self, token: str, chat_id: str):
+    channel = "telegram"
+    durable = True
+
+    def __init__(
+        self,
+        token: str,
+        chat_id: str,
+        http2: bool = False,
+        api_url: str = "https://api.telegram.org",
+    ):
         self.token = token
         self.chat_id = chat_id
-        self.api_url = f"https://api.telegram.org/bot{token}"
-
-    def notify(self, title: str, message: str, device: Device | None = None) -> bool:
+        self.api_url = f"{api_url.rstrip('/')}/bot{token}"
+        self.client = _http_client(http2)
+
+    def notify(
+        self, title: str, message: str, device: Device | None = None, key: str | None = None
+    ) -> bool:
+        """Send a notification.
+
+        Raises:
+            DeliveryRejected: If Telegram refuses the message (e.g. bad chat id).
+        """
+        text = f"*{title}*\n{message}"
+        if device and device.vendor:
+            text += f"\nDevice: {device.vendor}"
         try:
-            text = f"*{title}*\n{message}"
+            return self._post_message(text, parse_mode="Markdown")
+        except DeliveryRejected:
+            # Most likely Markdown that doesn't parse ("my_phone"): send it plain
+            plain = f"{title}\n{message}"
             if device and device.vendor:
-                text += f"\nDevice: {device.vendor}"
-
-            response = httpx.post(
-                f"{self.api_url}/sendMessage",
-                json={
-                    "chat_id": self.chat_id,
-                    "text": text,
-                    "parse_mode": "Markdown",
-                },
-                timeout=10,
-            )
-            return response.status_code == 200
-        except Exception as e:
+                plain += f"\nDevice: {device.vendor}"
+            return self._post_message(plain)
+
+    def send_message(
+        self, text: str, chat_id: str | int | None = None, parse_mode: str | None = None
+    ) -> bool:
+        """Send a message to the configured chat (or ``chat_id``)."""
+        try:
+            return self._post_message(text, chat_id, parse_mode)
+        except DeliveryRejected as e:
             print(f"Telegram notification failed: {e}")
             return False
 
-    def get_updates(self) -> list[dict]:
-        """Get recent messages (useful for 'who is home?' queries)."""
+    def _post_message(
+        self, text: str, chat_id: str | int | None = None, parse_mode: str | None = None
+    ) -> bool:
+        """POST sendMessage; False if it may succeed later (network error, 429, 5xx).
+
+        Raises:
+            DeliveryRejected: For other 4xx answers.
+        """
+        payload: dict[str, Any] = {"chat_id": chat_id or self.chat_id, "text": text}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
         try:
-            response = httpx.get(
-                f"{self.api_url}/getUpdates",
-                params={"timeout": 0, "limit": 10},
-                timeout=10,
-            )
-            if response.status_code == 200:
-                return response.json().get("result", [])
-        except Exception:
-            pass
-        return []
+            response = self.client.post(f"{self.api_url}/sendMessage", json=payload)
+        except Exception as e:
+            print(f"Telegram notification failed: {e}")
+            return False
+        if response.status_code == 429:
+            self._rate_limited(response)
+        check_rejected(response)
+        return response.status_code == 200
+
+    def get_updates(self, offset: int | None = None, timeout: int = 0) -> list[dict]:
+        """Get messages sent to the bot (see bot.py).
+
+        With ``timeout`` > 0 this is a long poll: Telegram holds the request
+        until a message arrives or the timeout passes. Pass the last
+        ``update_id`` + 1 as ``offset`` to confirm the updates already handled.
+
+        Raises:
+            httpx.HTTPError: If the request fails.
+        """
+        params: dict[str, Any] = {"timeout": timeout, "limit": 10}
+        if offset is not None:
+            params["offset"] = offset
+        response = self.client.get(
+            f"{self.api_url}/getUpdates", params=params, timeout=timeout + 10
+        )
+        response.raise_for_status()
+        return response.json().get("result", [])
+
+    def close(self) -> None:
+        self.client.close()
 
 
 class WebhookNotifier(Notifier):
     """Send notifications to a webhook URL."""
 
-    def __init__(self, url: str):
+    channel = "webhook"
+    durable = True
+
+    def __init__(self, url: str, http2: bool = False):
         self.url = url
+        self.client = _http_client(http2)
+
+    def notify(
+        self, title: str, message: str, device: Device | None = None, key: str | None = None
+    ) -> bool:
+        """Send a notification.
 
-    def notify(self, title: str, message: str, device: Device | None = None) -> bool:
+        Raises:
+            DeliveryRejected: If the endpoint answers with a 4xx (other than 408/429).
+        """
         try:
             payload = {
+                "id": key,
                 "title": title,
                 "message": message,
                 "timestamp": datetime.now().isoformat(),
             }
             if device:
-                payload["device"] = {
-                    "mac": device.mac,
-                    "name": device.name,
-                    "vendor": device.vendor,
-                    "ip": device.ip,
-                }
-
-            response = httpx.post(self.url, json=payload, timeout=10)
-            return 200 <= response.status_code < 300
+                payload["device"] = device_dict(device)
+
+            headers = {"Idempotency-Key": key} if key else None
+            response = self.client.post(self.url, json=payload, headers=headers)
         except Exception as e:
             print(f"Webhook notification failed: {e}")
             return False
+        if response.status_code == 429:
+            self._rate_limited(response)
+        check_rejected(response)
+        return 200 <= response.status_code < 300
+
+    def close(self) -> None:
+        self.client.close()
 
 
 class PanicNotifier:
@@ -159,9 +442,15 @@ class PanicNotifier:
     For when you REALLY need to know someone's coming.
     """
 
+    MAX_BEEPS = 10  # however many devices panic at once
+
     def __init__(self, message: str = "OHSHITOHSHITOHSHITOHSHITOHSHIT!", sound_loops: int = 1):
         self.message = message
         self.sound_loops = sound_loops
+        # Beeps waiting to be played by the beeper thread
+        self._beeps = 0
+        self._cond = threading.Condition()
+        self._beeper: threading.Thread | None = None
 
     def panic(self, device: Device | None = None, custom_message: str | None = None) -> None:
         """PANIC! Someone's coming!"""
@@ -189,10 +478,30 @@ class PanicNotifier:
                 print(f"    {' · '.join(details)}")
             print()
         
-        # Beep
-        for _ in range(self.sound_loops):
+        # Beep from a background thread, so the scan isn't held up
+        with self._cond:
+            self._beeps = min(self._beeps + self.sound_loops, self.MAX_BEEPS)
+            if self._beeper is None:
+                self._beeper = threading.Thread(
+                    target=self._beep, daemon=True, name="wifinder-panic"
+                )
+                self._beeper.start()
+            self._cond.notify_all()
+
+    def _beep(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._beeps > 0)
             print("\a", end="", flush=True)
             time.sleep(0.2)
+            with self._cond:
+                self._beeps -= 1
+                self._cond.notify_all()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait until every beep has been played."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._beeps == 0, timeout)
 
 
 # For backwards compatibility with the original script
@@ -200,18 +509,71 @@ def ohshit(device: Device | None = None):
     """The classic WiFinder experience."""
     panic = PanicNotifier()
     panic.panic(device)
+    panic.wait()
+
+
+# Digest wording per change type, and how many names a digest lists per type
+DIGEST_LABELS = {
+    "new": "new",
+    "arrived": "arrived",
+    "left": "left",
+    "group_arrived": "groups home",
+    "group_left": "groups away",
+}
+DIGEST_NAMES = 10
+# Remote messages held back by a rate limit without the outbox, per channel
+MAX_HELD = 50
 
 
 class NotificationManager:
-    """Manages multiple notifiers and handles quiet hours."""
+    """Manages multiple notifiers and routes events to them by rule (see rules.py).
+
+    Notifications sent inside batch() are held and sent together when it
+    ends: one by one if there are few, otherwise as a single digest per
+    channel, so an access point reboot doesn't send one message per device.
+    With a digest window, they are held until a timer ends the window.
+
+    Without the outbox, a remote message over its channel's rate limit is
+    held in memory and sent when the limit allows, folded with any others
+    held meanwhile into one message.
+    """
+
+    # Starts the digest and rate limit timers (tests fire them by hand)
+    timer_factory: Callable[..., threading.Timer] = threading.Timer
 
     def __init__(self, config: NotifyConfig, panic_config: PanicConfig | None = None):
         self.config = config
         self.panic_config = panic_config
         self.notifiers: list[Notifier] = []
         self.panic_notifier: PanicNotifier | None = None
+        self.rules = RuleSet.from_config(config, panic_config)
+        # (change type, title, message, device, channels) held for the current window
+        self._pending: list[tuple[str, str, str, Device, frozenset[str] | None]] = []
+        self._pending_since = 0.0
+        self._timer: threading.Timer | None = None  # ends the digest window
+        self._batching = 0
+        self._lock = threading.Lock()
+        # When set, durable channels are staged for the outbox instead of sent
+        self.use_outbox = False
+        self._staged: list[OutboxEntry] = []
+        # Channel -> (title, message, device) waiting for the rate limit, and the
+        # timer that sends them
+        self._held: dict[str, list[tuple[str, str, Device | None]]] = {}
+        self._held_timers: dict[str, threading.Timer] = {}
+        # Called after the timer flushed a digest, to pick up staged entries
+        self.on_timer_flush: Callable[[], None] | None = None
         self._setup_notifiers()
 
+    @property
+    def durable_notifiers(self) -> list[Notifier]:
+        return [n for n in self.notifiers if n.durable]
+
+    def take_staged(self) -> list[OutboxEntry]:
+        """Outbox entries for durable channels produced since the last call."""
+        with self._lock:
+            staged, self._staged = self._staged, []
+        return staged
+
     def _setup_notifiers(self) -> None:
         """Set up notifiers based on configuration."""
         if self.config.desktop:
@@ -222,98 +584,296 @@ class NotificationManager:
 
         if self.config.telegram_token and self.config.telegram_chat_id:
             self.notifiers.append(
-                TelegramNotifier(self.config.telegram_token, self.config.telegram_chat_id)
+                TelegramNotifier(
+                    self.config.telegram_token,
+                    self.config.telegram_chat_id,
+                    http2=self.config.http2,
+                    api_url=self.config.telegram_api_url,
+                )
             )
 
         if self.config.webhook_url:
-            self.notifiers.append(WebhookNotifier(self.config.webhook_url))
+            self.notifiers.append(WebhookNotifier(self.config.webhook_url, http2=self.config.http2))
+
+        for notifier in self.notifiers:
+            spec = (self.config.rate_limits or {}).get(notifier.channel)
+            if spec:
+                notifier.limiter = TokenBucket.parse(spec)
 
-        # Set up panic notifier if enabled
-        if self.panic_config and self.panic_config.enabled:
+        # Set up panic notifier if a rule (or panic mode) can trigger it
+        if self.rules.uses_panic:
+            panic_config = self.panic_config or PanicConfig()
             self.panic_notifier = PanicNotifier(
-                message=self.panic_config.message,
-                sound_loops=self.panic_config.sound_loops,
+                message=panic_config.message,
+                sound_loops=panic_config.sound_loops,
             )
 
-    def _is_quiet_hours(self) -> bool:
-        """Check if we're in quiet hours."""
-        if self.config.quiet_hours_start is None or self.config.quiet_hours_end is None:
-            return False
-
-        current_hour = datetime.now().hour
-        start = self.config.quiet_hours_start
-        end = self.config.quiet_hours_end
-
-        if start <= end:
-            return start <= current_hour < end
-        else:
-            # Handles overnight quiet hours (e.g., 23:00 to 07:00)
-            return current_hour >= start or current_hour < end
-
-    def _should_panic(self, device: Device, is_new: bool) -> bool:
-        """Determine if we should trigger panic mode for this device."""
-        if not self.panic_notifier or not self.panic_config:
-            return False
-        
-        if self._is_quiet_hours():
-            return False
-        
-        # If only_unknown is set, only panic for devices without names
-        if self.panic_config.only_unknown and device.name:
-            return False
-        
-        return True
+    def close(self) -> None:
+        """Send anything still held, then close every notifier's connections.
+
+        Messages held for a rate limit go out at once, folded per channel.
+        """
+        self.flush(force=True)
+        with self._lock:
+            held, self._held = self._held, {}
+            timers, self._held_timers = self._held_timers, {}
+        for timer in timers.values():
+            timer.cancel()
+        for notifier in self.notifiers:
+            if held.get(notifier.channel):
+                self._deliver(notifier, *self._fold(held[notifier.channel]))
+        for notifier in self.notifiers:
+            notifier.close()
 
-    def _get_panic_message(self, device: Device) -> str | None:
-        """Get custom panic message for device if configured."""
-        if not self.panic_config or not self.panic_config.custom_messages:
-            return None
-        return self.panic_config.custom_messages.get(device.mac.upper())
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Hold notifications sent inside the block and send them together."""
+        with self._lock:
+            self._batching += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._batching -= 1
+            self.flush()
+
+    def flush(self, force: bool = False) -> None:
+        """Send held notifications once the digest window has passed."""
+        with self._lock:
+            if not self._pending or self._batching:
+                return
+            window = self.config.digest_window
+            if not force and window and time.monotonic() - self._pending_since < window:
+                return
+            pending, self._pending = self._pending, []
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
 
-    def notify_arrival(self, device: Device) -> None:
-        """Notify that a device has arrived."""
-        if self._is_quiet_hours():
+        for notifier in self.notifiers:
+            routed = [p for p in pending if p[4] is None or notifier.channel in p[4]]
+            if len(routed) <= self.config.digest_max_messages:
+                for _, title, message, device, _ in routed:
+                    self._dispatch(title, message, device, [notifier])
+            else:
+                title, message = self._digest(routed)
+                self._dispatch(title, message, None, [notifier])
+
+    @staticmethod
+    def _digest(
+        pending: list[tuple[str, str, str, Device, frozenset[str] | None]],
+    ) -> tuple[str, str]:
+        """One message summing up many changes ("12 arrived, 3 left")."""
+        names: dict[str, list[str]] = {}
+        for change_type, _, _, device, _ in pending:
+            name = device.group if change_type in GROUP_EVENTS else device.display_name
+            names.setdefault(change_type, []).append(name or device.display_name)
+
+        title = ", ".join(
+            f"{len(found)} {DIGEST_LABELS[change_type]}" for change_type, found in names.items()
+        )
+        lines = []
+        for change_type, found in names.items():
+            line = f"{DIGEST_LABELS[change_type].capitalize()}: {', '.join(found[:DIGEST_NAMES])}"
+            if len(found) > DIGEST_NAMES:
+                line += f" and {len(found) - DIGEST_NAMES} more"
+            lines.append(line)
+        return title, "\n".join(lines)
+
+    def _send(
+        self,
+        change_type: str,
+        title: str,
+        message: str,
+        device: Device,
+        channels: frozenset[str] | None = None,
+    ) -> None:
+        """Dispatch now, or hold for the digest when inside batch()."""
+        with self._lock:
+            if self._batching or self._pending:
+                if not self._pending:
+                    self._pending_since = time.monotonic()
+                    self._start_timer()
+                self._pending.append((change_type, title, message, device, channels))
+                return
+        self._dispatch(title, message, device, [
+            n for n in self.notifiers if channels is None or n.channel in channels
+        ])
+
+    def _start_timer(self) -> None:
+        """Flush when the digest window ends, even if no scan comes (lock held)."""
+        window = self.config.digest_window
+        if window and self._timer is None:
+            self._timer = self.timer_factory(window, self._window_ended)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _window_ended(self) -> None:
+        with self._lock:
+            self._timer = None
+        self.flush(force=True)  # inside batch(), its end flushes instead
+        if self.on_timer_flush:
+            self.on_timer_flush()
+
+    def _route(
+        self,
+        change_type: str,
+        title: str,
+        message: str,
+        device: Device,
+        group: str | None = None,
+    ) -> None:
+        """Apply the first matching rule: send, panic or drop (``group``: of a group event)."""
+        rule = self.rules.match(device, change_type, group=group)
+        if rule is None:
+            if change_type not in GROUP_EVENTS:  # group events are sent by rule only
+                self._send(change_type, title, message, device)
             return
-
-        # Check if we should PANIC
-        if self._should_panic(device, is_new=False):
-            custom_msg = self._get_panic_message(device)
-            self.panic_notifier.panic(device, custom_msg)
+        if rule.action == "drop":
+            return
+        text = rule.format_message(device, change_type, group)
+        if rule.action == "panic" and self.panic_notifier:
+            self.panic_notifier.panic(device, text)
             return  # Panic mode overrides normal notifications
+        self._send(change_type, title, text or message, device, rule.channels)
+
+    def _dispatch(
+        self, title: str, message: str, device: Device | None, notifiers: list[Notifier]
+    ) -> None:
+        """Send a notification through the given notifiers, timing each channel."""
+        for notifier in notifiers:
+            if self.use_outbox and notifier.durable:
+                entry = OutboxEntry(
+                    key=uuid.uuid4().hex,
+                    channel=notifier.channel,
+                    title=title,
+                    message=message,
+                    device=device_dict(device) if device else None,
+                )
+                with self._lock:
+                    self._staged.append(entry)
+                continue
+            if notifier.durable:
+                self._send_remote(notifier, title, message, device)
+                continue
+            if notifier.acquire():
+                # A late beep or popup is no use: over the limit, it is skipped
+                metrics.NOTIFY_THROTTLED.inc(channel=notifier.channel, reason="limit")
+                continue
+            self._deliver(notifier, title, message, device)
+
+    def _deliver(
+        self, notifier: Notifier, title: str, message: str, device: Device | None
+    ) -> bool:
+        with metrics.NOTIFY.time(channel=notifier.channel):
+            try:
+                ok = notifier.notify(title, message, device)
+            except DeliveryRejected as e:
+                print(f"{notifier.channel.capitalize()} notification rejected: {e}")
+                ok = False
+        if not ok:
+            metrics.NOTIFY_FAILURES.inc(channel=notifier.channel)
+        return ok
+
+    def _send_remote(
+        self, notifier: Notifier, title: str, message: str, device: Device | None
+    ) -> None:
+        """Send now, or hold the message while the channel is over its rate limit."""
+        with self._lock:
+            held = self._held.get(notifier.channel)
+            if held is not None:
+                # Behind the ones already waiting, to keep the order
+                self._hold(notifier, [(title, message, device)])
+                return
+        wait = notifier.acquire()
+        if wait:
+            metrics.NOTIFY_THROTTLED.inc(channel=notifier.channel, reason="limit")
+        elif self._deliver(notifier, title, message, device) or not notifier.blocked_for():
+            return
+        # Over the limit, or the server answered 429
+        with self._lock:
+            self._hold(notifier, [(title, message, device)], wait or notifier.blocked_for())
+
+    def _hold(
+        self,
+        notifier: Notifier,
+        messages: list[tuple[str, str, Device | None]],
+        wait: float = 0.0,
+    ) -> None:
+        """Queue messages for the channel and make sure a timer sends them (lock held)."""
+        held = self._held.setdefault(notifier.channel, [])
+        held.extend(messages)
+        if len(held) > MAX_HELD:
+            print(f"{notifier.channel.capitalize()}: too many held messages, dropping the oldest")
+            del held[:-MAX_HELD]
+        if notifier.channel not in self._held_timers:
+            timer = self.timer_factory(wait, self._send_held, (notifier,))
+            timer.daemon = True
+            self._held_timers[notifier.channel] = timer
+            timer.start()
+
+    def _send_held(self, notifier: Notifier) -> None:
+        """Timer: send the held messages as one, once the limit allows."""
+        # This timer stays registered until it is done, so messages held
+        # meanwhile queue up rather than start another one
+        with self._lock:
+            held = self._held.get(notifier.channel)
+            if not held:
+                self._held.pop(notifier.channel, None)
+                self._held_timers.pop(notifier.channel, None)
+                return
+            count = len(held)
+            title, message, device = self._fold(held)
+
+        wait = notifier.acquire()
+        if not wait:
+            if not self._deliver(notifier, title, message, device) and notifier.blocked_for():
+                wait = notifier.blocked_for()  # 429: keep them for later
+        with self._lock:
+            self._held_timers.pop(notifier.channel, None)
+            if self._held.get(notifier.channel) is not held:
+                return  # close() took over
+            if not wait:
+                del held[:count]  # sent (or failed for good); newer ones stay queued
+                if not held:
+                    del self._held[notifier.channel]
+                    return
+            self._hold(notifier, [], wait)
+
+    @staticmethod
+    def _fold(held: list[tuple[str, str, Device | None]]) -> tuple[str, str, Device | None]:
+        """One message standing for several held ones."""
+        if len(held) == 1:
+            return held[0]
+        return (
+            f"{len(held)} notifications",
+            "\n".join(f"{title}: {message}" for title, message, _ in held),
+            None,
+        )
 
+    def notify_arrival(self, device: Device) -> None:
+        """Notify that a device has arrived."""
         name = device.display_name
-        title = "Arrival"
-        message = f"{name} is now home"
-
-        for notifier in self.notifiers:
-            notifier.notify(title, message, device)
+        self._route("arrived", "Arrival", f"{name} is now home", device)
 
     def notify_departure(self, device: Device) -> None:
         """Notify that a device has left."""
-        if self._is_quiet_hours():
-            return
-
         name = device.display_name
-        title = "Departure"
-        message = f"{name} has left"
-
-        for notifier in self.notifiers:
-            notifier.notify(title, message, device)
+        self._route("left", "Departure", f"{name} has left", device)
 
     def notify_new_device(self, device: Device) -> None:
         """Notify about a new unknown device."""
-        if self._is_quiet_hours():
-            return
-
-        # Check if we should PANIC
-        if self._should_panic(device, is_new=True):
-            custom_msg = self._get_panic_message(device)
-            self.panic_notifier.panic(device, custom_msg)
-            return  # Panic mode overrides normal notifications
-
-        title = "New Device"
         vendor_info = f" ({device.vendor})" if device.vendor else ""
         message = f"Unknown device{vendor_info}\nMAC: {device.mac}"
+        self._route("new", "New Device", message, device)
 
-        for notifier in self.notifiers:
-            notifier.notify(title, message, device)
+    def notify_group(self, change: GroupChange) -> None:
+        """Notify that a group's first member arrived or its last one left."""
+        name = change.device.display_name
+        if change.change_type == "arrived":
+            title, message = "Group Home", f"{change.group} is home ({name} arrived)"
+        else:
+            title, message = "Group Away", f"Nobody from {change.group} is home ({name} left)"
+        self._route(
+            f"group_{change.change_type}", title, message, change.device, group=change.group
+        )
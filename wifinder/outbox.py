@@ -0,0 +1,137 @@
+"""Durable delivery of notifications to remote channels.
+
+Telegram and webhook messages are not sent from the scan loop. They are
+written to the outbox table in the same transaction as the scan's presence
+events, and a background sender delivers them, retrying network errors,
+429 and 5xx answers with exponential backoff. A message the endpoint
+rejects (another 4xx), or still undelivered after MAX_ATTEMPTS, is marked
+failed and kept for a week for inspection. Delivery is at least once: every
+message carries an idempotency key (the webhook ``Idempotency-Key`` header
+and payload ``id``) that consumers can use to drop duplicates.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from . import metrics
+from .database import Database, Device, OutboxEntry
+from .notifier import DeliveryRejected, Notifier
+
+BACKOFF_BASE = 5.0  # seconds before the first retry
+BACKOFF_MAX = 900.0
+MAX_ATTEMPTS = 20  # about 3 hours of retries
+CLAIM_SECONDS = 60.0  # other senders leave a claimed message alone this long
+IDLE_POLL_SECONDS = 60.0  # look for work even without a kick
+KEEP_SENT = timedelta(days=7)
+
+
+def backoff(attempts: int) -> float:
+    """Seconds to wait after ``attempts`` failed attempts (with jitter)."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class OutboxSender(threading.Thread):
+    """Background thread delivering outbox entries."""
+
+    def __init__(self, db: Database, notifiers: list[Notifier]):
+        super().__init__(daemon=True, name="wifinder-outbox")
+        self.db = db
+        self.notifiers = {n.channel: n for n in notifiers}
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._last_prune = 0.0
+
+    def kick(self) -> None:
+        """Look for new entries now."""
+        self._wake.set()
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.drain()
+                next_due = self.db.get_next_notification_time()
+                self._prune()
+            except Exception as e:
+                print(f"Outbox error: {e}")
+                next_due = time.time() + BACKOFF_BASE
+
+            timeout = IDLE_POLL_SECONDS
+            if next_due is not None:
+                timeout = min(timeout, max(0.0, next_due - time.time()))
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def drain(self) -> int:
+        """Attempt every due entry once. Returns how many were delivered."""
+        delivered = 0
+        now = time.time()
+        for entry in self.db.get_due_notifications(now, limit=1000):
+            if self._stopping.is_set():
+                break
+            if self.db.claim_notification(entry, now + CLAIM_SECONDS):
+                delivered += self.deliver(entry)
+
+        pending = self.db.count_pending_notifications()
+        for channel in self.notifiers.keys() | pending.keys():
+            metrics.OUTBOX_PENDING.set(pending.get(channel, 0), channel=channel)
+        return delivered
+
+    def deliver(self, entry: OutboxEntry) -> bool:
+        """Send one entry and record the outcome."""
+        notifier = self.notifiers.get(entry.channel)
+        wait = notifier.acquire() if notifier else 0.0
+        if wait:
+            # Over the channel's rate: try again once a token is available
+            metrics.NOTIFY_THROTTLED.inc(channel=entry.channel, reason="limit")
+            self.db.finish_notification(
+                entry, sent=False, retry_at=time.time() + wait, attempted=False
+            )
+            return False
+
+        if notifier is None:
+            # Channel removed from the config: retried in case it comes back
+            ok, error = False, f"channel '{entry.channel}' is not configured"
+        else:
+            device = Device(**entry.device) if entry.device else None
+            try:
+                with metrics.NOTIFY.time(channel=entry.channel):
+                    ok = notifier.notify(entry.title, entry.message, device, key=entry.key)
+            except DeliveryRejected as e:
+                metrics.NOTIFY_FAILURES.inc(channel=entry.channel)
+                self._give_up(entry, f"rejected: {e}")
+                return False
+            error = None if ok else "delivery failed"
+
+        if ok:
+            self.db.finish_notification(entry, sent=True)
+            return True
+
+        metrics.NOTIFY_FAILURES.inc(channel=entry.channel)
+        if entry.attempts + 1 >= MAX_ATTEMPTS:
+            self._give_up(entry, f"{error} ({MAX_ATTEMPTS} attempts)")
+        else:
+            delay = backoff(entry.attempts + 1)
+            if notifier:
+                delay = max(delay, notifier.blocked_for())  # honour Retry-After
+            retry_at = time.time() + delay
+            self.db.finish_notification(entry, sent=False, retry_at=retry_at, error=error)
+        return ok
+
+    def _give_up(self, entry: OutboxEntry, error: str) -> None:
+        metrics.OUTBOX_FAILED.inc(channel=entry.channel)
+        print(f"Outbox: giving up on {entry.channel} message '{entry.title}': {error}")
+        self.db.fail_notification(entry, error)
+
+    def _prune(self) -> None:
+        if time.time() - self._last_prune > 3600:
+            self.db.prune_notifications(datetime.now() - KEEP_SENT)
+            self._last_prune = time.time()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop after the message being sent, if any."""
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
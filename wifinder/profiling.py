@@ -0,0 +1,160 @@
+"""Per-cycle profiling for slow scan investigations.
+
+With ``--profile``, every scan cycle is recorded in a ring buffer with its
+phase timings (the scanner/watcher phases plus time spent in each Database
+method and notifier channel, collected from the metrics histograms). Each
+cycle also runs under cProfile and tracemalloc; the snapshots of the N
+slowest cycles are kept, written to ``.prof`` files and served at
+``/debug/profile``.
+"""
+
+import cProfile
+import heapq
+import io
+import itertools
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+from . import metrics
+from .config import Config
+
+T = TypeVar("T")
+
+# Histograms whose observations are attributed to the running cycle
+_CYCLE_METRICS = {
+    metrics.DB_QUERY.name: ("db", "method"),
+    metrics.NOTIFY.name: ("notify", "channel"),
+}
+
+
+@dataclass
+class CycleProfile:
+    """Timings (and, for slow cycles, profiles) of one scan cycle."""
+
+    id: int
+    started_at: float  # epoch seconds
+    duration: float = 0.0
+    phases: dict[str, float] = field(default_factory=dict)
+    stats: str | None = None  # cProfile summary, slowest cycles only
+    allocations: list[str] | None = None  # top tracemalloc diffs, slowest cycles only
+
+    def to_dict(self, details: bool = False) -> dict[str, Any]:
+        data: dict[str, Any] = {
+            "id": self.id,
+            "started_at": self.started_at,
+            "duration": round(self.duration, 4),
+            "phases": {k: round(v, 4) for k, v in sorted(self.phases.items())},
+        }
+        if details:
+            data["stats"] = self.stats
+            data["allocations"] = self.allocations
+        return data
+
+
+class Profiler:
+    """Records scan cycles; keeps full profiles of the slowest ones."""
+
+    def __init__(
+        self,
+        ring_size: int = 100,
+        keep_slowest: int = 5,
+        output_dir: Path | None = None,
+        stats_lines: int = 25,
+    ):
+        self.cycles: deque[CycleProfile] = deque(maxlen=ring_size)
+        self.keep_slowest = keep_slowest
+        self.output_dir = output_dir
+        self.stats_lines = stats_lines
+        self._slowest: list[tuple[float, int, CycleProfile]] = []  # min-heap on duration
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        metrics.add_observer(self._observe)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @classmethod
+    def for_config(cls, config: Config) -> "Profiler":
+        """Profiler writing .prof files next to the database."""
+        return cls(output_dir=config.db_path.parent / "profiles")
+
+    def _observe(self, name: str, labels: dict[str, str], value: float) -> None:
+        cycle: CycleProfile | None = getattr(self._local, "cycle", None)
+        if cycle is None or name not in _CYCLE_METRICS:
+            return
+        prefix, label = _CYCLE_METRICS[name]
+        phase = f"{prefix}:{labels.get(label, '?')}"
+        cycle.phases[phase] = cycle.phases.get(phase, 0.0) + value
+
+    def run_cycle(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run one scan cycle under the profiler."""
+        cycle = CycleProfile(id=next(self._ids), started_at=time.time())
+        profile = cProfile.Profile()
+        before = tracemalloc.take_snapshot()
+
+        self._local.cycle = cycle
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            cycle.duration = time.perf_counter() - start
+            self._local.cycle = None
+            self._finish(cycle, profile, before)
+
+    def add_phases(self, phases: dict[str, float]) -> None:
+        """Attach phase timings to the cycle running in this thread."""
+        cycle: CycleProfile | None = getattr(self._local, "cycle", None)
+        if cycle is not None:
+            cycle.phases.update(phases)
+
+    def _finish(
+        self, cycle: CycleProfile, profile: cProfile.Profile, before: tracemalloc.Snapshot
+    ) -> None:
+        with self._lock:
+            self.cycles.append(cycle)
+            is_slow = len(self._slowest) < self.keep_slowest or cycle.duration > self._slowest[0][0]
+        if not is_slow:
+            return
+
+        # Only pay for formatting the snapshots of cycles we keep
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(self.stats_lines)
+        cycle.stats = out.getvalue()
+        diff = tracemalloc.take_snapshot().compare_to(before, "lineno")
+        cycle.allocations = [str(stat) for stat in diff[:10]]
+
+        with self._lock:
+            entry = (cycle.duration, cycle.id, cycle)
+            if len(self._slowest) < self.keep_slowest:
+                heapq.heappush(self._slowest, entry)
+                evicted = None
+            else:
+                evicted = heapq.heappushpop(self._slowest, entry)[2]
+
+        if self.output_dir:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(self.output_dir / f"cycle-{cycle.id}.prof")
+            if evicted:
+                (self.output_dir / f"cycle-{evicted.id}.prof").unlink(missing_ok=True)
+
+    def slowest(self) -> list[CycleProfile]:
+        with self._lock:
+            return [entry[2] for entry in sorted(self._slowest, reverse=True)]
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            cycles = list(self.cycles)
+        return {
+            "cycles": [c.to_dict() for c in cycles],
+            "slowest": [c.to_dict(details=True) for c in self.slowest()],
+            "output_dir": str(self.output_dir) if self.output_dir else None,
+        }
@@ -0,0 +1,263 @@
+"""Notification routing rules.
+
+Rules come from ``notify.rules`` in the config and are checked in order; the
+first one matching an event decides what happens to it::
+
+    notify:
+      rules:
+        - group: iot            # IoT devices: webhook only
+          channels: [webhook]
+        - group: family
+          event: [arrived, left]
+          channels: [telegram]
+        - known: false          # unnamed devices at night: panic
+          event: [new, arrived]
+          hours: "23-7"
+          action: panic
+        - mac: "AA:BB:CC:DD:EE:FF"
+          channels: [telegram]
+          message: "{name} is at the door"
+
+A rule matches on at most one of ``mac`` / ``group`` (a value or a list),
+plus ``known`` (device has a name), ``event`` (new, arrived, left, or
+group_arrived / group_left, see groups.py),
+``hours`` ("23-7", end exclusive) and ``days`` ("mon-fri"). Its ``action``
+is ``notify`` (default, on ``channels`` or all of them), ``panic`` or
+``drop``. ``message`` replaces the notification text; it may use {name},
+{mac}, {vendor}, {ip}, {group} and {event}.
+
+Group events are only sent when a rule names them in ``event``; for them,
+``group`` (and {group}) is the group that arrived or left, while ``mac`` and
+``known`` refer to the member whose arrival or departure it was.
+
+Quiet hours and the panic settings are turned into rules checked after the
+configured ones, so a rule can make an exception to them.
+
+Rules are compiled into a dispatch table: for every mac, group and "any
+device" a flat list holding, per (event, known, weekday-hour) slot, the first
+rule that matches there. Matching an event is at most three list lookups,
+however many rules there are.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from .config import NotifyConfig, PanicConfig
+from .database import Device
+
+DEVICE_EVENTS = ("new", "arrived", "left")
+GROUP_EVENTS = ("group_arrived", "group_left")  # first member home, last one gone
+EVENTS = DEVICE_EVENTS + GROUP_EVENTS
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+ACTIONS = ("notify", "panic", "drop")
+CHANNELS = ("desktop", "sound", "telegram", "webhook")
+FIELDS = {
+    "name", "mac", "group", "known", "event", "hours", "days",
+    "action", "channels", "message",
+}
+
+BUCKETS = 7 * 24  # weekday-hour slots
+SLOTS = len(EVENTS) * 2 * BUCKETS
+_EVENT_INDEX = {event: i for i, event in enumerate(EVENTS)}
+
+
+@dataclass(frozen=True)
+class Rule:
+    """What to do with an event a rule matched."""
+
+    action: str = "notify"
+    channels: frozenset[str] | None = None  # None: every channel
+    message: str | None = None  # format string, see format_message()
+    name: str = ""
+
+    def format_message(self, device: Device, event: str, group: str | None = None) -> str | None:
+        """The rule's message for a device, or None to keep the default text.
+
+        ``group`` is the group of a group event (default: the device's).
+        """
+        if self.message is None:
+            return None
+        return self.message.format(
+            name=device.display_name,
+            mac=device.mac,
+            vendor=device.vendor or "",
+            ip=device.ip or "",
+            group=(group or device.group) or "",
+            event=event,
+        )
+
+
+def _as_list(value: Any) -> list:
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _parse_hours(spec: Any) -> set[int]:
+    """Hours of the day from "23-7", "9", 9 or a list of those."""
+    hours: set[int] = set()
+    for item in _as_list(spec):
+        start_text, _, end_text = str(item).partition("-")
+        try:
+            start = int(start_text)
+            end = int(end_text) if end_text else start + 1
+        except ValueError:
+            raise ValueError(f"Invalid hours '{item}' (expected e.g. 23-7)") from None
+        if not (0 <= start <= 23 and 0 <= end <= 24) or start == end:
+            raise ValueError(f"Invalid hours '{item}' (expected e.g. 23-7)")
+        if start < end:
+            hours.update(range(start, end))
+        else:
+            # Overnight, e.g. 23:00 to 07:00
+            hours.update(range(start, 24))
+            hours.update(range(0, end))
+    return hours
+
+
+def _parse_days(spec: Any) -> set[int]:
+    """Weekdays (Monday = 0) from "mon-fri", "sat" or a list of those."""
+    days: set[int] = set()
+    for item in _as_list(spec):
+        start_text, _, end_text = str(item).lower().partition("-")
+        if start_text not in DAYS or (end_text and end_text not in DAYS):
+            raise ValueError(f"Invalid days '{item}' (expected e.g. mon-fri)")
+        start = DAYS.index(start_text)
+        end = DAYS.index(end_text) if end_text else start
+        days.update((start + i) % 7 for i in range((end - start) % 7 + 1))
+    return days
+
+
+def parse_rule(data: dict[str, Any]) -> tuple[Rule, list[tuple[str, str | None]], list[int]]:
+    """Validate a rule from the config.
+
+    Returns the rule, the table keys it applies to and its slots in them.
+
+    Raises:
+        ValueError: If the rule is malformed.
+    """
+    label = data.get("name") or str(data)
+    unknown = set(data) - FIELDS
+    if unknown:
+        raise ValueError(f"Rule {label}: unknown field(s) {', '.join(sorted(unknown))}")
+
+    action = data.get("action", "notify")
+    if action not in ACTIONS:
+        raise ValueError(f"Rule {label}: action must be one of {', '.join(ACTIONS)}")
+    channels = None
+    if "channels" in data:
+        channels = frozenset(_as_list(data["channels"]))
+        if channels - set(CHANNELS):
+            raise ValueError(
+                f"Rule {label}: unknown channel(s) {', '.join(sorted(channels - set(CHANNELS)))}"
+            )
+    message = data.get("message")
+    rule = Rule(action, channels, str(message) if message is not None else None, label)
+    try:
+        rule.format_message(Device(mac="00:00:00:00:00:00"), "new")
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"Rule {label}: invalid message placeholder {e}") from None
+
+    if "mac" in data and "group" in data:
+        raise ValueError(f"Rule {label}: match on mac or group, not both")
+    if "mac" in data:
+        keys = [("mac", str(mac).upper()) for mac in _as_list(data["mac"])]
+    elif "group" in data:
+        keys = [("group", str(group)) for group in _as_list(data["group"])]
+    else:
+        keys = [("any", None)]
+
+    events = _as_list(data.get("event")) or list(DEVICE_EVENTS)
+    if set(events) - set(EVENTS):
+        raise ValueError(f"Rule {label}: event must be one of {', '.join(EVENTS)}")
+    known = [int(bool(data["known"]))] if "known" in data else [0, 1]
+    try:
+        hours = _parse_hours(data["hours"]) if "hours" in data else set(range(24))
+        days = _parse_days(data["days"]) if "days" in data else set(range(7))
+    except ValueError as e:
+        raise ValueError(f"Rule {label}: {e}") from None
+
+    slots = [
+        _slot(_EVENT_INDEX[event], is_known, day * 24 + hour)
+        for event in events
+        for is_known in known
+        for day in days
+        for hour in hours
+    ]
+    return rule, keys, slots
+
+
+def _slot(event_index: int, known: int, bucket: int) -> int:
+    return (event_index * 2 + known) * BUCKETS + bucket
+
+
+def legacy_rules(notify: NotifyConfig, panic: PanicConfig | None) -> list[dict[str, Any]]:
+    """Rules doing what the quiet hours and panic settings do."""
+    rules: list[dict[str, Any]] = []
+    start, end = notify.quiet_hours_start, notify.quiet_hours_end
+    if start is not None and end is not None and start != end:
+        rules.append({"name": "quiet hours", "hours": f"{start}-{end}", "action": "drop"})
+
+    if panic and panic.enabled:
+        match: dict[str, Any] = {"event": ["new", "arrived"]}
+        if panic.only_unknown:
+            match["known"] = False
+        for mac, text in (panic.custom_messages or {}).items():
+            rules.append({
+                "name": f"panic message for {mac}",
+                "mac": mac,
+                **match,
+                "action": "panic",
+                # Custom messages are plain text, not format strings
+                "message": text.replace("{", "{{").replace("}", "}}"),
+            })
+        rules.append({"name": "panic", **match, "action": "panic"})
+    return rules
+
+
+class RuleSet:
+    """Compiled rules: first match per event in constant time."""
+
+    def __init__(self, rules: list[dict[str, Any]]):
+        self.rules: list[Rule] = []
+        self._table: dict[tuple[str, str | None], list[int]] = {}
+        no_rule = len(rules)
+        for index, data in enumerate(rules):
+            rule, keys, slots = parse_rule({"name": f"#{index + 1}", **data})
+            self.rules.append(rule)
+            for key in keys:
+                table = self._table.setdefault(key, [no_rule] * SLOTS)
+                for slot in slots:
+                    if table[slot] == no_rule:  # an earlier rule wins
+                        table[slot] = index
+
+    @classmethod
+    def from_config(cls, notify: NotifyConfig, panic: PanicConfig | None = None) -> "RuleSet":
+        """Configured rules, then the ones implied by quiet hours and panic mode."""
+        return cls(list(notify.rules or []) + legacy_rules(notify, panic))
+
+    @property
+    def uses_panic(self) -> bool:
+        return any(rule.action == "panic" for rule in self.rules)
+
+    def match(
+        self,
+        device: Device,
+        event: str,
+        when: datetime | None = None,
+        group: str | None = None,
+    ) -> Rule | None:
+        """The first rule matching an event, if any.
+
+        ``group`` is the group of a group event, matched instead of the
+        device's own (which may have changed since the event).
+        """
+        when = when or datetime.now()
+        group = group or device.group
+        slot = _slot(_EVENT_INDEX[event], int(bool(device.name)), when.weekday() * 24 + when.hour)
+        best = len(self.rules)
+        for key in (("mac", device.mac.upper()), ("group", group), ("any", None)):
+            table = self._table.get(key)
+            if table is not None and table[slot] < best:
+                best = table[slot]
+        return self.rules[best] if best < len(self.rules) else None
@@ -1,8 +1,11 @@
 """Network scanner using nmap."""
 
+import importlib
 import subprocess
 import sys
-from dataclasses import dataclass
+import time
+import types
+from dataclasses import dataclass, field
 from datetime import datetime
 
 import nmap
@@ -10,11 +13,18 @@ import nmap
 from .database import Device
 
 
-# On Windows, hide nmap console windows
-if sys.platform == "win32":
-    _original_popen = subprocess.Popen
-    
-    class _SilentPopen(_original_popen):
+def _hide_console_windows() -> None:
+    """Start nmap without a console window (Windows).
+
+    Only python-nmap's reference to the subprocess module is swapped, the
+    first time a Scanner is made; the rest of the process keeps the standard
+    Popen.
+    """
+    nmap_module = importlib.import_module("nmap.nmap")
+    if getattr(nmap_module.subprocess, "hides_windows", False):
+        return
+
+    class _SilentPopen(subprocess.Popen):
         def __init__(self, *args, **kwargs):
             if 'creationflags' not in kwargs:
                 kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
@@ -24,8 +34,12 @@ if sys.platform == "win32":
                 si.wShowWindow = subprocess.SW_HIDE
                 kwargs['startupinfo'] = si
             super().__init__(*args, **kwargs)
-    
-    subprocess.Popen = _SilentPopen
+
+    silent = types.ModuleType("subprocess")
+    silent.__dict__.update(subprocess.__dict__)
+    silent.Popen = _SilentPopen  # type: ignore[attr-defined]
+    silent.hides_windows = True  # type: ignore[attr-defined]
+    nmap_module.subprocess = silent
 
 
 @dataclass
@@ -35,6 +49,8 @@ class ScanResult:
     devices: list[Device]
     scan_time: datetime
     duration: float  # seconds
+    # Seconds spent per phase ("nmap", "parse", "vendor")
+    phases: dict[str, float] = field(default_factory=dict)
 
 
 class Scanner:
@@ -42,6 +58,8 @@ class Scanner:
 
     def __init__(self, network: str = "192.168.1.0/24"):
         self.network = network
+        if sys.platform == "win32":
+            _hide_console_windows()
         self._nm = nmap.PortScanner()
         self._vendor_lookup = None
 
@@ -68,10 +86,13 @@ class Scanner:
     def scan(self) -> ScanResult:
         """Perform a network scan and return discovered devices."""
         start_time = datetime.now()
+        started = time.perf_counter()
 
         # -sn: Ping scan (no port scan, faster)
         # We need to run as root for ARP-based detection
         self._nm.scan(hosts=self.network, arguments="-sn")
+        nmap_done = time.perf_counter()
+        vendor_time = 0.0
 
         devices: list[Device] = []
         scan_time = datetime.now()
@@ -88,7 +109,9 @@ class Scanner:
                     if "vendor" in self._nm[host] and mac in self._nm[host]["vendor"]:
                         vendor = self._nm[host]["vendor"][mac]
                     else:
+                        lookup_start = time.perf_counter()
                         vendor = self._get_vendor(mac)
+                        vendor_time += time.perf_counter() - lookup_start
 
                 # Skip devices without MAC (usually the scanning host itself)
                 if not mac:
@@ -104,11 +127,13 @@ class Scanner:
                 devices.append(device)
 
         duration = (datetime.now() - start_time).total_seconds()
+        parse_time = time.perf_counter() - nmap_done - vendor_time
 
         return ScanResult(
             devices=devices,
             scan_time=scan_time,
             duration=duration,
+            phases={"nmap": nmap_done - started, "parse": parse_time, "vendor": vendor_time},
         )
 
     def quick_ping(self, ip: str) -> bool:
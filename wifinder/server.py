@@ -0,0 +1,91 @@
+"""Multi-process serving: one scanner leader, N web workers.
+
+``wifinder serve --workers N`` starts the leader (``wifinder leader``) as a
+separate process, then serves the web UI with gunicorn. Workers never scan;
+they read the database and the state the leader publishes (see shared.py),
+so adding workers adds web throughput without adding nmap sweeps.
+"""
+
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from . import metrics
+from .config import Config
+from .database import Database
+from .shared import StatePublisher, segment_name
+
+
+def run_leader(
+    config: Config, stop: threading.Event | None = None, profile: bool = False
+) -> None:
+    """Scan on a schedule and publish watcher state for web workers."""
+    from .profiling import Profiler
+    from .watcher import Watcher
+
+    db = Database(config.db_path)
+    profiler = Profiler.for_config(config) if profile else None
+    watcher = Watcher(config, db, profiler=profiler)
+    publisher = StatePublisher(segment_name(config))
+    started_at = time.time()
+
+    def publish(watcher: Watcher) -> None:
+        publisher.publish({
+            **watcher.state_dict(),
+            "started_at": started_at,
+            "metrics": metrics.REGISTRY.render(),
+            "profile": profiler.to_dict() if profiler else None,
+        })
+
+    if watcher.restore_snapshot():
+        publish(watcher)  # workers have state before the first scan
+
+    try:
+        watcher.run(stop, first_delay=watcher.resume_delay(), on_scan=publish)
+    finally:
+        watcher.close()
+        publisher.close()
+
+
+def serve_workers(
+    config: Config, config_path: Path | None, workers: int, profile: bool = False
+) -> None:
+    """Run the leader process and a gunicorn server with ``workers`` workers."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise RuntimeError(
+            "Multi-worker serving needs gunicorn: pip install 'wifinder[server]'"
+        ) from None
+
+    from .web import create_app
+
+    class WorkerApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{config.web_host}:{config.web_port}")
+            self.cfg.set("workers", workers)
+            # Threads keep slow clients from pinning a whole worker
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", 4)
+
+        def load(self):
+            return create_app(config, scan=False)
+
+    args = [sys.executable, "-m", "wifinder.cli", "leader"]
+    if config_path:
+        args.extend(["-c", str(config_path)])
+    args.extend(["-n", config.network])
+    if profile:
+        args.append("--profile")
+    leader = subprocess.Popen(args)
+
+    try:
+        WorkerApplication().run()
+    finally:
+        leader.terminate()
+        try:
+            leader.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            leader.kill()
@@ -0,0 +1,118 @@
+"""Watcher state shared between the scanner leader and web workers.
+
+When the web UI runs with several worker processes, only one process (the
+leader) scans. It publishes a JSON snapshot of the watcher state to a named
+shared memory segment after every scan; workers read it without locks using
+a sequence counter (odd while a write is in progress).
+
+Segment layout::
+
+    sequence (u64) | payload length (u32) | flags (u32) | JSON payload
+"""
+
+import hashlib
+import json
+import os
+import struct
+from multiprocessing import shared_memory
+from typing import Any
+
+from .config import Config
+
+HEADER = struct.Struct("<QII")
+FLAG_CLOSED = 1
+DEFAULT_SIZE = 1 << 20  # 1 MiB
+
+
+def segment_name(config: Config) -> str:
+    """Shared memory name for a config, derived from its database path."""
+    digest = hashlib.sha1(str(config.db_path.resolve()).encode()).hexdigest()[:12]
+    return f"wifinder-{digest}"
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without letting this process own it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            # Otherwise the resource tracker unlinks the segment when we exit
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        return shm
+
+
+class StatePublisher:
+    """Writes state snapshots for StateReader instances in other processes."""
+
+    def __init__(self, name: str, size: int = DEFAULT_SIZE):
+        self.name = name
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a leader that didn't shut down cleanly
+            self._shm = _attach(name)
+        self._sequence = HEADER.unpack_from(self._shm.buf)[0]
+        if self._sequence % 2:
+            self._sequence += 1
+
+    def publish(self, data: dict[str, Any]) -> None:
+        """Replace the shared snapshot."""
+        payload = json.dumps(data, default=str).encode()
+        if HEADER.size + len(payload) > self._shm.size:
+            print(f"State snapshot too large for shared memory ({len(payload):,} bytes)")
+            return
+
+        buf = self._shm.buf
+        self._sequence += 1
+        HEADER.pack_into(buf, 0, self._sequence, len(payload), 0)
+        buf[HEADER.size:HEADER.size + len(payload)] = payload
+        self._sequence += 1
+        HEADER.pack_into(buf, 0, self._sequence, len(payload), 0)
+
+    def close(self) -> None:
+        """Tell readers the segment is gone, then remove it."""
+        self._sequence += 2
+        HEADER.pack_into(self._shm.buf, 0, self._sequence, 0, FLAG_CLOSED)
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class StateReader:
+    """Reads the snapshot published by the leader (None until there is one)."""
+
+    def __init__(self, name: str, retries: int = 10):
+        self.name = name
+        self.retries = retries
+        self._shm: shared_memory.SharedMemory | None = None
+
+    def read(self) -> dict[str, Any] | None:
+        if self._shm is None:
+            try:
+                self._shm = _attach(self.name)
+            except FileNotFoundError:
+                return None  # leader not up yet
+
+        buf = self._shm.buf
+        for _ in range(self.retries):
+            before, length, flags = HEADER.unpack_from(buf)
+            if flags & FLAG_CLOSED:
+                # Leader restarted: attach to its new segment next time
+                self._shm.close()
+                self._shm = None
+                return None
+            if before % 2 or length == 0:
+                continue
+            payload = bytes(buf[HEADER.size:HEADER.size + length])
+            if HEADER.unpack_from(buf)[0] != before:
+                continue
+            try:
+                return json.loads(payload)
+            except ValueError:
+                continue
+        return None
@@ -0,0 +1,57 @@
+"""Warm-start snapshot of the watcher.
+
+A restarted watcher used to start cold: ``watch`` spent a silent discovery
+sweep finding out who was online, and the web UI had no scan count or last
+scan until its first cycle. Now the scan loop writes a small file next to
+the database (``wifinder.state``) after every cycle and when it stops::
+
+    {"version": 1, "network": "192.168.1.0/24", "next_scan": ...,
+     "last_scan": ..., "scan_count": 42,
+     "online": {"AA:BB:CC:DD:EE:FF": <last seen>, ...}}
+
+On start, the watcher resumes from it if it is for the same network, its
+last scan is no older than ``device_ttl``, and it agrees with the database
+about who is online and when they were last seen (otherwise a scan went
+unrecorded, e.g. the process died between the two writes). It keeps its
+counters, scans when the old process would have, and notifies from that
+first scan. A device's departure deadline stays ``last_seen + device_ttl``,
+so one that went quiet during the restart leaves on time.
+
+The file is a cache: it is replaced atomically, and one that is missing or
+unreadable only means a cold start.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+VERSION = 1
+
+
+@dataclass
+class Snapshot:
+    """What a restarted watcher needs to carry on (times are epoch seconds)."""
+
+    network: str
+    next_scan: float | None = None  # when the scan loop would have scanned next
+    last_scan: float | None = None
+    scan_count: int = 0
+    online: dict[str, float | None] = field(default_factory=dict)  # MAC -> last seen
+
+    @classmethod
+    def load(cls, path: Path) -> "Snapshot | None":
+        """Read a snapshot, or None if there is no usable one."""
+        try:
+            data = json.loads(path.read_bytes())
+            if data.pop("version", None) != VERSION:
+                return None
+            return cls(**data)
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def save(self, path: Path) -> None:
+        """Replace the snapshot file (readers never see a partial one)."""
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps({"version": VERSION, **asdict(self)}))
+        os.replace(tmp, path)
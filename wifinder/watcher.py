@@ -1,13 +1,27 @@
 """Core presence detection engine."""
 
+import asyncio
+import threading
+import time
+from collections import deque
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
-from typing import Callable
+from datetime import datetime
+from typing import Awaitable, Callable
 
+from . import metrics
+from .bot import TelegramBot
 from .config import Config
-from .database import Database, Device
-from .notifier import NotificationManager
+from .database import Database, Device, ScanRecord, ScanRun
+from .groups import GroupChange, GroupPresence
+from .journal import Journal, JournalFolder
+from .mqtt import MqttPublisher
+from .notifier import NotificationManager, TelegramNotifier
+from .outbox import OutboxSender
+from .profiling import Profiler
 from .scanner import Scanner
+from .snapshot import Snapshot
+
+RECENT_CHANGES = 50  # kept in memory for the Telegram bot's /history
 
 
 @dataclass
@@ -19,9 +33,11 @@ class WatcherState:
     scan_count: int = 0
     online_count: int = 0
     known_count: int = 0
+    last_duration: float = 0.0  # seconds, whole scan cycle
+    last_phases: dict[str, float] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class PresenceChange:
     """A detected presence change."""
 
@@ -37,13 +53,55 @@ class Watcher:
         config: Config,
         db: Database,
         on_change: Callable[[PresenceChange], None] | None = None,
+        profiler: Profiler | None = None,
     ):
         self.config = config
         self.db = db
+        self.profiler = profiler
         self.scanner = Scanner(config.network)
         self.notifier = NotificationManager(config.notify, config.panic)
         self.on_change = on_change
         self.state = WatcherState()
+        # Online devices as of the last scan (None until the first one)
+        self._online: dict[str, Device] | None = None
+        self._recent: deque[tuple[datetime, PresenceChange]] = deque(maxlen=RECENT_CHANGES)
+        self.bot: TelegramBot | None = None
+        self.groups = GroupPresence()
+        self.group_changes: list[GroupChange] = []  # from the last scan
+        self.snapshot_path = config.db_path.with_suffix(".state") if config.snapshot else None
+        self._next_scan: float | None = None  # epoch seconds, set by the scan loop
+
+        self.outbox: OutboxSender | None = None
+        # Held while a scan notifies and takes its staged entries, so a digest
+        # timer firing meanwhile cannot take them out of the scan's record
+        self._staging = threading.Lock()
+        if config.notify.outbox and self.notifier.durable_notifiers:
+            self.notifier.use_outbox = True
+            self.notifier.on_timer_flush = self._enqueue_staged
+            self.outbox = OutboxSender(db, self.notifier.durable_notifiers)
+            self.outbox.start()
+
+        self.mqtt: MqttPublisher | None = None
+        if config.mqtt.host:
+            self.mqtt = MqttPublisher(config.mqtt)
+            self.mqtt.publish_devices(db.get_all_devices())
+            self.mqtt.publish_home(db.get_online_devices())
+
+        self.journal: Journal | None = None
+        self.folder: JournalFolder | None = None
+        if config.journal:
+            self.journal = Journal(
+                config.db_path.with_suffix(".journal"), use_mmap=config.journal_mmap
+            )
+            self.folder = JournalFolder(
+                self.journal, db, on_fold=self.outbox.kick if self.outbox else None
+            )
+            self.folder.replay()
+            self.folder.start()
+
+        self.groups.load(db.get_all_devices())
+        if self.mqtt:
+            self.mqtt.publish_groups(self.groups.to_dict())
 
     def scan_once(self, notify: bool = True) -> list[PresenceChange]:
         """Perform a single scan and return any changes detected.
@@ -52,17 +110,46 @@ class Watcher:
             notify: Whether to send notifications for changes. 
                     Set to False for initial discovery scan.
         """
+        if self.profiler:
+            return self.profiler.run_cycle(self._scan_once, notify)
+        return self._scan_once(notify)
+
+    def _scan_once(self, notify: bool) -> list[PresenceChange]:
         changes: list[PresenceChange] = []
 
+        # Make sure the previous scan's journaled writes are in the DB
+        if self.folder:
+            self.folder.wait_idle()
+
         # Get currently online devices from DB
         previously_online = {d.mac: d for d in self.db.get_online_devices()}
 
         # Perform scan
-        result = self.scanner.scan()
+        started_at = datetime.now()
+        cycle_start = time.perf_counter()
+        try:
+            result = self.scanner.scan()
+        except Exception as e:
+            self.db.record_scan_run(ScanRun(
+                started_at=started_at,
+                duration=time.perf_counter() - cycle_start,
+                network=self.config.network,
+                error=str(e) or type(e).__name__,
+            ))
+            raise
         self.state.last_scan = result.scan_time
         self.state.scan_count += 1
-
+        reconcile_start = time.perf_counter()
+
+        record = ScanRecord(
+            scan_time=result.scan_time,
+            slot_seconds=self.config.interval,
+            seen=[d.mac for d in result.devices],
+            devices=[],
+            events=[],
+        )
         currently_seen: set[str] = set()
+        added = 0  # devices not in the database yet
 
         for device in result.devices:
             currently_seen.add(device.mac)
@@ -70,17 +157,18 @@ class Watcher:
             # Check if this is a known device
             existing = self.db.get_device(device.mac)
 
-            if existing is None:
-                # New device!
+            if existing is None or existing.first_seen is None:
+                # New device! (or one registered by an import, never seen yet)
+                if existing is None:
+                    added += 1
+                else:
+                    device.name = existing.name
+                    device.group = existing.group
                 device.first_seen = result.scan_time
                 device.is_online = True
-                self.db.upsert_device(device)
-                self.db.log_event(device.mac, "arrived")
-
-                change = PresenceChange(device=device, change_type="new")
-                changes.append(change)
-                if notify:
-                    self.notifier.notify_new_device(device)
+                record.devices.append(device)
+                record.events.append((device.mac, "arrived", result.scan_time))
+                changes.append(PresenceChange(device=device, change_type="new"))
 
             elif device.mac not in previously_online:
                 # Known device came back online
@@ -88,13 +176,9 @@ class Watcher:
                 device.group = existing.group
                 device.first_seen = existing.first_seen
                 device.is_online = True
-                self.db.upsert_device(device)
-                self.db.log_event(device.mac, "arrived")
-
-                change = PresenceChange(device=device, change_type="arrived")
-                changes.append(change)
-                if notify:
-                    self.notifier.notify_arrival(device)
+                record.devices.append(device)
+                record.events.append((device.mac, "arrived", result.scan_time))
+                changes.append(PresenceChange(device=device, change_type="arrived"))
 
             else:
                 # Device still online, just update last_seen
@@ -102,30 +186,90 @@ class Watcher:
                 device.group = existing.group
                 device.first_seen = existing.first_seen
                 device.is_online = True
-                self.db.upsert_device(device)
+                record.devices.append(device)
 
         # Check for devices that should be marked as gone (TTL expired)
-        ttl = timedelta(seconds=self.config.device_ttl)
+        ttl = self.config.device_ttl
         now = datetime.now()
+        now_ts = now.timestamp()
         
         for mac, device in previously_online.items():
             if mac not in currently_seen:
                 # Device not seen in this scan - check if TTL expired
-                if device.last_seen and (now - device.last_seen) >= ttl:
+                if device.last_seen_ts and now_ts - device.last_seen_ts >= ttl:
                     # TTL expired, mark as gone
                     device.is_online = False
-                    self.db.upsert_device(device)
-                    self.db.log_event(mac, "left")
-
-                    change = PresenceChange(device=device, change_type="left")
-                    changes.append(change)
-                    if notify:
-                        self.notifier.notify_departure(device)
+                    record.devices.append(device)
+                    record.events.append((mac, "left", now))
+                    changes.append(PresenceChange(device=device, change_type="left"))
                 # else: TTL not expired yet, device stays "online"
 
-        # Update state
-        self.state.online_count = len(self.db.get_online_devices())
-        self.state.known_count = len(self.db.get_all_devices())
+        group_changes = [
+            change for device in record.devices for change in self.groups.update(device, now)
+        ]
+        self.group_changes = group_changes
+
+        notify_start = time.perf_counter()
+        with self._staging:
+            if notify:
+                with self.notifier.batch():
+                    for change in changes:
+                        if change.change_type == "new":
+                            self.notifier.notify_new_device(change.device)
+                        elif change.change_type == "arrived":
+                            self.notifier.notify_arrival(change.device)
+                        else:
+                            self.notifier.notify_departure(change.device)
+                    for group_change in group_changes:
+                        self.notifier.notify_group(group_change)
+            else:
+                self.notifier.flush()
+            # Remote channels are delivered from the outbox, written with the scan
+            record.outbox = self.notifier.take_staged()
+
+        persist_start = time.perf_counter()
+        # Counted before the write: with the journal, the folder may add this
+        # scan's devices to the database at any point after it
+        known = len(self.db.get_all_devices()) + added
+        record.run = ScanRun(
+            started_at=started_at,
+            duration=persist_start - cycle_start,
+            hosts_up=len(result.devices),
+            hosts_changed=len(changes),
+            network=self.config.network,
+        )
+        self._persist(record)
+        persist_end = time.perf_counter()
+        if self.outbox and record.outbox and not self.folder:
+            self.outbox.kick()  # with the journal, the folder kicks it once the rows land
+
+        # Update state (computed here, as journaled writes may not be folded yet)
+        online = dict(previously_online)
+        for device in record.devices:
+            if device.is_online:
+                online[device.mac] = device
+            else:
+                online.pop(device.mac, None)
+        self._online = online
+        self._recent.extend((now, change) for change in changes)
+        if self.mqtt and (changes or group_changes):
+            self.mqtt.publish_devices(c.device for c in changes)
+            self.mqtt.publish_home(list(online.values()))
+            self.mqtt.publish_groups(self.groups.to_dict())
+        self.state.online_count = len(online)
+        self.state.known_count = known
+
+        phases = {
+            **result.phases,
+            "reconcile": notify_start - reconcile_start,
+            "notify": persist_start - notify_start,
+            "persist": persist_end - persist_start,
+        }
+        self.state.last_phases = phases
+        if self.profiler:
+            self.profiler.add_phases(phases)
+        self.state.last_duration = time.perf_counter() - cycle_start
+        self._record_metrics()
 
         # Call callback if provided
         if self.on_change:
@@ -134,14 +278,235 @@ class Watcher:
 
         return changes
 
+    def _record_metrics(self) -> None:
+        metrics.SCANS.inc()
+        metrics.SCAN_DURATION.observe(self.state.last_duration)
+        for phase, seconds in self.state.last_phases.items():
+            metrics.SCAN_PHASE.observe(seconds, phase=phase)
+        metrics.DEVICES_ONLINE.set(self.state.online_count)
+        metrics.DEVICES_KNOWN.set(self.state.known_count)
+
+    def run(
+        self,
+        stop: threading.Event | None = None,
+        notify: bool = True,
+        first_delay: float = 0.0,
+        on_scan: Callable[["Watcher"], None] | None = None,
+    ) -> None:
+        """Scan every ``config.interval`` seconds until ``stop`` is set.
+
+        Cycles are scheduled at a fixed rate; if a scan overruns its slot, the
+        next one starts right away and the delay is recorded as scheduler lag.
+
+        Args:
+            stop: Event ending the loop (runs forever if None).
+            notify: Passed to scan_once().
+            first_delay: Seconds to wait before the first scan (after
+                         restore_snapshot(), use resume_delay()).
+            on_scan: Called after every cycle, even one that failed.
+        """
+        stop = stop or threading.Event()
+        self.state.is_running = True
+        self._start_bot()
+        due = time.monotonic() + first_delay
+        self._next_scan = time.time() + first_delay
+
+        try:
+            while not stop.wait(max(0.0, due - time.monotonic())):
+                metrics.SCHEDULER_LAG.observe(max(0.0, time.monotonic() - due))
+                try:
+                    self.scan_once(notify=notify)
+                except Exception as e:
+                    metrics.SCAN_ERRORS.inc()
+                    print(f"Scan error: {e}")
+                if on_scan:
+                    on_scan(self)
+
+                due += self.config.interval
+                # Don't try to catch up on cycles missed while overrunning
+                due = max(due, time.monotonic())
+                self._next_scan = time.time() + due - time.monotonic()
+                self.save_snapshot()
+        finally:
+            self.state.is_running = False
+            self.save_snapshot()
+
+    async def run_async(
+        self,
+        stop: asyncio.Event,
+        notify: bool = True,
+        first_delay: float = 0.0,
+        on_scan: Callable[["Watcher", list[PresenceChange]], Awaitable[None]] | None = None,
+    ) -> None:
+        """Like run(), scheduled on the running event loop.
+
+        nmap blocks, so each scan runs in a worker thread while the loop keeps
+        serving clients. ``on_scan`` gets the cycle's changes (empty if it failed).
+        """
+        loop = asyncio.get_running_loop()
+        self.state.is_running = True
+        self._start_bot()
+        due = loop.time() + first_delay
+        self._next_scan = time.time() + first_delay
+
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(stop.wait(), max(0.0, due - loop.time()))
+                    return
+                except asyncio.TimeoutError:
+                    pass
+
+                metrics.SCHEDULER_LAG.observe(max(0.0, loop.time() - due))
+                changes: list[PresenceChange] = []
+                try:
+                    changes = await asyncio.to_thread(self.scan_once, notify)
+                except Exception as e:
+                    metrics.SCAN_ERRORS.inc()
+                    print(f"Scan error: {e}")
+                if on_scan:
+                    await on_scan(self, changes)
+
+                due += self.config.interval
+                due = max(due, loop.time())
+                self._next_scan = time.time() + due - loop.time()
+                await asyncio.to_thread(self.save_snapshot)
+        finally:
+            self.state.is_running = False
+            self.save_snapshot()
+
+    def restore_snapshot(self) -> bool:
+        """Resume from the state the last run saved, if it is still valid.
+
+        Returns False if there is no usable snapshot (see snapshot.py): the
+        caller should then find out who is online with a scan that doesn't
+        notify.
+        """
+        if not self.snapshot_path:
+            return False
+        snapshot = Snapshot.load(self.snapshot_path)
+        if (
+            snapshot is None
+            or snapshot.network != self.config.network
+            or snapshot.last_scan is None
+            or time.time() - snapshot.last_scan > self.config.device_ttl
+        ):
+            return False
+        online = {d.mac: d for d in self.db.get_online_devices()}
+        if {mac: d.last_seen_ts for mac, d in online.items()} != snapshot.online:
+            return False  # scanned since, by a run that didn't save
+
+        self._online = online
+        self._next_scan = snapshot.next_scan
+        self.state.last_scan = datetime.fromtimestamp(snapshot.last_scan)
+        self.state.scan_count = snapshot.scan_count
+        self.state.online_count = len(online)
+        self.state.known_count = len(self.db.get_all_devices())
+        metrics.DEVICES_ONLINE.set(self.state.online_count)
+        metrics.DEVICES_KNOWN.set(self.state.known_count)
+        return True
+
+    def resume_delay(self) -> float:
+        """Seconds until the scan the last run had scheduled (0 if overdue)."""
+        if self._next_scan is None:
+            return 0.0
+        return min(max(0.0, self._next_scan - time.time()), float(self.config.interval))
+
+    def save_snapshot(self) -> None:
+        """Save what restore_snapshot() needs (nothing before the first scan)."""
+        if not self.snapshot_path or self._online is None or self.state.last_scan is None:
+            return
+        snapshot = Snapshot(
+            network=self.config.network,
+            next_scan=self._next_scan,
+            last_scan=self.state.last_scan.timestamp(),
+            scan_count=self.state.scan_count,
+            online={mac: d.last_seen_ts for mac, d in self._online.items()},
+        )
+        try:
+            snapshot.save(self.snapshot_path)
+        except OSError as e:
+            print(f"Could not save watcher snapshot: {e}")
+
+    def _start_bot(self) -> None:
+        """Start the Telegram bot, if enabled (only the scanning process runs it)."""
+        if self.bot or not self.config.notify.telegram_bot:
+            return
+        for notifier in self.notifier.notifiers:
+            if isinstance(notifier, TelegramNotifier):
+                self.bot = TelegramBot(notifier, self)
+                self.bot.start()
+                return
+
+    def _enqueue_staged(self) -> None:
+        """Queue outbox entries staged outside of a scan (a digest flushed by its timer)."""
+        with self._staging:
+            staged = self.notifier.take_staged()
+        if staged:
+            self.db.enqueue_notifications(staged)
+            if self.outbox:
+                self.outbox.kick()
+
+    def _persist(self, record: ScanRecord) -> None:
+        """Write a scan's changes: to the journal if enabled, else straight to the DB."""
+        if self.journal and self.folder:
+            self.journal.append(record)
+            self.journal.commit()
+            self.folder.kick()
+        else:
+            self.db.record_scans([record])
+
+    def close(self) -> None:
+        """Stop the bot, flush and close the journal, if any, the outbox, MQTT and the notifiers."""
+        if self.bot:
+            self.bot.stop()
+            self.bot = None
+
+        # Notifications still held for a digest go to the outbox, sent next run
+        self.notifier.flush(force=True)
+        self._enqueue_staged()
+
+        if self.journal and self.folder:
+            self.folder.stop()
+            self.journal.close()
+            self.journal = None
+            self.folder = None
+        if self.outbox:
+            self.outbox.stop()
+            self.outbox = None
+        if self.mqtt:
+            self.mqtt.close()
+            self.mqtt = None
+        self.notifier.close()
+
+    def state_dict(self) -> dict:
+        """Snapshot of the watcher state, for other processes (see shared.py)."""
+        return {
+            "is_running": self.state.is_running,
+            "last_scan": self.state.last_scan.isoformat() if self.state.last_scan else None,
+            "scan_count": self.state.scan_count,
+            "online_count": self.state.online_count,
+            "known_count": self.state.known_count,
+            "summary": self.get_summary(),
+            "groups": self.groups.to_dict(),
+        }
+
     def get_who_is_home(self) -> list[Device]:
         """Get list of currently online devices with names (for 'who is home?' queries)."""
-        online = self.db.get_online_devices()
+        if self._online is None:
+            online = self.db.get_online_devices()
+        else:
+            online = sorted(self._online.values(), key=lambda d: (d.name or "", d.mac))
         # Prioritize devices with names (known people)
         named = [d for d in online if d.name]
         unnamed = [d for d in online if not d.name]
         return named + unnamed
 
+    def get_recent_changes(self, limit: int | None = None) -> list[tuple[datetime, PresenceChange]]:
+        """Presence changes seen since the watcher started, newest first."""
+        recent = list(self._recent)[::-1]
+        return recent[:limit] if limit else recent
+
     def get_summary(self) -> str:
         """Get a human-readable summary of who's home."""
         online = self.get_who_is_home()
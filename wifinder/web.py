@@ -1,26 +1,49 @@
 """Web UI for WiFinder."""
 
+import base64
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
 import threading
 import time
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from pathlib import Path
 
-from flask import Flask, render_template_string, jsonify, request, send_from_directory
-
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    render_template_string,
+    request,
+    send_from_directory,
+    stream_with_context,
+)
+
+from . import metrics
+from .analytics import OccupancyAnalytics
 from .config import Config
 from .database import Database
+from .profiling import Profiler
+from .shared import StateReader, segment_name
 from .watcher import Watcher
 
 # Static files directory
 STATIC_DIR = Path(__file__).parent / "static"
 
+# Fingerprinted static URLs never change content, so clients may keep them forever
+IMMUTABLE = "public, max-age=31536000, immutable"
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
 HTML_TEMPLATE = """<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="UTF-8">
 <meta name="viewport" content="width=device-width, initial-scale=1.0">
 <title>WiFinder</title>
-<link rel="icon" type="image/png" href="/static/favicon.png">
+<link rel="icon" type="image/png" href="{{ static_url('favicon.png') }}">
 <link rel="preconnect" href="https://fonts.googleapis.com">
 <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
 <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500&family=JetBrains+Mono:wght@400;500&display=swap" rel="stylesheet">
@@ -277,7 +300,7 @@ footer {
 
 <header>
   <div class="header-left">
-    <img src="/static/logo.png" alt="WiFinder" class="logo">
+    <img src="{{ static_url('logo.png') }}" alt="WiFinder" class="logo">
     <h1>WiFinder</h1>
   </div>
   <div class="status">
@@ -458,38 +481,157 @@ document.getElementById('edit-modal').addEventListener('click', function(e) {
 });
 
 updateData();
-setInterval(updateData, 10000);
+let poll = setInterval(updateData, 10000);
 setInterval(updateUptime, 1000);
+
+// The ASGI server pushes an event after every scan: refresh then instead of polling
+if (window.EventSource) {
+  const events = new EventSource('/api/events');
+  events.addEventListener('open', () => { clearInterval(poll); poll = null; });
+  events.addEventListener('scan', updateData);
+  events.addEventListener('error', () => {
+    if (events.readyState === EventSource.CLOSED && !poll) poll = setInterval(updateData, 10000);
+  });
+}
 </script>
 </body>
 </html>"""
 
 
-def create_app(config: Config) -> Flask:
-    """Create the Flask application."""
-    app = Flask(__name__)
+@dataclass
+class Asset:
+    """A response body prepared once at startup: hashed and precompressed."""
+
+    content_type: str
+    digest: str
+    # Content-Encoding ("identity", "gzip", "br") -> body
+    variants: dict[str, bytes]
+
+
+def make_asset(body: bytes, content_type: str) -> Asset:
+    """Hash a body and precompress it if compression is worth it."""
+    variants = {"identity": body}
+    if content_type.startswith(COMPRESSIBLE_TYPES):
+        variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        try:
+            import brotli
+
+            variants["br"] = brotli.compress(body, quality=11)
+        except ImportError:
+            pass
+    return Asset(content_type, hashlib.sha256(body).hexdigest()[:16], variants)
+
+
+def asset_response(asset: Asset, cache_control: str) -> Response:
+    """Serve the best encoding the client accepts, answering 304 on a matching ETag."""
+    encoding = next(
+        (e for e in ("br", "gzip") if e in asset.variants and request.accept_encodings[e]),
+        "identity",
+    )
+    # Strong ETags must differ per representation
+    etag = asset.digest if encoding == "identity" else f"{asset.digest}-{encoding}"
+
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(
+            asset.variants[encoding], headers=headers, content_type=asset.content_type
+        )
+    response.set_etag(etag)
+    return response
+
+
+def load_static_assets(directory: Path = STATIC_DIR) -> dict[str, Asset]:
+    """Load static files, keyed by file name."""
+    return {
+        path.name: make_asset(
+            path.read_bytes(),
+            mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+        )
+        for path in sorted(directory.iterdir())
+        if path.is_file()
+    }
+
+
+def fingerprinted(name: str, asset: Asset) -> str:
+    """logo.png -> logo.<digest>.png"""
+    stem, dot, suffix = name.rpartition(".")
+    return f"{stem}.{asset.digest}.{suffix}" if dot else f"{name}.{asset.digest}"
+
+
+def create_app(
+    config: Config,
+    scan: bool = True,
+    profile: bool = False,
+    watcher: Watcher | None = None,
+) -> Flask:
+    """Create the Flask application.
+
+    Args:
+        config: WiFinder configuration.
+        scan: Run the watcher in a background thread. Web workers of a
+              multi-process server pass False and read the state published
+              by the scanner leader instead (see server.py).
+        profile: Profile scan cycles and serve them at /debug/profile.
+        watcher: A watcher scheduled by the caller (the ASGI server runs it
+                 on its event loop); no scanner thread is started.
+    """
+    # Static files are served (fingerprinted) by static_files below
+    app = Flask(__name__, static_folder=None)
 
     db = Database(config.db_path)
-    watcher = Watcher(config, db)
+    analytics = OccupancyAnalytics(db)
     started_at = time.time()
-
-    def background_scan():
-        while True:
-            try:
-                watcher.scan_once()
-            except Exception as e:
-                print(f"Scan error: {e}")
-            time.sleep(config.interval)
-
-    scanner_thread = threading.Thread(target=background_scan, daemon=True)
-    scanner_thread.start()
+    leader_state: StateReader | None = None
+
+    if scan and watcher is None:
+        profiler = Profiler.for_config(config) if profile else None
+        watcher = Watcher(config, db, profiler=profiler)
+        watcher.restore_snapshot()
+
+        scanner_thread = threading.Thread(
+            target=watcher.run, kwargs={"first_delay": watcher.resume_delay()}, daemon=True
+        )
+        scanner_thread.start()
+    elif watcher is None:
+        leader_state = StateReader(segment_name(config))
+
+    def watcher_state() -> dict:
+        """State of the watcher, local or published by the leader."""
+        if watcher:
+            return {**watcher.state_dict(), "started_at": started_at}
+        return (leader_state.read() if leader_state else None) or {}
+
+    # The page has no per-request parts: render it once, with fingerprinted
+    # static URLs, and keep it precompressed
+    static_assets = load_static_assets()
+    static_by_url = {fingerprinted(name, a): a for name, a in static_assets.items()}
+
+    def static_url(name: str) -> str:
+        asset = static_assets.get(name)
+        return f"/static/{fingerprinted(name, asset) if asset else name}"
+
+    with app.app_context():
+        page = make_asset(
+            render_template_string(HTML_TEMPLATE, static_url=static_url).encode(),
+            "text/html; charset=utf-8",
+        )
 
     @app.route("/")
     def index():
-        return render_template_string(HTML_TEMPLATE)
+        # Revalidate each time (cheap with the ETag): the page names current assets
+        return asset_response(page, "no-cache")
 
     @app.route("/static/<path:filename>")
     def static_files(filename):
+        if filename in static_by_url:
+            return asset_response(static_by_url[filename], IMMUTABLE)
+        if filename in static_assets:
+            return asset_response(static_assets[filename], "public, max-age=3600")
         return send_from_directory(STATIC_DIR, filename)
 
     @app.route("/api/status")
@@ -506,7 +648,7 @@ def create_app(config: Config) -> Flask:
             "online_count": len(online),
             "known_count": len(all_devices),
             "arrivals_today": arrivals_today,
-            "started_at": started_at,
+            "started_at": watcher_state().get("started_at", started_at),
             "devices": [
                 {
                     "mac": d.mac,
@@ -528,6 +670,50 @@ def create_app(config: Config) -> Flask:
             ],
         })
 
+    @app.route("/api/devices")
+    def api_devices():
+        after = None
+        cursor = request.args.get("cursor")
+        if cursor:
+            try:
+                key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            except ValueError:
+                key = None
+            if not (
+                isinstance(key, list) and len(key) == 2 and all(isinstance(k, str) for k in key)
+            ):
+                return jsonify({"error": "invalid cursor"}), 400
+            after = (key[0], key[1])
+
+        devices, next_key = db.search_devices(
+            status=request.args.get("status"),
+            group=request.args.get("group"),
+            vendor=request.args.get("vendor"),
+            query=request.args.get("q"),
+            after=after,
+            limit=min(max(request.args.get("limit", 50, type=int), 1), 500),
+        )
+        next_cursor = None
+        if next_key:
+            next_cursor = base64.urlsafe_b64encode(json.dumps(next_key).encode()).decode()
+
+        return jsonify({
+            "devices": [
+                {
+                    "mac": d.mac,
+                    "name": d.name,
+                    "vendor": d.vendor,
+                    "ip": d.ip,
+                    "group": d.group,
+                    "is_online": d.is_online,
+                    "first_seen": d.first_seen.isoformat() if d.first_seen else None,
+                    "last_seen": d.last_seen.isoformat() if d.last_seen else None,
+                }
+                for d in devices
+            ],
+            "next_cursor": next_cursor,
+        })
+
     @app.route("/api/device/<mac>", methods=["POST"])
     def api_update_device(mac):
         data = request.get_json()
@@ -537,8 +723,194 @@ def create_app(config: Config) -> Flask:
             db.set_device_group(mac, data["group"])
         return jsonify({"status": "ok"})
 
+    @app.route("/api/devices/bulk", methods=["POST"])
+    def api_bulk_devices():
+        from .importer import import_devices, read_csv
+
+        dry_run = request.args.get("dry_run", "").lower() in ("1", "true")
+        try:
+            if request.mimetype == "text/csv":
+                rows = list(read_csv(io.StringIO(request.get_data(as_text=True))))
+            else:
+                data = request.get_json(silent=True)
+                rows = data.get("devices") if isinstance(data, dict) else data
+                if not isinstance(rows, list):
+                    raise ValueError("expected a JSON list of {mac, name, group} or a CSV body")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        results = import_devices(db, rows, dry_run=dry_run)
+        counts = {
+            status: sum(r.status == status for r in results)
+            for status in ("created", "updated", "error")
+        }
+        return jsonify({
+            "dry_run": dry_run,
+            "created": counts["created"],
+            "updated": counts["updated"],
+            "errors": counts["error"],
+            "results": [r.to_dict() for r in results],
+        })
+
+    @app.route("/api/export/<table>")
+    def api_export(table):
+        from .export import CONTENT_TYPES, Export
+
+        fmt = request.args.get("format", "ndjson")
+        if fmt not in ("csv", "ndjson"):
+            return jsonify({"error": "format must be csv or ndjson"}), 400
+
+        try:
+            since = request.args.get("since")
+            until = request.args.get("until")
+            job = Export(
+                db,
+                table,
+                since=datetime.fromisoformat(since) if since else None,
+                until=datetime.fromisoformat(until) if until else None,
+                watermark=request.args.get("watermark"),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        def generate():
+            yield from job.iter_text(fmt)
+            # Only advance the watermark once the client got everything
+            job.commit()
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype=CONTENT_TYPES[fmt],
+            headers={"Content-Disposition": f"attachment; filename={table}.{fmt}"},
+        )
+
+    @app.route("/api/analytics/occupancy")
+    def api_occupancy():
+        try:
+            report = analytics.occupancy(
+                days=request.args.get("days", 30, type=int),
+                mac=request.args.get("mac"),
+                group=request.args.get("group"),
+            )
+        except RuntimeError as e:
+            return jsonify({"error": str(e)}), 501
+        return jsonify(report.to_dict())
+
+    @app.route("/api/history/aggregate")
+    def api_history_aggregate():
+        bucket = request.args.get("bucket", "hour")
+        try:
+            since = request.args.get("from")
+            until = request.args.get("to")
+            until_dt = datetime.fromisoformat(until) if until else None
+            since_dt = (
+                datetime.fromisoformat(since) if since
+                else (until_dt or datetime.now()) - timedelta(days=7 if bucket == "hour" else 90)
+            )
+            buckets = db.aggregate_history(
+                bucket=bucket,
+                since=since_dt,
+                until=until_dt,
+                mac=request.args.get("mac") or None,
+                group=request.args.get("group") or None,
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({
+            "bucket": bucket,
+            "from": since_dt.isoformat(),
+            "to": until_dt.isoformat() if until_dt else None,
+            "buckets": [b.to_dict() for b in buckets],
+        })
+
+    @app.route("/api/sightings")
+    def api_sightings():
+        stats = db.get_sighting_stats(days=request.args.get("days", 7, type=int))
+        return jsonify([
+            {
+                "mac": s.mac,
+                "scans": s.scans,
+                "seen": s.seen,
+                "uptime": round(s.uptime, 1),
+                "flakiness": round(s.flakiness, 3),
+            }
+            for s in stats
+        ])
+
+    @app.route("/api/scans")
+    def api_scans():
+        try:
+            stats = db.get_scan_stats(
+                days=request.args.get("days", 7, type=int),
+                by=request.args.get("by", "day"),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        runs = db.get_scan_runs(limit=request.args.get("limit", 50, type=int))
+        return jsonify({
+            "stats": [s.to_dict() for s in stats],
+            "runs": [
+                {
+                    "started_at": r.started_at.isoformat(),
+                    "duration": round(r.duration, 3),
+                    "hosts_up": r.hosts_up,
+                    "hosts_changed": r.hosts_changed,
+                    "backend": r.backend,
+                    "network": r.network,
+                    "error": r.error,
+                }
+                for r in runs
+            ],
+        })
+
+    @app.route("/api/device/<mac>/timeline")
+    def api_device_timeline(mac):
+        day = request.args.get("day")
+        try:
+            day_start = datetime.fromisoformat(day) if day else datetime.now()
+        except ValueError:
+            return jsonify({"error": "day must be YYYY-MM-DD"}), 400
+        return jsonify({
+            "mac": mac.upper(),
+            "day": day_start.strftime("%Y-%m-%d"),
+            "slots": db.get_sighting_timeline(mac, day_start),
+        })
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        if watcher:
+            text = metrics.REGISTRY.render()
+        else:
+            # Scan metrics live in the leader process; ours (web requests'
+            # database calls) are labelled apart from its series
+            text = metrics.merge(
+                watcher_state().get("metrics", ""), metrics.REGISTRY.render(process="worker")
+            )
+        return Response(text, content_type=metrics.CONTENT_TYPE)
+
+    @app.route("/debug/profile")
+    def debug_profile():
+        if watcher:
+            data = watcher.profiler.to_dict() if watcher.profiler else None
+        else:
+            data = watcher_state().get("profile")
+        if data is None:
+            return jsonify({"error": "Profiling is off (start with --profile)"}), 404
+        return jsonify(data)
+
     @app.route("/api/who")
     def api_who():
-        return jsonify({"summary": watcher.get_summary()})
+        return jsonify({"summary": watcher_state().get("summary", "")})
+
+    @app.route("/api/groups")
+    def api_groups():
+        return jsonify({"groups": watcher_state().get("groups", {})})
+
+    @app.route("/api/groups/<name>")
+    def api_group(name):
+        state = watcher_state().get("groups", {}).get(name)
+        if state is None:
+            return jsonify({"error": f"Unknown group {name}"}), 404
+        return jsonify({"name": name, **state})
 
     return app